@@ -3,14 +3,23 @@ import mongoose from 'mongoose';
 
 let mongoServer;
 
+// Parallel runs (scripts/jest_workers.py) give every Jest process a TEST_DB_NAMESPACE; together
+// with JEST_WORKER_ID it names a database no other worker uses. MONGODB_TEST_URL points all
+// workers at one shared mongod, otherwise each test file starts its own in-memory server.
+const sharedUrl = process.env.MONGODB_TEST_URL;
+const dbName = `dronedelivery_test_${process.env.TEST_DB_NAMESPACE || 'local'}_${process.env.JEST_WORKER_ID || '1'}`;
+
 // Setup before all tests
 beforeAll(async () => {
   try {
-    mongoServer = await MongoMemoryServer.create();
-    const mongoUri = mongoServer.getUri();
+    let mongoUri = sharedUrl;
+    if (!mongoUri) {
+      mongoServer = await MongoMemoryServer.create();
+      mongoUri = mongoServer.getUri();
+    }
     
-    await mongoose.connect(mongoUri);
-    console.log('✅ Test database connected');
+    await mongoose.connect(mongoUri, { dbName });
+    console.log(`✅ Test database connected (${dbName})`);
   } catch (error) {
     console.error('❌ Test database connection failed:', error);
     throw error;
@@ -31,6 +40,10 @@ afterEach(async () => {
 afterAll(async () => {
   try {
     if (mongoose.connection.readyState !== 0) {
+      // The next test file of this worker starts from an empty database
+      if (sharedUrl) {
+        await mongoose.connection.dropDatabase();
+      }
       await mongoose.disconnect();
     }
     if (mongoServer) {
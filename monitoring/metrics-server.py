@@ -2,101 +2,708 @@
 """
 Metrics Server - Expose test metrics to Prometheus
 Reads test_metrics.txt and serves it via HTTP endpoint
-Automatically updates timestamps to current time for persistent storage
+The metrics files are merged into one metric registry (one HELP/TYPE block per family,
+duplicate series collapsed, timestamps dropped so Prometheus uses the scrape time); the
+rendered body is cached and only rebuilt when a metrics file changes (mtime/size)
+Also ingests the k6 results file (k6-results.json) and serves histograms on /k6/metrics
+
+Connections are served concurrently with HTTP/1.1 keep-alive, either by a bounded thread pool
+(default) or by an asyncio server, so one slow or half-open client cannot block scrapes: request
+heads must arrive within HEADER_TIMEOUT, and idle keep-alive connections are closed when the
+server runs out of workers/connection slots.
+Usage: python metrics-server.py [--mode threaded|asyncio] [--workers 32] [--port 9091]
+
+Responses carry a content-hash ETag and Last-Modified (304 on a match) and are served
+gzip- (or zstd-, if the zstandard package is installed) compressed when the client accepts it;
+compressed variants are built once per content change.
+
+Runners can push results instead of rewriting files (Pushgateway-compatible API):
+  PUT    /metrics/job/<job>/service/<svc>   replace the group's metrics
+  POST   /metrics/job/<job>/service/<svc>   replace only the pushed metric families
+  DELETE /metrics/job/<job>/service/<svc>   drop the group
+Pushed series get the grouping labels and are served on /metrics right away. Pushes are
+kept in a crash-safe snapshot log (METRICS_STATE_FILE, default metrics/push_state.log)
+and replayed at startup.
 """
 
+import http.client
+from http import HTTPStatus
 from http.server import HTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import unquote
+import io
 import os
-import re
+import gzip
+import hashlib
+import sys
+import asyncio
+import argparse
+import threading
 from pathlib import Path
 from datetime import datetime
 import time
 
+# Shared metric/k6 tooling lives in scripts/ (mounted at /workspace/scripts in Docker)
+for scripts_dir in (Path(__file__).resolve().parent.parent / "scripts", Path(__file__).resolve().parent / "scripts"):
+    if (scripts_dir / "metric_registry.py").exists():
+        sys.path.insert(0, str(scripts_dir))
+        break
+
+from metric_registry import MetricRegistry, label_key, load_file, parse_exposition
+from metric_snapshot_log import SnapshotLog, load_groups, snapshot_records
+
+try:
+    from k6_prometheus import K6PrometheusIngest
+except ImportError:
+    K6PrometheusIngest = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# A request's head (request line + headers) must arrive within this many seconds, so stalled
+# or half-open clients give their worker/slot back long before the keep-alive timeout
+HEADER_TIMEOUT = 2
+
+
+def _default_k6_results_file() -> Path:
+    for candidate in (Path(__file__).resolve().parent.parent / "k6-results" / "k6-results.json",
+                      Path(__file__).resolve().parent.parent / "k6-results.json",
+                      Path(__file__).resolve().parent / "k6-results.json"):
+        if candidate.exists():
+            return candidate
+    return Path(__file__).resolve().parent.parent / "k6-results.json"
+
+
+class CachedBody:
+    """A rendered response body with its validators; compressed variants are built once, on first use"""
+
+    def __init__(self, data: bytes, modified: float = None):
+        self.data = data
+        self.etag = 'W/"' + hashlib.blake2b(data, digest_size=16).hexdigest() + '"'
+        self.modified = int(modified if modified is not None else time.time())
+        self.last_modified = formatdate(self.modified, usegmt=True)
+        self._encoded = {"identity": data}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding: str) -> bytes:
+        body = self._encoded.get(encoding)
+        if body is None:
+            with self._lock:
+                body = self._encoded.get(encoding)
+                if body is None:
+                    if encoding == "zstd":
+                        body = zstandard.ZstdCompressor(level=3).compress(self.data)
+                    else:
+                        body = gzip.compress(self.data, compresslevel=6, mtime=0)
+                    self._encoded[encoding] = body
+        return body
+
+
+def choose_encoding(accept_encoding: str) -> str:
+    """Best content coding the client accepts: zstd (if available), then gzip, else identity"""
+    accepted = set()
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        name, _, quality = params.strip().partition("=")
+        try:
+            weight = float(quality) if name.strip() == "q" else 1.0
+        except ValueError:
+            weight = 1.0
+        if coding.strip() and weight > 0:
+            accepted.add(coding.strip().lower())
+    if zstandard is not None and "zstd" in accepted:
+        return "zstd"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return "identity"
+
+
+def not_modified(body: CachedBody, if_none_match: str, if_modified_since: str) -> bool:
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or body.etag in tags or body.etag[2:] in tags
+    if if_modified_since:
+        try:
+            return body.modified <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def build_response(status: int, content_type: str, body, request_headers):
+    """
+    (status, headers, payload) for a resolved request. `body` is raw bytes or a CachedBody;
+    the latter gets conditional (304) handling and content negotiation.
+    """
+    if not isinstance(body, CachedBody):
+        return status, [("Content-type", content_type), ("Content-Length", str(len(body)))], body
+
+    headers = [("ETag", body.etag), ("Last-Modified", body.last_modified), ("Vary", "Accept-Encoding")]
+    if not_modified(body, request_headers.get("If-None-Match", ""), request_headers.get("If-Modified-Since", "")):
+        return 304, headers, b""
+
+    encoding = choose_encoding(request_headers.get("Accept-Encoding", ""))
+    payload = body.encoded(encoding)
+    headers.append(("Content-type", content_type))
+    if encoding != "identity":
+        headers.append(("Content-Encoding", encoding))
+    headers.append(("Content-Length", str(len(payload))))
+    return status, headers, payload
+
+
+def parse_grouping_path(path: str):
+    """Grouping labels of /metrics/job/<job>[/<label>/<value>...]; None if the path is not a push path"""
+    parts = path.partition("?")[0].rstrip("/").split("/")
+    if len(parts) < 2 or parts[0] or parts[1] != "metrics":
+        return None
+    parts = [unquote(part) for part in parts[2:]]
+    if len(parts) < 2 or len(parts) % 2 or parts[0] != "job" or not parts[1]:
+        return None
+    return label_key(dict(zip(parts[::2], parts[1::2])))
+
+
+def content_length(headers):
+    """Content-Length of a request, None if absent; ValueError if it is not a non-negative integer"""
+    value = headers.get("Content-Length")
+    if value is None:
+        return None
+    value = value.strip()
+    if not value.isdigit():
+        raise ValueError(f"Invalid Content-Length: {value!r}")
+    return int(value)
+
+
+class PushStore:
+    """
+    Metrics pushed by runners, one registry per grouping key (job, service, ...).
+    Bodies are parsed (and given their grouping labels, so a render only has to copy the
+    series) before the lock is taken, so a group is swapped in atomically; group registries
+    are never changed in place (a POST builds a new one), so a snapshot of the dicts taken
+    under the lock can be rendered without it.
+    With a snapshot log every change is appended to it, and the log is compacted once it
+    has grown well past the live state.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.groups = {}
+        self.push_times = {}
+        self.version = 0
+        self.log = None
+
+    def attach_log(self, log: SnapshotLog):
+        """Restore the state from the log, compact it unless it already is a snapshot, and keep appending to it"""
+        started = time.perf_counter()
+        groups, push_times = load_groups(log, with_grouping=True)
+        with self._lock:
+            self.groups, self.push_times = groups, push_times
+            self.version += 1
+            log.open()
+            if not log.is_compact(len(groups)):
+                log.compact(snapshot_records(self.groups, self.push_times))
+            self.log = log
+        series = sum(len(family.series) for group in groups.values() for family in group.families.values())
+        print(f"[*] Restored {len(groups)} pushed groups ({series} series) from {log.path} "
+              f"in {time.perf_counter() - started:.2f}s")
+
+    def push(self, grouping, text: str, replace_group: bool):
+        incoming = parse_exposition(text)
+        labeled = MetricRegistry()
+        labeled.merge(incoming, dict(grouping))
+        with self._lock:
+            current = self.groups.get(grouping)
+            if replace_group or current is None:
+                self.groups[grouping] = labeled
+            else:
+                updated = MetricRegistry()
+                updated.replace_families(current)
+                updated.replace_families(labeled)
+                self.groups[grouping] = updated
+            self.push_times[grouping] = time.time()
+            self.version += 1
+            if self.log is not None:
+                self.log.append({"op": "put" if replace_group else "post", "group": [list(pair) for pair in grouping],
+                                 "time": self.push_times[grouping], "families": incoming.to_json()})
+                self._maybe_compact()
+
+    def delete(self, grouping) -> bool:
+        with self._lock:
+            found = self.groups.pop(grouping, None) is not None
+            self.push_times.pop(grouping, None)
+            self.version += 1
+            if self.log is not None and found:
+                self.log.append({"op": "delete", "group": [list(pair) for pair in grouping]})
+                self._maybe_compact()
+            return found
+
+    def _maybe_compact(self):
+        if self.log.should_compact():
+            self.log.compact(snapshot_records(self.groups, self.push_times))
+
+    def snapshot(self):
+        """(groups, push times) as of now; pushes after this don't touch the copies"""
+        with self._lock:
+            return dict(self.groups), dict(self.push_times)
+
+    def apply(self, registry: MetricRegistry) -> dict:
+        """Merge every pushed group (already carrying its grouping labels) into `registry`; returns the push times merged"""
+        groups, push_times = self.snapshot()
+        if not groups:
+            return push_times
+        push_time = registry.gauge("push_time_seconds", "Last successful push per group (unix time)")
+        for grouping, group in groups.items():
+            skipped = registry.merge(group)
+            for name in skipped:
+                print(f"[!] Pushed metric {name} {dict(grouping)} conflicts with an existing type, skipped")
+            push_time.set_sample("push_time_seconds", grouping, push_times[grouping])
+        return push_times
+
+
+class MetricsFileCache:
+    """
+    Pre-rendered, pre-encoded /metrics body. The source files are only re-read (into a fresh
+    registry, later files winning on conflicts) when their (mtime, size) signature changes,
+    or when a runner pushes; pushed groups are merged on top of the file metrics.
+    Otherwise a scrape is a stat() per file plus a buffer write.
+    """
+
+    def __init__(self, files, push_store: PushStore = None):
+        self.files = list(files)
+        self.push_store = push_store
+        self._lock = threading.Lock()
+        self._signature = None
+        self._body = CachedBody(b"")
+
+    def _current_signature(self):
+        signature = []
+        for path in self.files:
+            try:
+                stat = path.stat()
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append(None)
+        push_version = self.push_store.version if self.push_store is not None else 0
+        return tuple(signature), push_version
+
+    def _render(self, signature) -> CachedBody:
+        registry = MetricRegistry()
+        for path in self.files:
+            try:
+                load_file(path, registry)
+            except ValueError as e:
+                print(f"[ERROR] {path.name}: {e}")
+        modified = max((mtime_ns for mtime_ns, _ in filter(None, signature[0])), default=None)
+        modified = modified / 1e9 if modified is not None else None
+        if self.push_store is not None:
+            push_times = self.push_store.apply(registry)
+            if push_times:
+                modified = max(modified or 0, max(push_times.values()))
+        text = registry.render()
+        if not text:
+            return CachedBody(b"# No metrics available yet\n", modified)
+        return CachedBody(text.encode("utf-8"), modified)
+
+    def get(self) -> CachedBody:
+        signature = self._current_signature()
+        if signature != self._signature:
+            with self._lock:
+                if signature != self._signature:
+                    self._body = self._render(signature)
+                    self._signature = signature
+                    print(f"[{datetime.now().strftime('%H:%M:%S')}] Rendered metrics - {len(self._body.data)} bytes")
+        return self._body
+
+
+class K6MetricsCache:
+    """
+    Aggregates the k6 results file once, then folds in only newly appended lines.
+    With a follow interval a background thread polls the file, so a running load test
+    is published live and scrapes never touch the disk.
+    """
+
+    def __init__(self, results_file: Path, follow_interval: float = 0):
+        self.results_file = results_file
+        self.follow_interval = follow_interval
+        self._ingest = K6PrometheusIngest(results_file)
+        self._lock = threading.Lock()
+        self._body = CachedBody(b"# No k6 results available yet\n")
+
+    def refresh(self):
+        with self._lock:
+            started = time.perf_counter()
+            if self._ingest.update():
+                body = self._ingest.render().encode("utf-8")
+                if body != self._body.data:
+                    self._body = CachedBody(body, self.results_file.stat().st_mtime)
+                print(f"[{datetime.now().strftime('%H:%M:%S')}] Ingested {self.results_file.name} "
+                      f"up to byte {self._ingest.follower.offset} in {time.perf_counter() - started:.2f}s")
+
+    def get(self) -> CachedBody:
+        if not self.follow_interval:
+            self.refresh()
+        return self._body
+
+    def start_following(self):
+        def loop():
+            while True:
+                time.sleep(self.follow_interval)
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"[ERROR] k6 follow failed: {e}")
+
+        threading.Thread(target=loop, name="k6-follow", daemon=True).start()
+
+
 class MetricsHandler(BaseHTTPRequestHandler):
     METRICS_FILE = Path(__file__).parent / "metrics" / "test_metrics.txt"
     DRONEDELIVERY_METRICS_FILE = Path(__file__).parent / "metrics" / "dronedelivery_test_metrics.txt"
-    
+    TEST_TIMING_METRICS_FILE = Path(__file__).parent / "metrics" / "test_timing_metrics.txt"
+    FLAKY_TESTS_METRICS_FILE = Path(__file__).parent / "metrics" / "flaky_tests_metrics.txt"
+    PUSH_STORE = PushStore()
+    METRICS_CACHE = MetricsFileCache([METRICS_FILE, DRONEDELIVERY_METRICS_FILE, TEST_TIMING_METRICS_FILE,
+                                      FLAKY_TESTS_METRICS_FILE], PUSH_STORE)
+    MAX_PUSH_BYTES = 16 * 1024 * 1024
+    K6_CACHE = None
+    EXPOSITION_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    # Keep-alive: every response carries Content-Length; idle connections time out
+    protocol_version = "HTTP/1.1"
+    timeout = 10
+    # Headers and body go out in two writes; without TCP_NODELAY the body waits on a delayed ACK
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.connection.settimeout(HEADER_TIMEOUT)  # the first request line
+
+    def parse_request(self):
+        # Headers get the short timeout too; the body and the keep-alive wait get self.timeout
+        self.connection.settimeout(HEADER_TIMEOUT)
+        try:
+            return super().parse_request()
+        finally:
+            self.connection.settimeout(self.timeout)
+
     def do_GET(self):
         """Handle GET requests"""
-        if self.path == "/metrics":
-            self.send_metrics()
-        elif self.path == "/health":
-            self.send_response(200)
-            self.send_header("Content-type", "text/plain")
-            self.end_headers()
-            self.wfile.write(b"OK")
+        self.send_body(*build_response(*self.resolve(self.path), self.headers))
+
+    def do_HEAD(self):
+        status, headers, _ = build_response(*self.resolve(self.path), self.headers)
+        self.send_body(status, headers, b"")
+
+    def do_PUT(self):
+        self.send_push("PUT")
+
+    def do_POST(self):
+        self.send_push("POST")
+
+    def do_DELETE(self):
+        self.send_body(*build_response(*self.resolve_push("DELETE", self.path, b""), self.headers))
+
+    def send_push(self, method: str):
+        try:
+            length = content_length(self.headers)
+        except ValueError as e:
+            length, resolved = None, (400, "text/plain", str(e).encode("utf-8"))
         else:
-            self.send_response(404)
-            self.end_headers()
-            self.wfile.write(b"Not Found")
-    
-    def send_metrics(self):
-        """Send metrics from test_metrics.txt with updated timestamps"""
+            if length is None:
+                resolved = 411, "text/plain", b"Content-Length required"
+            elif length > self.MAX_PUSH_BYTES:
+                resolved = self.resolve_push(method, self.path, None)
+            else:
+                resolved = self.resolve_push(method, self.path, self.rfile.read(length) if length else b"")
+        if length is None or length > self.MAX_PUSH_BYTES:
+            self.close_connection = True  # an unread or unknown-length body would desync the stream
+        self.send_body(*build_response(*resolved, self.headers))
+
+    @classmethod
+    def resolve_push(cls, method: str, path: str, body):
+        """(status, content type, body) for a push API request"""
+        grouping = parse_grouping_path(path)
+        if grouping is None:
+            return 404, "text/plain", b"Not Found (expected /metrics/job/<job>[/<label>/<value>...])"
+        if body is None:
+            return 413, "text/plain", b"Push body too large"
+        try:
+            if method == "DELETE":
+                cls.PUSH_STORE.delete(grouping)
+            else:
+                cls.PUSH_STORE.push(grouping, body.decode("utf-8-sig"), replace_group=method == "PUT")
+        except (ValueError, UnicodeDecodeError) as e:
+            return 400, "text/plain", f"Invalid exposition: {e}".encode("utf-8")
+        labels = ", ".join(f"{key}={value}" for key, value in grouping)
+        print(f"[{datetime.now().strftime('%H:%M:%S')}] {method} {labels}")
+        return 200, "text/plain", b""
+
+    @classmethod
+    def resolve(cls, path: str):
+        """(status, content type, bytes or CachedBody) for a GET request; shared by both servers"""
+        if path == "/metrics":
+            return cls.metrics_response()
+        if path == "/k6/metrics":
+            return cls.k6_metrics_response()
+        if path == "/health":
+            return 200, "text/plain", b"OK"
+        return 404, "text/plain", b"Not Found"
+
+    @classmethod
+    def metrics_response(cls):
+        """Cached metrics of the test, DroneDelivery, test timing and flaky test metrics files"""
         try:
-            metrics_data = ""
-            
-            # Load Java backend test metrics
-            if self.METRICS_FILE.exists():
-                with open(self.METRICS_FILE, 'r', encoding='utf-8-sig') as f:
-                    metrics_data = f.read()
-            
-            # Load DroneDelivery test metrics
-            if self.DRONEDELIVERY_METRICS_FILE.exists():
-                with open(self.DRONEDELIVERY_METRICS_FILE, 'r', encoding='utf-8-sig') as f:
-                    dronedelivery_metrics = f.read()
-                    if dronedelivery_metrics:
-                        metrics_data += "\n" + dronedelivery_metrics
-            
-            if not metrics_data:
-                metrics_data = "# No metrics available yet\n"
-            
-            # Update timestamps to current time (milliseconds)
-            current_timestamp = int(time.time() * 1000)
-            
-            # Replace old timestamps with current one
-            # Pattern matches metric lines ending with a timestamp
-            metrics_data = re.sub(
-                r'(\w+(?:\{[^}]+\})?\s+[\d.]+)\s+\d+',
-                rf'\1 {current_timestamp}',
-                metrics_data
-            )
-            
-            self.send_response(200)
-            self.send_header("Content-type", "text/plain; charset=utf-8")
-            self.send_header("Content-Length", str(len(metrics_data)))
-            self.end_headers()
-            self.wfile.write(metrics_data.encode('utf-8'))
-            
-            # Log access
-            print(f"[{datetime.now().strftime('%H:%M:%S')}] Served metrics - {len(metrics_data)} bytes")
-        
+            return 200, cls.EXPOSITION_TYPE, cls.METRICS_CACHE.get()
         except Exception as e:
             print(f"[ERROR] {e}")
-            self.send_response(500)
-            self.end_headers()
-            self.wfile.write(b"Internal Server Error")
-    
+            return 500, "text/plain", b"Internal Server Error"
+
+    @classmethod
+    def k6_metrics_response(cls):
+        """Cached k6 histograms/counters"""
+        if cls.K6_CACHE is None:
+            return 404, "text/plain", b"k6 ingest is not enabled"
+        try:
+            return 200, cls.EXPOSITION_TYPE, cls.K6_CACHE.get()
+        except Exception as e:
+            print(f"[ERROR] k6 ingest failed: {e}")
+            return 500, "text/plain", b"Internal Server Error"
+
+    def send_body(self, status: int, headers, body: bytes):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        if getattr(self.server, "saturated", False):
+            # Free the worker for queued connections instead of idling on keep-alive
+            self.close_connection = True
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
     def log_message(self, format, *args):
         """Suppress default logging"""
         pass
 
-def run_server(host="0.0.0.0", port=9091):
+
+class ThreadPoolHTTPServer(HTTPServer):
+    """
+    HTTPServer that hands each connection to a bounded pool of worker threads.
+    At most workers + backlog connections are held; beyond that new connections are
+    closed right away instead of queueing without limit.
+    """
+
+    def __init__(self, server_address, handler_class, workers: int = 32, backlog: int = 128):
+        self.workers = workers
+        self.request_queue_size = backlog
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="metrics-worker")
+        self._slots = threading.BoundedSemaphore(workers + backlog)
+        self._active = 0
+        self._active_lock = threading.Lock()
+        super().__init__(server_address, handler_class)
+
+    @property
+    def saturated(self) -> bool:
+        return self._active > self.workers
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            self.shutdown_request(request)
+            return
+        with self._active_lock:
+            self._active += 1
+        self._executor.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._active_lock:
+                self._active -= 1
+            self._slots.release()
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class AsyncConnections:
+    """Open connections of the asyncio server; writes are limited to max_connections at a time"""
+
+    # Connections idle for less than this are mid-conversation; closing them races the client's next request
+    IDLE_GRACE = 1.0
+
+    def __init__(self, max_connections: int):
+        self.max_connections = max_connections
+        self.limit = asyncio.Semaphore(max_connections)
+        self.open = 0
+        self.idle = {}  # writer -> loop time it went idle
+
+    @property
+    def saturated(self) -> bool:
+        return self.open > self.max_connections
+
+    def opened(self):
+        self.open += 1
+        # Out of slots: idle keep-alive connections make room for the new one
+        cutoff = asyncio.get_running_loop().time() - self.IDLE_GRACE
+        for writer, since in sorted(self.idle.items(), key=lambda item: item[1]):
+            if not self.saturated or since > cutoff:
+                break
+            del self.idle[writer]
+            writer.close()
+
+
+async def _read_head(reader, connections: AsyncConnections, writer, first: bool, timeout: float) -> bytes:
+    """The request line and headers; waits up to `timeout` for the next request on a kept-alive connection"""
+    head = b""
+    if not first:
+        connections.idle[writer] = asyncio.get_running_loop().time()
+        try:
+            head = await asyncio.wait_for(reader.read(1), timeout)
+        finally:
+            connections.idle.pop(writer, None)
+        if not head:
+            raise asyncio.IncompleteReadError(head, None)
+    return head + await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), HEADER_TIMEOUT)
+
+
+async def _serve_connection(reader, writer, connections: AsyncConnections, timeout: float):
+    """One keep-alive connection of the asyncio server"""
+    connections.opened()
+    first = True
+    try:
+        while True:
+            head = await _read_head(reader, connections, writer, first, timeout)
+            first = False
+            request_line, _, header_block = head.partition(b"\r\n")
+            method, path, version = request_line.decode("latin-1").split(" ", 2)
+            headers = http.client.parse_headers(io.BytesIO(header_block))
+            invalid = None
+            try:
+                length = content_length(headers)
+            except ValueError as e:
+                length, invalid = 0, (400, "text/plain", str(e).encode("utf-8"))
+            if length is None:
+                length = 0
+                if method in ("PUT", "POST"):
+                    invalid = 411, "text/plain", b"Content-Length required"
+            too_large = length > MetricsHandler.MAX_PUSH_BYTES
+            payload = None if too_large else b""
+            if length and not too_large:
+                payload = await asyncio.wait_for(reader.readexactly(length), timeout)
+
+            async with connections.limit:
+                if invalid is not None:
+                    resolved = invalid
+                elif method in ("GET", "HEAD"):
+                    resolved = MetricsHandler.resolve(path)
+                elif method in ("PUT", "POST", "DELETE"):
+                    resolved = MetricsHandler.resolve_push(method, path, payload)
+                else:
+                    resolved = 405, "text/plain", b"Method Not Allowed"
+                status, response_headers, body = build_response(*resolved, headers)
+
+                connection = headers.get("Connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                # An unread or unknown-length body would desync the stream
+                keep_alive = keep_alive and not too_large and invalid is None
+                keep_alive = keep_alive and not connections.saturated
+                response_headers.append(("Connection", "keep-alive" if keep_alive else "close"))
+                response = (
+                    f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                    + "".join(f"{name}: {value}\r\n" for name, value in response_headers) + "\r\n"
+                ).encode("latin-1")
+                writer.write(response if method == "HEAD" else response + body)
+                await asyncio.wait_for(writer.drain(), timeout)
+            if not keep_alive:
+                break
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError,
+            ConnectionError, ValueError):
+        pass
+    finally:
+        connections.open -= 1
+        connections.idle.pop(writer, None)
+        writer.close()
+
+
+async def _run_asyncio_server(host: str, port: int, max_connections: int, timeout: float):
+    connections = AsyncConnections(max_connections)
+    server = await asyncio.start_server(
+        lambda reader, writer: _serve_connection(reader, writer, connections, timeout),
+        host, port, backlog=max(128, max_connections))
+    async with server:
+        await server.serve_forever()
+
+
+def run_server(host="0.0.0.0", port=9091, k6_results_file=None, k6_follow_interval=None,
+               mode="threaded", workers=32, state_file=None):
     """Start the metrics server"""
-    server_address = (host, port)
-    httpd = HTTPServer(server_address, MetricsHandler)
-    
-    print(f"[*] Metrics Server Started")
+    if state_file is None:
+        state_file = os.environ.get("METRICS_STATE_FILE", str(Path(__file__).parent / "metrics" / "push_state.log"))
+    if state_file:
+        MetricsHandler.PUSH_STORE.attach_log(SnapshotLog(state_file))
+        # Render /metrics in the background so a large restored state doesn't delay listening;
+        # scrapes that arrive meanwhile wait for this render instead of starting their own
+        threading.Thread(target=MetricsHandler.METRICS_CACHE.get, name="metrics-render", daemon=True).start()
+    if K6PrometheusIngest is not None:
+        k6_results_file = Path(k6_results_file or os.environ.get("K6_RESULTS_FILE") or _default_k6_results_file())
+        if k6_follow_interval is None:
+            k6_follow_interval = float(os.environ.get("K6_FOLLOW_INTERVAL", "5"))
+        MetricsHandler.K6_CACHE = K6MetricsCache(k6_results_file, k6_follow_interval)
+        MetricsHandler.K6_CACHE.refresh()  # ingest at startup, not on the first scrape
+        if k6_follow_interval:
+            MetricsHandler.K6_CACHE.start_following()
+
+    httpd = None
+    if mode == "threaded":
+        httpd = ThreadPoolHTTPServer((host, port), MetricsHandler, workers=workers)
+    elif mode != "asyncio":
+        raise ValueError(f"unknown server mode '{mode}' (expected threaded or asyncio)")
+
+    print(f"[*] Metrics Server Started ({mode}, {workers} {'workers' if mode == 'threaded' else 'max connections'})")
     print(f"[*] Listening on: http://{host}:{port}")
     print(f"[*] Metrics endpoint: http://localhost:{port}/metrics")
     print(f"[*] Health check: http://localhost:{port}/health")
     print(f"[*] Reading metrics from: {MetricsHandler.METRICS_FILE}")
+    if MetricsHandler.K6_CACHE is not None:
+        print(f"[*] k6 metrics endpoint: http://localhost:{port}/k6/metrics ({MetricsHandler.K6_CACHE.results_file})")
+        if MetricsHandler.K6_CACHE.follow_interval:
+            print(f"[*] Following k6 results every {MetricsHandler.K6_CACHE.follow_interval}s")
     print(f"[*] Press Ctrl+C to stop\n")
-    
+
     try:
-        httpd.serve_forever()
+        if httpd is not None:
+            httpd.serve_forever()
+        else:
+            asyncio.run(_run_asyncio_server(host, port, workers, MetricsHandler.timeout))
     except KeyboardInterrupt:
         print("\n[*] Server stopped")
-        httpd.server_close()
+    finally:
+        if httpd is not None:
+            httpd.server_close()
+        if MetricsHandler.PUSH_STORE.log is not None:
+            MetricsHandler.PUSH_STORE.log.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve test and k6 metrics to Prometheus")
+    parser.add_argument("--host", default=os.environ.get("METRICS_SERVER_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("METRICS_SERVER_PORT", "9091")))
+    parser.add_argument("--mode", choices=("threaded", "asyncio"),
+                        default=os.environ.get("METRICS_SERVER_MODE", "threaded"))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("METRICS_SERVER_WORKERS", "32")),
+                        help="worker threads (threaded) or concurrent connections (asyncio)")
+    parser.add_argument("--state-file", default=None,
+                        help="snapshot log for pushed metrics ('' disables; default: $METRICS_STATE_FILE "
+                             "or metrics/push_state.log)")
+    args = parser.parse_args(argv)
+    run_server(args.host, args.port, mode=args.mode, workers=args.workers, state_file=args.state_file)
+
 
 if __name__ == "__main__":
-    run_server()
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Metrics Server Benchmark - Scrape latency under many concurrent clients
+Runs N keep-alive clients hammering an endpoint for a fixed time (optionally next to
+"slow" clients that open a connection, send half a request and stall) and reports
+throughput and p50/p95/p99 latency.
+
+Either benchmark a running server (--url) or let the script start
+monitoring/metrics-server.py itself in one or more modes and compare them:
+Usage: python benchmark_metrics_server.py --server-mode threaded --server-mode asyncio --clients 100 --slow-clients 20
+"""
+
+import sys
+import time
+import socket
+import argparse
+import threading
+import subprocess
+import http.client
+from pathlib import Path
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+SERVER_SCRIPT = Path(__file__).resolve().parent.parent / "monitoring" / "metrics-server.py"
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def _client(host: str, port: int, path: str, deadline: float, latencies: List[float], errors: List[int]):
+    connection = None
+    while time.perf_counter() < deadline:
+        try:
+            if connection is None:
+                connection = http.client.HTTPConnection(host, port, timeout=10)
+            started = time.perf_counter()
+            connection.request("GET", path)
+            response = connection.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - started)
+            if response.status != 200:
+                errors[0] += 1
+            if response.getheader("Connection", "").lower() == "close":
+                connection.close()
+                connection = None
+        except (OSError, http.client.HTTPException):
+            errors[0] += 1
+            if connection is not None:
+                connection.close()
+            connection = None
+    if connection is not None:
+        connection.close()
+
+
+def _slow_client(host: str, port: int, path: str, stop: threading.Event):
+    """Half-open client: sends an incomplete request and never finishes it"""
+    try:
+        with socket.create_connection((host, port), timeout=5) as sock:
+            sock.sendall(f"GET {path} HTTP/1.1\r\nHost: {host}\r\n".encode())
+            stop.wait()
+    except OSError:
+        pass
+
+
+def run_benchmark(url: str, clients: int, duration: float, slow_clients: int = 0) -> Dict:
+    parts = urlsplit(url)
+    host, port, path = parts.hostname, parts.port or 80, parts.path or "/"
+
+    stop = threading.Event()
+    slow_threads = [threading.Thread(target=_slow_client, args=(host, port, path, stop), daemon=True)
+                    for _ in range(slow_clients)]
+    for thread in slow_threads:
+        thread.start()
+    time.sleep(0.2 if slow_clients else 0)
+
+    latencies: List[List[float]] = [[] for _ in range(clients)]
+    errors = [[0] for _ in range(clients)]
+    deadline = time.perf_counter() + duration
+    threads = [threading.Thread(target=_client, args=(host, port, path, deadline, latencies[i], errors[i]),
+                                daemon=True) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+
+    merged = sorted(value for client in latencies for value in client)
+    return {
+        "url": url,
+        "clients": clients,
+        "slow_clients": slow_clients,
+        "requests": len(merged),
+        "errors": sum(error[0] for error in errors),
+        "rps": len(merged) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(merged, 50) * 1000,
+        "p95_ms": percentile(merged, 95) * 1000,
+        "p99_ms": percentile(merged, 99) * 1000,
+        "max_ms": (merged[-1] if merged else 0.0) * 1000,
+    }
+
+
+def _wait_for_port(host: str, port: int, timeout: float = 15.0) -> bool:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def start_server(mode: str, port: int, workers: int) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, str(SERVER_SCRIPT), "--mode", mode, "--port", str(port),
+         "--workers", str(workers), "--host", "127.0.0.1"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if not _wait_for_port("127.0.0.1", port):
+        process.kill()
+        raise RuntimeError(f"metrics server ({mode}) did not start on port {port}")
+    return process
+
+
+def print_results(results: List[Dict]):
+    print("\n" + "=" * 92)
+    print("[*] METRICS SERVER BENCHMARK")
+    print("=" * 92)
+    print(f"{'Target':<26} {'Clients':<9} {'Slow':<6} {'Requests':<10} {'Errors':<8} "
+          f"{'RPS':<9} {'p50 ms':<8} {'p95 ms':<8} {'p99 ms':<8}")
+    print("-" * 92)
+    for result in results:
+        print(f"{result['label']:<26} {result['clients']:<9} {result['slow_clients']:<6} {result['requests']:<10} "
+              f"{result['errors']:<8} {result['rps']:<9.0f} {result['p50_ms']:<8.2f} {result['p95_ms']:<8.2f} "
+              f"{result['p99_ms']:<8.2f}")
+    print("-" * 92 + "\n")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark metrics-server.py under concurrent scrapes")
+    parser.add_argument("--url", default="http://127.0.0.1:9091/metrics", help="endpoint to benchmark")
+    parser.add_argument("-c", "--clients", type=int, default=100, help="concurrent keep-alive clients")
+    parser.add_argument("-d", "--duration", type=float, default=10.0, help="seconds per run")
+    parser.add_argument("--slow-clients", type=int, default=0, help="stalled half-open connections")
+    parser.add_argument("--server-mode", action="append", choices=("threaded", "asyncio"),
+                        help="start metrics-server.py in this mode and benchmark it (repeatable)")
+    parser.add_argument("--workers", type=int, default=32, help="--workers passed to the started server")
+    args = parser.parse_args(argv)
+
+    results = []
+    if not args.server_mode:
+        print(f"[*] Benchmarking {args.url} with {args.clients} clients for {args.duration}s")
+        result = run_benchmark(args.url, args.clients, args.duration, args.slow_clients)
+        result["label"] = urlsplit(args.url).netloc
+        results.append(result)
+    else:
+        parts = urlsplit(args.url)
+        for mode in args.server_mode:
+            print(f"[*] Starting metrics server ({mode}) and running {args.clients} clients for {args.duration}s")
+            process = start_server(mode, parts.port or 9091, args.workers)
+            try:
+                result = run_benchmark(args.url, args.clients, args.duration, args.slow_clients)
+            finally:
+                process.terminate()
+                process.wait()
+            result["label"] = mode
+            results.append(result)
+
+    print_results(results)
+    return 1 if any(result["requests"] == 0 for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Flaky Tests - Rerun only the failed test cases, in isolation, and track flakiness
+After a failing run, every failed test case is rerun on its own (mvn surefire:test
+-Dtest=Class#method, jest -t "<full name>") up to N times. Jest reruns run in parallel;
+Maven reruns of a service run one after another, since concurrent surefire:test runs would
+share its target/ (reports, surefire temp files). A case that passes
+on a rerun is flaky: its surefire report keeps the first failure as <flakyFailure> /
+<flakyError> (the format of surefire's own rerunFailingTestsCount) and it counts as
+passed; in Jest's test-results.json it is marked passed with "flaky": true. Cases that
+fail on every attempt still fail the run, so a service is never rerun as a whole.
+
+Flaky cases are stored with status "flaky" in the test run store. The rolling score of a
+test is the share of its last runs that were flaky or flipped between pass and fail;
+`report` prints the flakiest tests and exports the top N as test_flaky_score.
+
+Usage: python flaky_tests.py report [--runs 20] [--top 20] [--push]
+       python flaky_tests.py rerun DoAnCNPM_Backend/order_service [--reruns 2]
+       python flaky_tests.py rerun-jest DroneDelivery-main/BackEnd [--reruns 2] [--workers 4]
+"""
+
+import os
+import re
+import sys
+import json
+import glob
+import argparse
+import tempfile
+import threading
+import subprocess
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from xml.parsers import expat
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from metric_registry import MetricRegistry
+from metrics_push import push_registry
+from junit_ingest import ingest, parse_report
+from test_impact import merge_jest_results
+from test_run_store import open_store
+from test_shards import maven_command
+from test_timing import test_label
+
+DEFAULT_RERUNS = 2
+DEFAULT_WORKERS = 4
+FLAKY_MARKER = "[flaky]"
+_FLAKY_TAGS = {"failure": "flakyFailure", "error": "flakyError"}
+
+_print_lock = threading.Lock()
+
+
+def _log(message: str):
+    with _print_lock:
+        print(message, flush=True)
+
+
+def _method_filter(name: str) -> str:
+    # Parameterized / JUnit 5 names carry "[1]" or "()" suffixes that -Dtest cannot match
+    return re.split(r"[\[(]", name, 1)[0]
+
+
+def rerun_java_failures(service_path, reruns: int = DEFAULT_RERUNS) -> Tuple[List[str], List[str]]:
+    """
+    Rerun the failed cases in target/surefire-reports and rewrite the flaky ones as passed.
+    Returns (flaky, failed) test ids; both empty when the reports show no failed case
+    (e.g. a compile error), which the caller must treat as a failure.
+    """
+    service_path = Path(service_path)
+    reports_dir = service_path / "target" / "surefire-reports"
+    suites = ingest(glob.glob(str(reports_dir / "TEST-*.xml")), service_path.name)
+    failed = {}
+    for suite in suites:
+        for case in suite["testcases"]:
+            if case["status"] in ("failed", "error"):
+                failed.setdefault(suite["file"], []).append(case["name"])
+    if not failed or reruns <= 0:
+        return [], [f"{Path(file).stem[5:]}#{name}" for file, names in failed.items() for name in names]
+
+    # The reruns overwrite TEST-<class>.xml: keep the first run's reports to annotate afterwards
+    originals = {file: (reports_dir / file).read_bytes() for file in failed}
+    passed_on_rerun = set()
+
+    def rerun_class(file: str):
+        fqcn = Path(file).stem[len("TEST-"):]
+        for name in failed[file]:
+            test = f"{fqcn.rpartition('.')[2]}#{_method_filter(name)}"
+            for attempt in range(1, reruns + 1):
+                cmd = maven_command(service_path, "-q", "surefire:test", f"-Dtest={test}",
+                                    "-Dsurefire.failIfNoSpecifiedTests=false")
+                try:
+                    subprocess.run(cmd, cwd=str(service_path), stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL)
+                    cases = [case for case in parse_report(reports_dir / file)["testcases"]
+                             if _method_filter(case["name"]) == _method_filter(name)]
+                except (OSError, ValueError, expat.ExpatError) as e:
+                    _log(f"{FLAKY_MARKER} Could not rerun {test}: {e}")
+                    break
+                if cases and all(case["status"] == "passed" for case in cases):
+                    _log(f"{FLAKY_MARKER} {test} passed on rerun {attempt}/{reruns}: flaky")
+                    passed_on_rerun.add((file, name))
+                    break
+                _log(f"{FLAKY_MARKER} {test} failed again ({attempt}/{reruns})")
+
+    try:
+        # One at a time: every surefire:test run writes the service's target/surefire-reports
+        for file in failed:
+            rerun_class(file)
+    finally:
+        for file, content in originals.items():
+            (reports_dir / file).write_bytes(content)
+    for file in failed:
+        flaky_names = {name for rerun_file, name in passed_on_rerun if rerun_file == file}
+        if flaky_names:
+            mark_flaky(reports_dir / file, flaky_names)
+
+    flaky = [f"{Path(file).stem[5:]}#{name}" for file, name in sorted(passed_on_rerun)]
+    still_failed = [f"{Path(file).stem[5:]}#{name}" for file, names in failed.items() for name in names
+                    if (file, name) not in passed_on_rerun]
+    return flaky, still_failed
+
+
+def mark_flaky(report, names):
+    """Turn the failures of `names` into <flakyFailure>/<flakyError> and fix the suite totals"""
+    tree = ET.parse(report)
+    root = tree.getroot()
+    for case in root.iter("testcase"):
+        if case.get("name") not in names:
+            continue
+        for child in list(case):
+            if child.tag in _FLAKY_TAGS:
+                counter = "failures" if child.tag == "failure" else "errors"
+                root.set(counter, str(max(int(root.get(counter, 0) or 0) - 1, 0)))
+                child.tag = _FLAKY_TAGS[child.tag]
+    tree.write(report, encoding="UTF-8", xml_declaration=True)
+
+
+def rerun_jest_failures(backend_path, reruns: int = DEFAULT_RERUNS,
+                        workers: int = DEFAULT_WORKERS) -> Tuple[List[str], List[str]]:
+    """Rerun the failed assertions of test-results.json one by one and mark the flaky ones as passed"""
+    backend_path = Path(backend_path)
+    results_file = backend_path / "test-results.json"
+    with open(results_file, "r", encoding="utf-8") as f:
+        results = json.load(f)
+    failed = [(result, assertion) for result in results.get("testResults", [])
+              for assertion in result.get("assertionResults", []) if assertion.get("status") == "failed"]
+    if not failed or reruns <= 0:
+        return [], [assertion.get("fullName", "") for _, assertion in failed]
+
+    def rerun(index: int, item) -> bool:
+        result, assertion = item
+        # Concurrent reruns each get their own database namespace (see __tests__/setup.js)
+        env = dict(os.environ, NODE_ENV="test", TEST_DB_NAMESPACE=f"rerun{index}")
+        full_name = assertion.get("fullName") or assertion.get("title", "")
+        for attempt in range(1, reruns + 1):
+            fd, output = tempfile.mkstemp(prefix="jest-rerun-", suffix=".json", dir=backend_path)
+            os.close(fd)
+            try:
+                subprocess.run(["npx", "jest", "--json", f"--outputFile={output}", "--runTestsByPath",
+                                result["name"], "-t", f"^{re.escape(full_name)}$"],
+                               cwd=str(backend_path), env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                with open(output, "r", encoding="utf-8") as f:
+                    statuses = [rerun_assertion.get("status") for rerun_result in json.load(f).get("testResults", [])
+                                for rerun_assertion in rerun_result.get("assertionResults", [])
+                                if rerun_assertion.get("fullName") == assertion.get("fullName")]
+            except (OSError, ValueError) as e:
+                _log(f"{FLAKY_MARKER} Could not rerun '{full_name}': {e}")
+                return False
+            finally:
+                if os.path.exists(output):
+                    os.unlink(output)
+            if statuses and all(status == "passed" for status in statuses):
+                _log(f"{FLAKY_MARKER} '{full_name}' passed on rerun {attempt}/{reruns}: flaky")
+                return True
+            _log(f"{FLAKY_MARKER} '{full_name}' failed again ({attempt}/{reruns})")
+        return False
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(failed)))) as pool:
+        outcomes = list(pool.map(rerun, range(len(failed)), failed))
+
+    flaky, still_failed = [], []
+    for (result, assertion), passed in zip(failed, outcomes):
+        if passed:
+            assertion.update(status="passed", flaky=True)
+            flaky.append(assertion.get("fullName", ""))
+        else:
+            still_failed.append(assertion.get("fullName", ""))
+    for result in results.get("testResults", []):
+        if result.get("status") == "failed" and result.get("assertionResults") and \
+                not any(assertion.get("status") == "failed" for assertion in result["assertionResults"]):
+            result["status"] = "passed"
+    # Recount the totals the same way a --findRelatedTests merge does
+    results = merge_jest_results(results, {})
+    with open(results_file, "w", encoding="utf-8") as f:
+        json.dump(results, f)
+    return flaky, still_failed
+
+
+def print_rerun_summary(flaky: List[str], failed: List[str]):
+    if flaky:
+        print(f"{FLAKY_MARKER} {len(flaky)} flaky (passed on rerun): {', '.join(flaky)}")
+    if failed:
+        print(f"{FLAKY_MARKER} {len(failed)} failed on every attempt: {', '.join(failed)}")
+
+
+def build_registry(scores: List[Dict], top: int) -> MetricRegistry:
+    registry = MetricRegistry()
+    flaky_tests = registry.gauge("test_flaky_tests", "Tests that were flaky or flipped in the recent runs")
+    for service in sorted({score["service"] for score in scores}):
+        flaky_tests.set(sum(1 for score in scores if score["service"] == service and score["score"] > 0),
+                        service=service)
+    family = registry.gauge("test_flaky_score", f"Rolling flakiness score of the {top} flakiest tests (0-1)")
+    for score in scores[:top]:
+        if score["score"] > 0:
+            family.set(round(score["score"], 3), service=score["service"],
+                       test=test_label(score["classname"], score["testcase"]))
+    return registry
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Rerun failed test cases in isolation and track flaky tests")
+    parser.add_argument("action", choices=("report", "rerun", "rerun-jest"))
+    parser.add_argument("path", nargs="?", help="service directory (rerun) or DroneDelivery BackEnd (rerun-jest)")
+    parser.add_argument("--reruns", type=int, default=DEFAULT_RERUNS, help=f"attempts per failed case (default: {DEFAULT_RERUNS})")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Jest reruns at once (default: {DEFAULT_WORKERS}; Maven reruns run one at a time)")
+    parser.add_argument("--runs", type=int, default=20, help="runs the flakiness score looks back over (default: 20)")
+    parser.add_argument("--top", type=int, default=20, help="flakiest tests to print and export (default: 20)")
+    parser.add_argument("--push", action="store_true", help="push to the metrics server instead of writing a file")
+    args = parser.parse_args(argv)
+
+    if args.action in ("rerun", "rerun-jest"):
+        if not args.path:
+            parser.error(f"{args.action} needs a directory")
+        if args.action == "rerun":
+            flaky, failed = rerun_java_failures(args.path, args.reruns)
+        else:
+            flaky, failed = rerun_jest_failures(args.path, args.reruns, args.workers)
+        print_rerun_summary(flaky, failed)
+        return 1 if failed else 0
+
+    metrics_dir = Path(__file__).resolve().parent.parent / "monitoring" / "metrics"
+    store = open_store(metrics_dir)
+    if store is None:
+        print("[!] The test run store is disabled (TEST_RUN_DB is empty)")
+        return 1
+    scores = store.flaky_scores(args.runs)
+    store.close()
+
+    print(f"\n{'='*70}")
+    print(f"[*] FLAKIEST TESTS (last {args.runs} runs per service)")
+    print(f"{'='*70}")
+    print(f"{'Score':>6}  {'Flaky':>5}  {'Flips':>5}  {'Runs':>4}  Test")
+    for score in scores[:args.top]:
+        if score["score"] > 0:
+            print(f"{score['score']:6.2f}  {score['flaky']:>5}  {score['flips']:>5}  {score['runs']:>4}  "
+                  f"{score['service']}: {test_label(score['classname'], score['testcase'])}")
+    if not any(score["score"] > 0 for score in scores):
+        print("[+] No flaky tests")
+    print(f"{'='*70}\n")
+
+    registry = build_registry(scores, args.top)
+    if args.push and push_registry(registry, "flaky-tests", {}):
+        return 0
+    output = metrics_dir / "flaky_tests_metrics.txt"
+    registry.write_file(output)
+    print(f"[+] Metrics written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+Jest Ingest - Shared, incremental reader for Jest's test-results.json and coverage-summary.json
+`jest --json --coverage` appends the whole istanbul coverageMap to test-results.json, usually
+several times the size of the results themselves. Both files are streamed one member at a
+time (json.JSONDecoder.raw_decode over a growing buffer): reading stops at the end of
+testResults, so the coverageMap is never read, and only one test file's result is decoded
+at a time.
+
+Each test file becomes a suite summary: suite (its top-level describe), file, module (the
+first dotted part of the file name: drone.api.test.js -> drone), kind (unit / integration,
+its directory) and the counts by status. Summaries are kept in an index keyed by a digest of
+each file's raw result, so after a partial run (--since, shards, reruns) only the files whose
+results changed are summarized again, and files whose mtime and size are unchanged are not
+read at all. merge_coverage_maps() / coverage_summary() combine the coverage of parallel
+Jest workers (jest_workers.py) into one coverageMap and coverage-summary.json.
+
+Series (one metric per measure, suites/files/modules as labels):
+  dronedelivery_test_total / _passed / _failed / _flaky / _pass_rate
+  dronedelivery_suite_tests{suite,file,module,kind,status}  status: passed/failed/skipped/flaky
+  dronedelivery_suite_duration_seconds{suite,file,module,kind}
+  dronedelivery_module_tests{module,status}, dronedelivery_module_pass_rate{module}
+  dronedelivery_coverage_<metric>                            statements/branches/functions/lines
+  dronedelivery_module_coverage_percent{module,metric}
+  dronedelivery_file_coverage_percent{file,module,metric}
+
+Index directory: .test-cache/jest/ at the repo root, or TEST_RESULT_CACHE_DIR/jest
+(an empty TEST_RESULT_CACHE_DIR disables the index).
+
+Usage: python jest_ingest.py DroneDelivery-main/BackEnd [--push] [--no-index]
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+import tempfile
+from pathlib import Path, PurePosixPath
+from typing import Dict, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from metric_registry import MetricRegistry
+from metrics_push import push_registry
+from junit_ingest import index_dir
+
+INDEX_VERSION = 1
+CHUNK_SIZE = 64 * 1024
+COVERAGE_METRICS = ("statements", "branches", "functions", "lines")
+STATUSES = ("passed", "failed", "skipped", "flaky")
+_JEST_STATUS = {"passed": "passed", "failed": "failed", "pending": "skipped", "skipped": "skipped",
+                "todo": "skipped", "disabled": "skipped"}
+_DECODER = json.JSONDecoder()
+
+
+class JsonStream:
+    """
+    Pull parser over one JSON document: members() / items() walk an object / array and
+    value() decodes the next value whole. A member's value must be consumed before the
+    next member is requested.
+    """
+
+    def __init__(self, f, chunk_size: int = CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _read(self) -> bool:
+        # Read at least as much as is buffered, so a large value costs O(log n) decode attempts
+        chunk = "" if self.eof else self.f.read(max(self.chunk_size, len(self.buffer) - self.pos))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character ("" at the end of the file)"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"expected one of {chars!r} at offset {self.pos}, found {char!r}")
+        self.pos += 1
+        return char
+
+    def value(self) -> Tuple[object, str]:
+        """(decoded value, its raw text)"""
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buffer, self.pos)
+                # A number or literal ending the buffer may continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    raw = self.buffer[self.pos:end]
+                    self.pos = end
+                    return value, raw
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._read()
+
+    def members(self) -> Iterator[str]:
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key, _ = self.value()
+            if not isinstance(key, str):
+                raise ValueError(f"object key expected at offset {self.pos}")
+            self.expect(":")
+            yield key
+            if self.expect(",}") == "}":
+                return
+
+    def items(self) -> Iterator[Tuple[object, str]]:
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(",]") == "]":
+                return
+
+
+def iter_test_results(results_file) -> Iterator[Tuple[Dict, str]]:
+    """(result, raw text) of each test file in `jest --json` output; stops reading after testResults"""
+    with open(results_file, "r", encoding="utf-8") as f:
+        stream = JsonStream(f)
+        for key in stream.members():
+            if key == "testResults":
+                yield from stream.items()
+                return
+            # Run counters and the snapshot summary (Jest writes the coverageMap last)
+            stream.value()
+
+
+def iter_coverage(summary_file) -> Iterator[Tuple[str, Dict]]:
+    """(file or "total", {metric: {total, covered, skipped, pct}}) of a json-summary coverage report"""
+    with open(summary_file, "r", encoding="utf-8") as f:
+        stream = JsonStream(f)
+        for key in stream.members():
+            yield key, stream.value()[0]
+
+
+def test_file(name: str) -> str:
+    """Repo-relative test file of a Jest result (Jest reports absolute, possibly Windows, paths)"""
+    name = name.replace("\\", "/")
+    index = name.find("__tests__/")
+    return name[index:] if index >= 0 else PurePosixPath(name).name
+
+
+def case_status(assertion: Dict) -> str:
+    return "flaky" if assertion.get("flaky") else _JEST_STATUS.get(assertion.get("status"), "failed")
+
+
+def module_of(path: str) -> str:
+    """Module a test or source file belongs to: drone.api.test.js, drone.controllers.js -> drone"""
+    return PurePosixPath(path).name.split(".")[0]
+
+
+def summarize(result: Dict) -> Dict:
+    """Suite summary of one test file's result"""
+    file_name = test_file(result.get("name", ""))
+    assertions = result.get("assertionResults", [])
+    counts = dict.fromkeys(STATUSES, 0)
+    for assertion in assertions:
+        counts[case_status(assertion)] += 1
+    titles = next((assertion["ancestorTitles"] for assertion in assertions if assertion.get("ancestorTitles")), None)
+    parent = PurePosixPath(file_name).parent.name
+    return dict(counts,
+                file=file_name,
+                suite=titles[0] if titles else file_name,
+                module=module_of(file_name),
+                kind=parent if parent != "__tests__" else "",
+                tests=len(assertions),
+                # A file that failed to load (syntax error, failing setup) has no assertions
+                errors=0 if assertions or result.get("status") != "failed" else 1,
+                seconds=max(result.get("endTime", 0) - result.get("startTime", 0), 0) / 1000)
+
+
+def _strip_common_dir(files: Dict[str, Dict]) -> Dict[str, Dict]:
+    # Coverage is keyed by absolute paths of the machine that ran Jest
+    paths = {name: PurePosixPath(name.replace("\\", "/")) for name in files}
+    common = os.path.commonprefix([path.parent.parts for path in paths.values()]) if paths else ()
+    return {"/".join(paths[name].parts[len(common):]): coverage for name, coverage in files.items()}
+
+
+class JestIndex:
+    """Suite summaries and coverage of one BackEnd directory, valid while its files are unchanged"""
+
+    def __init__(self, backend_path: Path, root: Optional[Path]):
+        self.path = None
+        self.data: Dict = {"results": None, "coverage": None, "suites": {}, "files": {}, "total": {}}
+        self.dirty = False
+        if root is None:
+            return
+        digest = hashlib.sha1(str(backend_path.resolve()).encode()).hexdigest()[:16]
+        self.path = root / f"{backend_path.resolve().parent.name or 'root'}-{digest}.json"
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if data.get("version") == INDEX_VERSION:
+                self.data.update(data["index"])
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def unchanged(self, key: str, stat) -> bool:
+        return self.data[key] == [stat.st_mtime_ns, stat.st_size]
+
+    def update(self, key: str, stat, **values):
+        self.data.update(values, **{key: [stat.st_mtime_ns, stat.st_size]})
+        self.dirty = True
+
+    def save(self):
+        # Only a memo: concurrent runners may overwrite each other's entries
+        if self.path is None or not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_name = tempfile.mkstemp(prefix=self.path.stem + ".", suffix=".tmp", dir=self.path.parent)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "index": self.data}, f)
+        os.replace(temp_name, self.path)
+        self.dirty = False
+
+
+def ingest(backend_path, use_index: bool = True) -> Dict:
+    """
+    {"suites": [summary, ...] in result order, "files": {file: {metric: [covered, total]}},
+     "total": {metric: pct}, "summarized": number of suites (re)summarized}.
+    Missing or unreadable files are reported and give empty results.
+    """
+    backend_path = Path(backend_path)
+    index = JestIndex(backend_path, index_dir("jest") if use_index else None)
+    summarized = 0
+
+    results_file = backend_path / "test-results.json"
+    try:
+        stat = results_file.stat()
+        if not index.unchanged("results", stat):
+            previous = index.data["suites"]
+            suites = {}
+            for result, raw in iter_test_results(results_file):
+                digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+                file_name = test_file(result.get("name", ""))
+                cached = previous.get(file_name)
+                if cached and cached[0] == digest:
+                    suites[file_name] = cached
+                else:
+                    suites[file_name] = [digest, summarize(result)]
+                    summarized += 1
+            index.update("results", stat, suites=suites)
+    except (OSError, ValueError) as e:
+        print(f"[!] Could not read {results_file}: {e}")
+        index.data.update(results=None, suites={})
+
+    coverage_file = backend_path / "coverage" / "coverage-summary.json"
+    try:
+        stat = coverage_file.stat()
+        if not index.unchanged("coverage", stat):
+            files, total = {}, {}
+            for name, coverage in iter_coverage(coverage_file):
+                if name == "total":
+                    total = {metric: coverage.get(metric, {}).get("pct", 0) for metric in COVERAGE_METRICS}
+                else:
+                    files[name] = {metric: [coverage.get(metric, {}).get("covered", 0),
+                                            coverage.get(metric, {}).get("total", 0)] for metric in COVERAGE_METRICS}
+            index.update("coverage", stat, files=_strip_common_dir(files), total=total)
+    except FileNotFoundError:
+        print(f"[!] No coverage summary ({coverage_file}); run jest with --coverageReporters=json-summary")
+        index.data.update(coverage=None, files={}, total={})
+    except (OSError, ValueError) as e:
+        print(f"[!] Could not read {coverage_file}: {e}")
+        index.data.update(coverage=None, files={}, total={})
+
+    index.save()
+    return {"suites": [summary for _, summary in index.data["suites"].values()],
+            "files": index.data["files"], "total": index.data["total"], "summarized": summarized}
+
+
+def merge_coverage_maps(maps: List[Dict]) -> Dict:
+    """
+    Istanbul coverage maps of runs over the same sources (parallel Jest workers) as one:
+    hit counts of statements, functions and branch paths add up
+    """
+    merged: Dict[str, Dict] = {}
+    for coverage_map in maps:
+        for name, coverage in coverage_map.items():
+            target = merged.get(name)
+            if target is None:
+                merged[name] = dict(coverage, s=dict(coverage["s"]), f=dict(coverage["f"]),
+                                    b={key: list(hits) for key, hits in coverage["b"].items()})
+                continue
+            for key, hits in coverage["s"].items():
+                target["s"][key] = target["s"].get(key, 0) + hits
+            for key, hits in coverage["f"].items():
+                target["f"][key] = target["f"].get(key, 0) + hits
+            for key, hits in coverage["b"].items():
+                previous = target["b"].setdefault(key, [0] * len(hits))
+                target["b"][key] = [a + b for a, b in zip(previous, hits)]
+    return merged
+
+
+def _istanbul_pct(covered: int, total: int) -> float:
+    # istanbul-lib-coverage's percent(): truncated to 2 decimals, 100 when there is nothing to cover
+    return int(1000 * 100 * covered / total / 10) / 100 if total else 100
+
+
+def coverage_summary(coverage_map: Dict) -> Dict:
+    """The json-summary report (coverage-summary.json) of a coverage map"""
+    summary = {}
+    totals = {metric: [0, 0] for metric in ("lines", "statements", "functions", "branches")}
+    for name, coverage in coverage_map.items():
+        lines: Dict[int, int] = {}
+        for key, hits in coverage["s"].items():
+            line = coverage["statementMap"][key]["start"]["line"]
+            lines[line] = max(lines.get(line, 0), hits)
+        counts = {
+            "lines": (sum(1 for hits in lines.values() if hits), len(lines)),
+            "statements": (sum(1 for hits in coverage["s"].values() if hits), len(coverage["s"])),
+            "functions": (sum(1 for hits in coverage["f"].values() if hits), len(coverage["f"])),
+            "branches": (sum(1 for paths in coverage["b"].values() for hits in paths if hits),
+                         sum(len(paths) for paths in coverage["b"].values())),
+        }
+        summary[name] = {metric: {"total": total, "covered": covered, "skipped": 0,
+                                  "pct": _istanbul_pct(covered, total)}
+                         for metric, (covered, total) in counts.items()}
+        for metric, (covered, total) in counts.items():
+            totals[metric][0] += covered
+            totals[metric][1] += total
+    total = {metric: {"total": total, "covered": covered, "skipped": 0, "pct": _istanbul_pct(covered, total)}
+             for metric, (covered, total) in totals.items()}
+    return dict({"total": total}, **summary)
+
+
+def _percent(part: float, whole: float) -> float:
+    return round(part / whole * 100, 2) if whole else 0
+
+
+def test_totals(suites: List[Dict]) -> Dict[str, int]:
+    """Tests, statuses and files that failed to load, summed over `suites`"""
+    totals = dict.fromkeys(("tests", "errors") + STATUSES, 0)
+    for suite in suites:
+        for key in totals:
+            totals[key] += suite[key]
+    return totals
+
+
+def module_totals(suites: List[Dict]) -> Dict[str, Dict]:
+    modules: Dict[str, Dict] = {}
+    for suite in suites:
+        totals = modules.setdefault(suite["module"], dict.fromkeys(("tests",) + STATUSES, 0))
+        for key in totals:
+            totals[key] += suite[key]
+    return modules
+
+
+def pass_rate(counts: Dict) -> float:
+    """Passed share of the tests; flaky tests passed on a rerun"""
+    return _percent(counts["passed"] + counts["flaky"], counts["tests"])
+
+
+def build_registry(ingested: Dict) -> MetricRegistry:
+    registry = MetricRegistry()
+    suites = ingested["suites"]
+    totals = test_totals(suites)
+    registry.gauge("dronedelivery_test_total", "Total number of tests").set(totals["tests"])
+    registry.gauge("dronedelivery_test_passed", "Number of passed tests").set(totals["passed"] + totals["flaky"])
+    registry.gauge("dronedelivery_test_failed", "Number of failed tests").set(totals["failed"])
+    registry.gauge("dronedelivery_test_flaky", "Number of flaky tests (passed on rerun)").set(totals["flaky"])
+    registry.gauge("dronedelivery_test_pass_rate", "Test pass rate percentage").set(pass_rate(totals))
+
+    suite_tests = registry.gauge("dronedelivery_suite_tests", "Tests of a test file by status")
+    suite_seconds = registry.gauge("dronedelivery_suite_duration_seconds", "Run time of a test file")
+    for suite in suites:
+        labels = {"suite": suite["suite"], "file": suite["file"], "module": suite["module"], "kind": suite["kind"]}
+        for status in STATUSES:
+            suite_tests.set(suite[status], status=status, **labels)
+        suite_seconds.set(round(suite["seconds"], 3), **labels)
+
+    module_tests = registry.gauge("dronedelivery_module_tests", "Tests of a module by status")
+    module_rate = registry.gauge("dronedelivery_module_pass_rate", "Test pass rate percentage of a module")
+    for module, counts in module_totals(suites).items():
+        for status in STATUSES:
+            module_tests.set(counts[status], module=module, status=status)
+        module_rate.set(pass_rate(counts), module=module)
+
+    for metric, pct in ingested["total"].items():
+        registry.gauge(f"dronedelivery_coverage_{metric}", f"{metric.title()} coverage percentage").set(pct)
+    file_coverage = registry.gauge("dronedelivery_file_coverage_percent", "Coverage percentage of a source file")
+    module_coverage = registry.gauge("dronedelivery_module_coverage_percent", "Coverage percentage of a module's sources")
+    by_module: Dict[Tuple[str, str], List[int]] = {}
+    for file_name, coverage in ingested["files"].items():
+        module = module_of(file_name)
+        for metric, (covered, total) in coverage.items():
+            file_coverage.set(_percent(covered, total) if total else 100, file=file_name, module=module, metric=metric)
+            sums = by_module.setdefault((module, metric), [0, 0])
+            sums[0] += covered
+            sums[1] += total
+    for (module, metric), (covered, total) in by_module.items():
+        module_coverage.set(_percent(covered, total) if total else 100, module=module, metric=metric)
+    return registry
+
+
+def print_summary(ingested: Dict):
+    suites = ingested["suites"]
+    print("=" * 88)
+    print(f"{'Test Suite':<36} {'Module':<8} {'Kind':<12} {'Passed':>7} {'Failed':>7} {'Skipped':>8} {'Time':>7}")
+    print("=" * 88)
+    for suite in sorted(suites, key=lambda suite: (suite["kind"], suite["file"])):
+        failed = suite["failed"] + suite["errors"]
+        print(f"{'✅' if not failed else '❌'} {suite['suite'][:33]:<33} {suite['module']:<8} {suite['kind']:<12} "
+              f"{suite['passed'] + suite['flaky']:>7} {failed:>7} {suite['skipped']:>8} {suite['seconds']:>6.1f}s")
+    print("=" * 88)
+    modules = module_totals(suites)
+    for module, counts in sorted(modules.items()):
+        print(f"{module.upper():<8} {counts['passed'] + counts['flaky']}/{counts['tests']} passed ({pass_rate(counts)}%)")
+    totals = test_totals(suites)
+    print(f"TOTAL    {totals['passed'] + totals['flaky']}/{totals['tests']} passed ({pass_rate(totals)}%)")
+    if ingested["total"]:
+        print("Coverage: " + ", ".join(f"{metric} {pct}%" for metric, pct in ingested["total"].items()))
+
+
+def export(ingested: Dict, output: Path, push: bool = False):
+    """Write the registry of `ingested` to `output`, or with push send it to the metrics server"""
+    registry = build_registry(ingested)
+    if push and push_registry(registry, "dronedelivery-tests", {"service": "backend"}):
+        return
+    registry.write_file(output)
+    print(f"✅ Metrics exported to: {output}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Per-suite, per-module and per-file metrics from Jest results")
+    parser.add_argument("backend_path", help="DroneDelivery BackEnd directory")
+    parser.add_argument("--push", action="store_true", help="push to the metrics server instead of writing a file")
+    parser.add_argument("--no-index", action="store_true", help="summarize every suite, ignoring the index")
+    args = parser.parse_args(argv)
+
+    ingested = ingest(args.backend_path, use_index=not args.no_index)
+    if not ingested["suites"]:
+        print("[!] No Jest results found")
+        return 1
+    print(f"[*] {len(ingested['suites'])} suites, {ingested['summarized']} summarized, "
+          f"{len(ingested['files'])} covered files")
+    print_summary(ingested)
+    export(ingested, Path(__file__).resolve().parent.parent / "monitoring" / "metrics" / "dronedelivery_test_metrics.txt",
+           args.push)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Jest Workers - Run the DroneDelivery Jest suites in N parallel workers with isolated databases
+Test files are spread over the workers with the duration-balanced LPT plan of test_shards.py
+(durations from the run store, else the last test-results.json). Each worker is one
+`jest --runInBand` process with its own database namespace, TEST_DB_NAMESPACE=shard<i>:
+__tests__/setup.js names the database after it and JEST_WORKER_ID, on MONGODB_TEST_URL when
+set (one shared mongod), else on an in-memory server per test file. The workers' JSON outputs
+are merged into test-results.json and their coverage maps into the coverageMap and
+coverage/coverage-summary.json.
+
+Every run reports its speedup against the serial baseline: one --runInBand process running
+every file back to back. By default that baseline is an estimate (the files' expected
+durations plus one Jest start-up); --measure-serial times one real --runInBand run first.
+
+Usage: python jest_workers.py DroneDelivery-main/BackEnd [--workers N] [--no-coverage] [--measure-serial] [--push]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from metric_registry import MetricRegistry
+from metrics_push import push_registry
+from jest_ingest import build_registry, ingest
+from test_shards import DEFAULT_JEST_OVERHEAD, ShardRunner, collect_items, plan_shards, print_plan
+
+DEFAULT_WORKERS = os.cpu_count() or 2
+
+
+def plan_workers(jest_path: Path, workers: int) -> Tuple[List[Dict], List[Dict]]:
+    """(test files with their expected seconds, the non-empty worker plans)"""
+    # collect_items() finds the run store in <its first argument>/../monitoring/metrics,
+    # i.e. the repo root for DroneDelivery-main/BackEnd
+    items = collect_items(jest_path.parent, [], jest_path)
+    plan = plan_shards(items, max(1, min(workers, len(items))), jest_overhead=DEFAULT_JEST_OVERHEAD)
+    return items, [shard for shard in plan if shard["groups"]]
+
+
+def measure_serial(jest_path: Path, coverage: bool = True) -> float:
+    """Wall time of one real --runInBand run of every test file (its output is discarded)"""
+    fd, output = tempfile.mkstemp(prefix="jest-serial-", suffix=".json", dir=jest_path)
+    os.close(fd)
+    cmd = ["npx", "jest", "--runInBand", "--json", f"--outputFile={output}", "--passWithNoTests"]
+    if coverage:
+        cmd += ["--coverage", "--coverageReporters=none"]
+    print("[*] Measuring the serial baseline: one jest --runInBand run")
+    started = time.perf_counter()
+    try:
+        subprocess.run(cmd, cwd=str(jest_path), env=dict(os.environ, NODE_ENV="test", TEST_DB_NAMESPACE="serial"),
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    finally:
+        os.unlink(output)
+    return time.perf_counter() - started
+
+
+def run_workers(jest_path, workers: int = DEFAULT_WORKERS, coverage: bool = True,
+                serial: bool = False) -> Optional[Dict]:
+    """
+    Run the workers side by side and merge their output into test-results.json; with `serial`
+    the baseline is measured by one --runInBand run first, otherwise it is estimated.
+    Returns {workers, failures, wall_seconds, serial_seconds, serial_measured, speedup},
+    or None without test files.
+    """
+    jest_path = Path(jest_path)
+    items, plan = plan_workers(jest_path, workers)
+    if not plan:
+        print(f"[!] No Jest test files under {jest_path / '__tests__'}")
+        return None
+    print_plan(plan, items)
+    measured = measure_serial(jest_path, coverage) if serial else None
+
+    runner = ShardRunner(jest_path.parent, jest_path, jest_coverage=coverage)
+    failures = {}
+    started = time.perf_counter()
+    threads = [threading.Thread(target=lambda s=shard: failures.__setitem__(s["shard"], runner.run_shard(s)))
+               for shard in plan]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    runner.merge_jest(plan)
+
+    if measured is None:
+        serial_seconds = sum(item["seconds"] for item in items) + DEFAULT_JEST_OVERHEAD
+    else:
+        serial_seconds = measured
+    stats = {
+        "workers": len(plan),
+        "failures": sum(failures.values()),
+        "wall_seconds": round(wall, 2),
+        "serial_seconds": round(serial_seconds, 2),
+        "serial_measured": measured is not None,
+        "speedup": round(serial_seconds / wall, 2) if wall > 0 else 0,
+    }
+    if measured is None:
+        print(f"[*] {stats['workers']} workers: {wall:.1f}s wall, estimated serial baseline ~{serial_seconds:.1f}s "
+              f"-> estimated speedup x{stats['speedup']:.2f} (--measure-serial to measure it)")
+    else:
+        print(f"[*] {stats['workers']} workers: {wall:.1f}s wall, measured serial run {serial_seconds:.1f}s "
+              f"-> speedup x{stats['speedup']:.2f}")
+    return stats
+
+
+def add_speedup_metrics(registry: MetricRegistry, stats: Dict):
+    registry.gauge("dronedelivery_test_workers", "Parallel Jest workers of the last run").set(stats["workers"])
+    registry.gauge("dronedelivery_test_wall_seconds", "Wall time of the parallel Jest workers").set(stats["wall_seconds"])
+    registry.gauge("dronedelivery_test_serial_seconds",
+                   "Wall time of one --runInBand Jest process (estimated unless measured)").set(stats["serial_seconds"])
+    registry.gauge("dronedelivery_test_serial_measured",
+                   "1 if the serial baseline was a real --runInBand run, 0 if estimated").set(int(stats["serial_measured"]))
+    registry.gauge("dronedelivery_test_speedup", "Serial baseline / parallel wall time").set(stats["speedup"])
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run the DroneDelivery Jest tests in parallel workers")
+    parser.add_argument("jest_path", help="DroneDelivery BackEnd directory")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Jest processes (default: CPUs)")
+    parser.add_argument("--no-coverage", action="store_true", help="skip coverage (keeps the last coverage summary)")
+    parser.add_argument("--measure-serial", action="store_true",
+                        help="time one real --runInBand run as the serial baseline instead of estimating it")
+    parser.add_argument("--push", action="store_true", help="push to the metrics server instead of writing a file")
+    args = parser.parse_args(argv)
+
+    stats = run_workers(args.jest_path, args.workers, coverage=not args.no_coverage, serial=args.measure_serial)
+    if stats is None:
+        return 1
+    registry = build_registry(ingest(args.jest_path))
+    add_speedup_metrics(registry, stats)
+    if not (args.push and push_registry(registry, "dronedelivery-tests", {"service": "backend"})):
+        output = Path(__file__).resolve().parent.parent / "monitoring" / "metrics" / "dronedelivery_test_metrics.txt"
+        registry.write_file(output)
+        print(f"[+] Metrics written to {output}")
+    return 1 if stats["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
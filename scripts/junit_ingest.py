@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+JUnit Ingest - Shared, incremental reader for surefire/JUnit XML reports
+Reports are streamed through expat with start-element handlers only, so just the
+<testsuite>/<testcase> attributes and statuses are kept: captured stdout in <system-out>
+is never held in memory, and no element tree is built. New and modified files are parsed
+in parallel across a process pool; unchanged ones are served from a small index per report
+directory, keyed by (name, mtime, size).
+
+Index directory: .test-cache/junit/ at the repo root, or TEST_RESULT_CACHE_DIR/junit
+(an empty TEST_RESULT_CACHE_DIR disables the index).
+
+Usage: python junit_ingest.py [root] [--pattern '**/target/surefire-reports/*.xml'] [--workers N] [--no-index]
+       python junit_ingest.py --benchmark 2000                                  (synthetic reports + timings)
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import hashlib
+import argparse
+import tempfile
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from xml.parsers import expat
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from test_result_cache import DEFAULT_CACHE_DIR
+
+INDEX_VERSION = 2
+REPORT_PATTERN = "**/target/surefire-reports/*.xml"
+# Below this many files to parse, starting worker processes costs more than it saves
+PARALLEL_THRESHOLD = 16
+# flakyFailure/flakyError: failed, then passed on a rerun (flaky_tests.py, surefire's rerunFailingTestsCount)
+_STATUS = {"failure": "failed", "error": "error", "skipped": "skipped", "flakyFailure": "flaky", "flakyError": "flaky"}
+
+
+def _number(value, cast=int):
+    try:
+        return cast(value or 0)
+    except ValueError:
+        return cast(0)
+
+
+def parse_report(path) -> Dict:
+    """
+    Suite dict of one report: name, tests, failures, errors, skipped, time and its
+    testcases (classname, name, time, status: passed/failed/error/skipped/flaky). Raises ExpatError / ValueError / OSError.
+    """
+    suite = {}
+    testcases = []
+
+    def start(tag, attrs):
+        if tag == "testsuite" and not suite:
+            suite.update({
+                "name": attrs.get("name", ""),
+                "tests": _number(attrs.get("tests")),
+                "failures": _number(attrs.get("failures")),
+                "errors": _number(attrs.get("errors")),
+                "skipped": _number(attrs.get("skipped")),
+                "time": _number(attrs.get("time"), float),
+            })
+        elif tag == "testcase":
+            testcases.append({
+                "classname": attrs.get("classname", ""),
+                "name": attrs.get("name", ""),
+                "time": _number(attrs.get("time"), float),
+                "status": "passed",
+            })
+        elif tag in _STATUS and testcases and testcases[-1]["status"] == "passed":
+            testcases[-1]["status"] = _STATUS[tag]
+
+    # No character data handler: text (captured stdout) is discarded chunk by chunk as the
+    # file is read, instead of being collected into element text
+    parser = expat.ParserCreate()
+    parser.StartElementHandler = start
+    with open(path, "rb") as f:
+        parser.ParseFile(f)
+    if not suite:
+        raise ValueError(f"no <testsuite> element in {path}")
+    suite["testcases"] = testcases
+    return suite
+
+
+def _parse_or_error(path: str) -> Tuple[Optional[Dict], Optional[str]]:
+    # Runs in the worker processes: errors are returned, not raised, so one bad file
+    # does not cancel the batch
+    try:
+        return parse_report(path), None
+    except (expat.ExpatError, ValueError, OSError) as e:
+        return None, str(e)
+
+
+def service_of(path) -> str:
+    """Service directory of a report: the parent of `target`"""
+    parts = Path(path).parts
+    for i in range(len(parts) - 1, 0, -1):
+        if parts[i] == "target":
+            return parts[i - 1]
+    return "unknown"
+
+
+def index_dir(name: str = "junit") -> Optional[Path]:
+    root = os.environ.get("TEST_RESULT_CACHE_DIR")
+    if root is None:
+        return DEFAULT_CACHE_DIR / name
+    return Path(root) / name if root else None
+
+
+class ReportIndex:
+    """Parsed suites of one report directory, valid while a file's mtime and size are unchanged"""
+
+    def __init__(self, reports_dir: Path, root: Optional[Path]):
+        self.path = None
+        self.files: Dict[str, List] = {}
+        self.dirty = False
+        if root is None:
+            return
+        digest = hashlib.sha1(str(reports_dir.resolve()).encode()).hexdigest()[:16]
+        self.path = root / f"{reports_dir.parent.parent.name or 'root'}-{digest}.json"
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if data.get("version") == INDEX_VERSION:
+                self.files = data["files"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def get(self, name: str, stat) -> Optional[Dict]:
+        cached = self.files.get(name)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        return None
+
+    def put(self, name: str, stat, suite: Dict):
+        self.files[name] = [stat.st_mtime_ns, stat.st_size, suite]
+        self.dirty = True
+
+    def prune(self, reports_dir: Path, seen: Iterable[str]):
+        """Forget deleted files (callers may ingest only part of a directory, e.g. TEST-*.xml)"""
+        seen = set(seen)
+        stale = [name for name in self.files if name not in seen and not (reports_dir / name).exists()]
+        for name in stale:
+            del self.files[name]
+        self.dirty = self.dirty or bool(stale)
+
+    def save(self):
+        # Only a memo: two runners ingesting the same directory may overwrite each other's additions
+        if self.path is None or not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_name = tempfile.mkstemp(prefix=self.path.stem + ".", suffix=".tmp", dir=self.path.parent)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "files": self.files}, f)
+        os.replace(temp_name, self.path)
+        self.dirty = False
+
+
+def ingest(paths: Iterable, service: Optional[str] = None, workers: Optional[int] = None,
+           use_index: bool = True) -> List[Dict]:
+    """
+    Suites of the given report files, in path order. Each suite gets `service` (or the
+    service directory of its file) and `file`; unreadable files are reported and skipped.
+    """
+    paths = sorted(Path(path) for path in paths)
+    root = index_dir() if use_index else None
+    indexes: Dict[Path, ReportIndex] = {}
+    results: Dict[Path, Dict] = {}
+    stats = {}
+    misses = []
+    for path in paths:
+        try:
+            stat = path.stat()
+        except OSError as e:
+            print(f"[!] Error parsing {path}: {e}")
+            continue
+        index = indexes.get(path.parent)
+        if index is None:
+            index = indexes[path.parent] = ReportIndex(path.parent, root)
+        stats[path] = stat
+        suite = index.get(path.name, stat)
+        if suite is not None:
+            results[path] = suite
+        else:
+            misses.append(path)
+
+    if workers is None:
+        workers = min(len(misses) // PARALLEL_THRESHOLD, os.cpu_count() or 1)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = list(pool.map(_parse_or_error, [str(path) for path in misses], chunksize=8))
+    else:
+        parsed = [_parse_or_error(str(path)) for path in misses]
+    for path, (suite, error) in zip(misses, parsed):
+        if suite is None:
+            print(f"[!] Error parsing {path}: {error}")
+            continue
+        results[path] = suite
+        indexes[path.parent].put(path.name, stats[path], suite)
+
+    for directory, index in indexes.items():
+        index.prune(directory, (path.name for path in stats if path.parent == directory))
+        index.save()
+    return [dict(results[path], service=service or service_of(path), file=path.name)
+            for path in paths if path in results]
+
+
+def find_reports(root=".", pattern: str = REPORT_PATTERN) -> List[Path]:
+    return sorted(Path(path) for path in glob.glob(str(Path(root) / pattern), recursive=True))
+
+
+def benchmark(files: int, workdir: Optional[str] = None):
+    """Write synthetic reports (every 20th with 2 MB of captured stdout) and time full-tree
+    ET.parse against a cold and a warm ingest"""
+    with tempfile.TemporaryDirectory(prefix="junit-ingest-bench-", dir=workdir) as tmp:
+        os.environ["TEST_RESULT_CACHE_DIR"] = str(Path(tmp) / "cache")
+        output = "x" * 99 + "\n"
+        paths = []
+        for i in range(files):
+            reports = Path(tmp) / f"service{i % 6}" / "target" / "surefire-reports"
+            reports.mkdir(parents=True, exist_ok=True)
+            cases = "".join(f'<testcase classname="com.foodfast.Suite{i}Test" name="test{c}" time="0.01"/>'
+                            for c in range(10))
+            stdout = output * 20000 if i % 20 == 0 else output * 10
+            path = reports / f"TEST-com.foodfast.Suite{i}Test.xml"
+            path.write_text(f'<?xml version="1.0" encoding="UTF-8"?>\n<testsuite name="com.foodfast.Suite{i}Test" '
+                            f'tests="10" failures="0" errors="0" skipped="0" time="0.1">{cases}'
+                            f'<system-out><![CDATA[{stdout}]]></system-out></testsuite>', encoding="utf-8")
+            paths.append(path)
+        size = sum(path.stat().st_size for path in paths) / (1024 * 1024)
+        print(f"[*] {files} reports, {size:.0f} MB")
+
+        timings = []
+        started = time.perf_counter()
+        for path in paths:
+            root = ET.parse(path).getroot()
+            [case.attrib for case in root.iter("testcase")]
+        timings.append(("ET.parse, every file", time.perf_counter() - started))
+        for label, kwargs in (("ingest, 1 process", {"workers": 1, "use_index": False}),
+                              ("ingest, process pool (cold index)", {}),
+                              ("ingest, warm index", {})):
+            started = time.perf_counter()
+            suites = ingest(paths, **kwargs)
+            timings.append((label, time.perf_counter() - started))
+        assert sum(suite["tests"] for suite in suites) == files * 10
+        for label, seconds in timings:
+            print(f"[+] {label:<34} {seconds * 1000:8.0f} ms")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Parse surefire/JUnit XML reports incrementally")
+    parser.add_argument("root", nargs="?", default=".", help="directory to search (default: .)")
+    parser.add_argument("--pattern", default=REPORT_PATTERN, help=f"glob for report files (default: {REPORT_PATTERN})")
+    parser.add_argument("--workers", type=int, help="parser processes (default: by file count and CPUs)")
+    parser.add_argument("--no-index", action="store_true", help="parse every file, ignoring the index")
+    parser.add_argument("--benchmark", type=int, metavar="FILES", help="time ingestion of this many synthetic reports")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        benchmark(args.benchmark)
+        return 0
+
+    started = time.perf_counter()
+    paths = find_reports(args.root, args.pattern)
+    suites = ingest(paths, workers=args.workers, use_index=not args.no_index)
+    elapsed = time.perf_counter() - started
+
+    by_service: Dict[str, List[Dict]] = {}
+    for suite in suites:
+        by_service.setdefault(suite["service"], []).append(suite)
+    for service, service_suites in sorted(by_service.items()):
+        tests = sum(suite["tests"] for suite in service_suites)
+        failed = sum(suite["failures"] + suite["errors"] for suite in service_suites)
+        print(f"{service:<24} {len(service_suites):>5} reports  {tests:>6} tests  {failed:>4} failed")
+    print(f"[*] {len(suites)}/{len(paths)} reports ingested in {elapsed * 1000:.0f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,784 @@
+#!/usr/bin/env python3
+"""
+K6 Results Analyzer - Streaming aggregation of k6 NDJSON output (k6 run --out json=...)
+Reads the results file line by line through a generator pipeline, so memory stays flat
+no matter how large the file is. Produces per-metric and per-tag (name/status/method) aggregates,
+with p50/p90/p95/p99/p99.9 for trend metrics taken from mergeable DDSketches (see k6_sketch.py).
+
+Large files can be split at newline boundaries and parsed by a process pool (--workers N);
+each worker returns partial aggregates that are merged, with output identical to a single pass.
+When --metric is given the file is memory-mapped and lines for other metrics are skipped with
+byte searches, without being decoded or passed to json.loads.
+--follow tails a file that k6 is still writing: only newly appended complete lines are parsed
+and folded into the running aggregates and sketches.
+
+Usage: python k6_analyzer.py [k6-results.json] [--metric http_req_duration ...] [--output summary.json]
+       python k6_analyzer.py big-results.json --workers 8
+       python k6_analyzer.py k6-results.json --follow --interval 5
+       python k6_analyzer.py k6-results.json --save-sketches run1.sketch.json --check-thresholds
+       python k6_analyzer.py --merge-sketches run1.sketch.json run2.sketch.json --check-thresholds
+"""
+
+import os
+import re
+import sys
+import json
+import mmap
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from k6_sketch import DDSketch, ExactSum, save_sketch_file, load_sketch_file
+
+DEFAULT_RESULTS_FILE = Path(__file__).resolve().parent.parent / "k6-results.json"
+
+# Tags that get their own breakdown for every metric
+GROUP_TAGS = ("name", "status", "method")
+
+# Percentiles reported for trend metrics
+TREND_PERCENTILES = (50, 90, 95, 99, 99.9)
+
+SKETCH_FILE_VERSION = 1
+
+# Byte ranges handed to each worker; several per worker keeps the pool balanced
+CHUNKS_PER_WORKER = 4
+
+THRESHOLD_PATTERN = re.compile(
+    r"^\s*(?P<agg>avg|min|max|med|count|rate|value|p\((?P<pct>\d+(?:\.\d+)?)\))"
+    r"\s*(?P<op><=|>=|===|==|!=|<|>)\s*(?P<target>-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)\s*$"
+)
+
+_EPOCH_CACHE_LIMIT = 4096
+_epoch_cache: Dict[str, int] = {}
+
+
+def parse_time_ns(ts: str) -> int:
+    """
+    Convert a k6 RFC3339 timestamp (e.g. 2025-11-22T18:11:58.982454391Z) to epoch nanoseconds.
+    datetime cannot hold nanoseconds, so the fraction is parsed separately and the
+    whole-second part is cached (consecutive points share the same second).
+    """
+    if ts.endswith("Z"):
+        body, offset = ts[:-1], "+00:00"
+    else:
+        body, offset = ts[:-6], ts[-6:]
+    key = body[:19] + offset
+    seconds = _epoch_cache.get(key)
+    if seconds is None:
+        if len(_epoch_cache) >= _EPOCH_CACHE_LIMIT:
+            _epoch_cache.clear()
+        seconds = int(datetime.fromisoformat(key).timestamp())
+        _epoch_cache[key] = seconds
+    fraction = body[20:]
+    nanos = int(fraction[:9].ljust(9, "0")) if fraction else 0
+    return seconds * 1_000_000_000 + nanos
+
+
+def read_lines(path) -> Iterator[bytes]:
+    """Yield non-empty raw lines from an NDJSON file"""
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield line
+
+
+def split_byte_ranges(path, parts: int) -> List[Tuple[int, int]]:
+    """Split a file into up to `parts` byte ranges that start and end on line boundaries"""
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+    boundaries = [0]
+    with open(path, "rb") as f:
+        for i in range(1, parts):
+            f.seek(size * i // parts)
+            f.readline()
+            position = f.tell()
+            if boundaries[-1] < position < size:
+                boundaries.append(position)
+    boundaries.append(size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def read_range_lines(path, start: int, end: int) -> Iterator[bytes]:
+    """Yield non-empty lines from the byte range [start, end) of an NDJSON file"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        position = start
+        for line in f:
+            position += len(line)
+            if line.strip():
+                yield line
+            if position >= end:
+                break
+
+
+def scan_metric_lines(path, metrics: Iterable[str], start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+    """
+    Yield only the lines of [start, end) that mention one of `metrics`, found by searching
+    the memory-mapped file for the '"metric":"<name>"' key. k6 writes compact JSON, so the
+    key appears verbatim; quotes inside string values are escaped and cannot match.
+    Each metric is scanned separately in file order, which keeps per-metric ordering intact.
+    """
+    if os.path.getsize(path) == 0:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        end = len(mm) if end is None else end
+        for metric in metrics:
+            pattern = b'"metric":"' + metric.encode("utf-8") + b'"'
+            position = start
+            while True:
+                hit = mm.find(pattern, position, end)
+                if hit < 0:
+                    break
+                line_start = mm.rfind(b"\n", start, hit) + 1 or start
+                line_end = mm.find(b"\n", hit, end)
+                if line_end < 0:
+                    line_end = end
+                yield mm[line_start:line_end]
+                position = line_end + 1
+
+
+class FileFollower:
+    """
+    Tracks how far an append-only file has been consumed (like tail -f).
+    poll() returns the byte range of lines completed since the last call; a trailing
+    partial line stays unconsumed until its newline is written.
+    """
+
+    TAIL_BLOCK = 64 * 1024
+
+    def __init__(self, path, offset: int = 0):
+        self.path = Path(path)
+        self.offset = offset
+        self._inode = None
+
+    def poll(self) -> Tuple[bool, Optional[Tuple[int, int]]]:
+        """(reset, range): reset is True when the file was truncated or replaced"""
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return False, None
+
+        reset = False
+        if (self._inode is not None and stat.st_ino != self._inode) or stat.st_size < self.offset:
+            self.offset = 0
+            reset = True
+        self._inode = stat.st_ino
+
+        if stat.st_size == self.offset:
+            return reset, None
+        end = self._last_line_end(stat.st_size)
+        if end <= self.offset:
+            return reset, None
+        start, self.offset = self.offset, end
+        return reset, (start, end)
+
+    def _last_line_end(self, size: int) -> int:
+        """Position just after the last newline in [offset, size)"""
+        with open(self.path, "rb") as f:
+            block_end = size
+            while block_end > self.offset:
+                block_start = max(self.offset, block_end - self.TAIL_BLOCK)
+                f.seek(block_start)
+                newline = f.read(block_end - block_start).rfind(b"\n")
+                if newline >= 0:
+                    return block_start + newline + 1
+                block_end = block_start
+        return self.offset
+
+
+def parse_records(lines: Iterable[bytes]) -> Iterator[Dict]:
+    """Decode NDJSON lines, skipping malformed ones (e.g. a partially written last line)"""
+    for line in lines:
+        try:
+            yield json.loads(line)
+        except ValueError:
+            continue
+
+
+def select_metrics(records: Iterable[Dict], metrics: Optional[Iterable[str]] = None) -> Iterator[Dict]:
+    """Keep only records (definitions and points) for the requested metrics"""
+    if not metrics:
+        yield from records
+        return
+    wanted = set(metrics)
+    for record in records:
+        if record.get("metric") in wanted:
+            yield record
+
+
+def percentile_key(pct: float) -> str:
+    """Summary key for a percentile, e.g. 95 -> 'p95', 99.9 -> 'p99.9'"""
+    return f"p{pct:g}"
+
+
+class MetricStats:
+    """Constant-size running statistics for a stream of metric values"""
+
+    __slots__ = ("count", "_total", "min", "max", "last", "nonzero", "sketch")
+
+    def __init__(self, with_sketch: bool = False):
+        self.count = 0
+        self._total = ExactSum()
+        self.min = None
+        self.max = None
+        self.last = None
+        self.nonzero = 0
+        self.sketch = DDSketch() if with_sketch else None
+
+    @property
+    def total(self) -> float:
+        return self._total.value
+
+    def add(self, value: float):
+        self.count += 1
+        self._total.add(value)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        self.last = value
+        if value:
+            self.nonzero += 1
+        if self.sketch is not None:
+            self.sketch.add(value)
+
+    def merge(self, other: "MetricStats"):
+        """Fold another partial aggregate into this one"""
+        self.count += other.count
+        self._total.merge(other._total)
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        if other.last is not None:
+            self.last = other.last
+        self.nonzero += other.nonzero
+        if other.sketch is not None:
+            if self.sketch is None:
+                self.sketch = DDSketch(other.sketch.relative_accuracy, other.sketch.max_bins)
+            self.sketch.merge(other.sketch)
+
+    @classmethod
+    def from_sketch(cls, sketch: DDSketch) -> "MetricStats":
+        """Rebuild trend statistics from a deserialized sketch"""
+        stats = cls()
+        stats.sketch = sketch
+        stats.count = sketch.count
+        stats._total = ExactSum(sketch.sum)
+        stats.min = sketch.min
+        stats.max = sketch.max
+        return stats
+
+    def aggregation(self, name: str, metric_type: str, duration_sec: float = 0.0) -> Optional[float]:
+        """Value of a k6 threshold aggregation (avg, med, p(95), rate, count, ...)"""
+        if name.startswith("p("):
+            return self.sketch.quantile(float(name[2:-1]) / 100) if self.sketch else None
+        if name == "med":
+            return self.sketch.quantile(0.5) if self.sketch else None
+        if name == "avg":
+            return self.total / self.count if self.count else 0
+        if name == "min":
+            return self.min
+        if name == "max":
+            return self.max
+        if name == "rate":
+            if metric_type == "rate":
+                return self.nonzero / self.count if self.count else 0
+            return self.total / duration_sec if duration_sec > 0 else 0
+        if name == "count":
+            return self.total
+        if name == "value":
+            return self.last
+        return None
+
+    def to_dict(self, metric_type: str, duration_sec: float) -> Dict:
+        """Summarize according to the k6 metric type (trend/counter/rate/gauge)"""
+        if metric_type == "counter":
+            return {
+                "count": round(self.total, 6),
+                "rate_per_sec": round(self.total / duration_sec, 6) if duration_sec > 0 else 0,
+            }
+        if metric_type == "rate":
+            return {
+                "rate": round(self.nonzero / self.count, 6) if self.count else 0,
+                "passes": self.nonzero,
+                "fails": self.count - self.nonzero,
+            }
+        if metric_type == "gauge":
+            return {"value": self.last, "min": self.min, "max": self.max}
+        summary = {
+            "count": self.count,
+            "avg": round(self.total / self.count, 6) if self.count else 0,
+            "min": self.min,
+            "max": self.max,
+        }
+        if self.sketch is not None:
+            for pct in TREND_PERCENTILES:
+                estimate = self.sketch.quantile(pct / 100)
+                summary[percentile_key(pct)] = round(estimate, 6) if estimate is not None else None
+        return summary
+
+
+class MetricAggregate:
+    """Aggregates for one k6 metric, overall and broken down by GROUP_TAGS"""
+
+    def __init__(self, name: str, metric_type: str = "trend", thresholds=None):
+        self.name = name
+        self.type = metric_type
+        self.thresholds = list(thresholds or [])
+        self.defined = thresholds is not None
+        self.overall = MetricStats(self.type == "trend")
+        self.by_tag: Dict[str, Dict[str, MetricStats]] = {tag: {} for tag in GROUP_TAGS}
+        # First and last sample of this metric: its own span, whatever else the run recorded
+        self.start_ns: Optional[int] = None
+        self.end_ns: Optional[int] = None
+
+    def set_type(self, metric_type: str):
+        """Apply the type from a metric definition; only trends keep sketches"""
+        self.type = metric_type
+        self.defined = True
+        if metric_type != "trend":
+            self._drop_sketches()
+
+    def _drop_sketches(self):
+        # A chunk that saw points before the metric definition assumed "trend"
+        self.overall.sketch = None
+        for groups in self.by_tag.values():
+            for stats in groups.values():
+                stats.sketch = None
+
+    def add(self, value: float, tags: Dict):
+        self.overall.add(value)
+        for tag in GROUP_TAGS:
+            tag_value = tags.get(tag)
+            if tag_value is None:
+                continue
+            groups = self.by_tag[tag]
+            stats = groups.get(tag_value)
+            if stats is None:
+                stats = groups[tag_value] = MetricStats(self.type == "trend")
+            stats.add(value)
+
+    def observe_time(self, time_ns: Optional[int]):
+        if time_ns is None:
+            return
+        if self.start_ns is None or time_ns < self.start_ns:
+            self.start_ns = time_ns
+        if self.end_ns is None or time_ns > self.end_ns:
+            self.end_ns = time_ns
+
+    @property
+    def duration_sec(self) -> float:
+        if self.start_ns is None:
+            return 0.0
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def merge(self, other: "MetricAggregate"):
+        self.observe_time(other.start_ns)
+        self.observe_time(other.end_ns)
+        if other.defined:
+            self.set_type(other.type)
+            self.thresholds = list(other.thresholds)
+        self.overall.merge(other.overall)
+        for tag, groups in other.by_tag.items():
+            mine = self.by_tag.setdefault(tag, {})
+            for tag_value, stats in groups.items():
+                if tag_value not in mine:
+                    mine[tag_value] = MetricStats()
+                mine[tag_value].merge(stats)
+        if self.defined and self.type != "trend":
+            self._drop_sketches()
+
+    def to_sketch_dict(self) -> Dict:
+        return {
+            "type": self.type,
+            "thresholds": self.thresholds,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "sketch": self.overall.sketch.to_dict(),
+            "tags": {
+                tag: {value: stats.sketch.to_dict() for value, stats in groups.items()}
+                for tag, groups in self.by_tag.items() if groups
+            },
+        }
+
+    @classmethod
+    def from_sketch_dict(cls, name: str, data: Dict) -> "MetricAggregate":
+        aggregate = cls(name, data.get("type", "trend"), data.get("thresholds") or [])
+        aggregate.overall = MetricStats.from_sketch(DDSketch.from_dict(data["sketch"]))
+        aggregate.observe_time(data.get("start_ns"))
+        aggregate.observe_time(data.get("end_ns"))
+        for tag, groups in data.get("tags", {}).items():
+            aggregate.by_tag[tag] = {
+                value: MetricStats.from_sketch(DDSketch.from_dict(sketch))
+                for value, sketch in groups.items()
+            }
+        return aggregate
+
+    def to_dict(self, duration_sec: float) -> Dict:
+        return {
+            "type": self.type,
+            "thresholds": self.thresholds,
+            **self.overall.to_dict(self.type, duration_sec),
+            "tags": {
+                tag: {
+                    value: stats.to_dict(self.type, duration_sec)
+                    for value, stats in sorted(groups.items())
+                }
+                for tag, groups in self.by_tag.items() if groups
+            },
+        }
+
+
+class K6ResultsAnalyzer:
+    def __init__(self, metrics: Optional[Iterable[str]] = None):
+        self.metric_filter = list(metrics) if metrics else None
+        self.reset()
+
+    def reset(self):
+        self.aggregates: Dict[str, MetricAggregate] = {}
+        self.points = 0
+        self.start_ns = None
+        self.end_ns = None
+
+    def _aggregate(self, name: str) -> MetricAggregate:
+        aggregate = self.aggregates.get(name)
+        if aggregate is None:
+            aggregate = self.aggregates[name] = MetricAggregate(name)
+        return aggregate
+
+    def consume(self, records: Iterable[Dict]):
+        """Fold a stream of k6 records into the running aggregates"""
+        for record in records:
+            record_type = record.get("type")
+            data = record.get("data") or {}
+
+            if record_type == "Metric":
+                aggregate = self._aggregate(data.get("name") or record.get("metric"))
+                aggregate.set_type(data.get("type", aggregate.type))
+                aggregate.thresholds = data.get("thresholds") or []
+                continue
+
+            if record_type != "Point":
+                continue
+
+            value = data.get("value")
+            if value is None:
+                continue
+
+            aggregate = self._aggregate(record.get("metric"))
+            aggregate.add(value, data.get("tags") or {})
+            self.points += 1
+
+            timestamp = data.get("time")
+            if timestamp:
+                time_ns = parse_time_ns(timestamp)
+                aggregate.observe_time(time_ns)
+                if self.start_ns is None or time_ns < self.start_ns:
+                    self.start_ns = time_ns
+                if self.end_ns is None or time_ns > self.end_ns:
+                    self.end_ns = time_ns
+
+    def analyze_file(self, path, workers: int = 1, use_mmap: bool = True) -> Dict:
+        """Run the full streaming pipeline over a results file, optionally across processes"""
+        if workers > 1:
+            ranges = split_byte_ranges(path, workers * CHUNKS_PER_WORKER)
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                tasks = [(str(path), start, end, self.metric_filter, use_mmap) for start, end in ranges]
+                # map() yields in range order, so "last value" gauges merge deterministically
+                for partial in pool.map(_analyze_range, tasks):
+                    self.merge(partial)
+        else:
+            self.consume(_range_records(path, 0, None, self.metric_filter, use_mmap))
+        return self.summary(path)
+
+    def follow(self, path, interval: float = 5.0, use_mmap: bool = True,
+               on_update=None, stop_event=None):
+        """
+        Incrementally aggregate a file that is still being written. Every `interval` seconds
+        the newly completed lines are consumed and `on_update(analyzer)` is called.
+        Runs until stop_event is set (or KeyboardInterrupt).
+        """
+        follower = FileFollower(path)
+        while True:
+            reset, new_range = follower.poll()
+            if reset:
+                self.reset()
+            if new_range:
+                self.consume(_range_records(path, new_range[0], new_range[1], self.metric_filter, use_mmap))
+                if on_update:
+                    on_update(self)
+            if stop_event is not None:
+                if stop_event.wait(interval):
+                    return
+            else:
+                time.sleep(interval)
+
+    def merge(self, other: "K6ResultsAnalyzer"):
+        """Fold the partial aggregates of another analyzer (e.g. a later file chunk) into this one"""
+        for name, aggregate in other.aggregates.items():
+            if name in self.aggregates:
+                self.aggregates[name].merge(aggregate)
+            else:
+                self.aggregates[name] = aggregate
+        self.points += other.points
+        for time_ns in (other.start_ns, other.end_ns):
+            if time_ns is None:
+                continue
+            if self.start_ns is None or time_ns < self.start_ns:
+                self.start_ns = time_ns
+            if self.end_ns is None or time_ns > self.end_ns:
+                self.end_ns = time_ns
+
+    def save_sketches(self, output_file):
+        """Serialize the trend sketches so they can be merged across runs and shards"""
+        save_sketch_file({
+            "version": SKETCH_FILE_VERSION,
+            "points": self.points,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "metrics": {
+                name: aggregate.to_sketch_dict()
+                for name, aggregate in sorted(self.aggregates.items())
+                if aggregate.type == "trend" and aggregate.overall.sketch is not None
+            },
+        }, output_file)
+        print(f"[+] Sketches saved to {output_file}")
+
+    def merge_sketch_file(self, input_file):
+        """Merge a sketch file written by save_sketches into the running aggregates"""
+        data = load_sketch_file(input_file)
+        if data.get("version") != SKETCH_FILE_VERSION:
+            raise ValueError(f"unsupported sketch file version in {input_file}")
+        loaded = K6ResultsAnalyzer(self.metric_filter)
+        for name, metric in data.get("metrics", {}).items():
+            if self.metric_filter and name not in self.metric_filter:
+                continue
+            loaded.aggregates[name] = MetricAggregate.from_sketch_dict(name, metric)
+        loaded.points = data.get("points", 0)
+        loaded.start_ns = data.get("start_ns")
+        loaded.end_ns = data.get("end_ns")
+        self.merge(loaded)
+
+    def check_thresholds(self) -> List[Dict]:
+        """Evaluate the k6 'thresholds' of every metric against the aggregates"""
+        results = []
+        duration = self.duration_sec
+        for name, aggregate in sorted(self.aggregates.items()):
+            for threshold in aggregate.thresholds:
+                expression = threshold.get("threshold") if isinstance(threshold, dict) else threshold
+                results.append(evaluate_threshold(name, expression, aggregate, duration))
+        return results
+
+    @property
+    def duration_sec(self) -> float:
+        if self.start_ns is None:
+            return 0.0
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def summary(self, path=None) -> Dict:
+        duration = self.duration_sec
+        return {
+            "file": str(path) if path else None,
+            "generated_at": datetime.now().isoformat(),
+            "points": self.points,
+            "start": datetime.fromtimestamp(self.start_ns / 1e9).isoformat() if self.start_ns else None,
+            "end": datetime.fromtimestamp(self.end_ns / 1e9).isoformat() if self.end_ns else None,
+            "duration_sec": round(duration, 3),
+            "metrics": {
+                name: aggregate.to_dict(duration)
+                for name, aggregate in sorted(self.aggregates.items())
+            },
+        }
+
+    def print_summary(self, summary: Dict):
+        """Print summary to console"""
+        print("\n" + "=" * 70)
+        print("[*] K6 RESULTS SUMMARY")
+        print("=" * 70)
+        print(f"File:      {summary['file']}")
+        print(f"Points:    {summary['points']}")
+        print(f"Duration:  {summary['duration_sec']}s")
+        print("=" * 70)
+
+        for name, data in summary["metrics"].items():
+            if data["type"] == "trend":
+                print(f"{name:<28} avg={data['avg']:<12} min={data['min']:<12} max={data['max']:<12} n={data['count']}")
+                if data["count"]:
+                    percentiles = "  ".join(f"{percentile_key(p)}={data[percentile_key(p)]}" for p in TREND_PERCENTILES)
+                    print(f"{'':<28} {percentiles}")
+            elif data["type"] == "counter":
+                print(f"{name:<28} count={data['count']:<12} rate={data['rate_per_sec']}/s")
+            elif data["type"] == "rate":
+                print(f"{name:<28} rate={data['rate']:<12} passes={data['passes']:<8} fails={data['fails']}")
+            else:
+                print(f"{name:<28} value={data['value']:<12} min={data['min']:<12} max={data['max']}")
+
+        print("-" * 70 + "\n")
+
+
+def _range_records(path, start: int, end: Optional[int], metrics: Optional[List[str]],
+                   use_mmap: bool) -> Iterator[Dict]:
+    """Records of one byte range; the mmap scan is used when only some metrics are wanted"""
+    if metrics and use_mmap:
+        lines = scan_metric_lines(path, metrics, start, end)
+    elif end is None:
+        lines = read_lines(path)
+    else:
+        lines = read_range_lines(path, start, end)
+    # select_metrics still runs after the scan to drop lines where the key matched a tag
+    return select_metrics(parse_records(lines), metrics)
+
+
+def _analyze_range(task: Tuple[str, int, int, Optional[List[str]], bool]) -> K6ResultsAnalyzer:
+    """Process-pool worker: aggregate one byte range and return the partial state"""
+    path, start, end, metrics, use_mmap = task
+    analyzer = K6ResultsAnalyzer(metrics)
+    analyzer.consume(_range_records(path, start, end, metrics, use_mmap))
+    return analyzer
+
+
+def print_progress(analyzer: K6ResultsAnalyzer):
+    """One-line live status used by --follow"""
+    line = f"[{datetime.now().strftime('%H:%M:%S')}] points={analyzer.points}"
+    duration = analyzer.aggregates.get("http_req_duration")
+    if duration is not None and duration.overall.count:
+        p95 = duration.overall.aggregation("p(95)", duration.type)
+        line += f" http_req_duration p95={p95:.2f}ms avg={duration.overall.aggregation('avg', duration.type):.2f}ms"
+    requests = analyzer.aggregates.get("http_reqs")
+    if requests is not None and analyzer.duration_sec > 0:
+        line += f" rps={requests.overall.total / analyzer.duration_sec:.1f}"
+    failed = analyzer.aggregates.get("http_req_failed")
+    if failed is not None and failed.overall.count:
+        line += f" failed={failed.overall.nonzero / failed.overall.count:.2%}"
+    print(line, flush=True)
+
+
+def evaluate_threshold(metric: str, expression: str, aggregate: MetricAggregate, duration_sec: float = 0.0) -> Dict:
+    """Check one k6 threshold expression such as 'p(95)<1000' or 'rate<0.01'"""
+    result = {"metric": metric, "threshold": expression, "observed": None, "passed": False}
+    match = THRESHOLD_PATTERN.match(expression or "")
+    if not match:
+        result["error"] = "unsupported threshold expression"
+        return result
+
+    observed = aggregate.overall.aggregation(match.group("agg"), aggregate.type, duration_sec)
+    target = float(match.group("target"))
+    result["observed"] = round(observed, 6) if observed is not None else None
+    if observed is None:
+        result["error"] = "no data"
+        return result
+
+    op = match.group("op")
+    if op == "<":
+        result["passed"] = observed < target
+    elif op == "<=":
+        result["passed"] = observed <= target
+    elif op == ">":
+        result["passed"] = observed > target
+    elif op == ">=":
+        result["passed"] = observed >= target
+    elif op == "!=":
+        result["passed"] = observed != target
+    else:
+        result["passed"] = observed == target
+    return result
+
+
+def print_threshold_results(results: List[Dict]) -> bool:
+    """Print threshold outcomes; returns True when all passed"""
+    print("[*] THRESHOLDS")
+    print("-" * 70)
+    if not results:
+        print("(no thresholds defined)")
+    for result in results:
+        status = "[OK]" if result["passed"] else "[FAIL]"
+        detail = result.get("error") or f"observed={result['observed']}"
+        print(f"{status:<7} {result['metric']:<28} {result['threshold']:<16} {detail}")
+    print("-" * 70 + "\n")
+    return all(result["passed"] for result in results)
+
+
+def save_summary_json(summary: Dict, output_file: str):
+    """Save summary to JSON file"""
+    output_path = Path(output_file)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    print(f"[+] Summary saved to {output_path}")
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Streaming analyzer for k6 NDJSON results")
+    parser.add_argument("results", nargs="?", default=str(DEFAULT_RESULTS_FILE),
+                        help="k6 results file (default: k6-results.json at repo root)")
+    parser.add_argument("-m", "--metric", action="append", dest="metrics",
+                        help="only aggregate this metric (repeatable)")
+    parser.add_argument("-o", "--output", help="write the summary as JSON to this file")
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not print the summary table")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="parse newline-aligned chunks in this many processes (default: 1)")
+    parser.add_argument("--no-mmap", action="store_true",
+                        help="decode every line instead of byte-scanning for the --metric names")
+    parser.add_argument("-f", "--follow", action="store_true",
+                        help="keep reading lines appended by a running k6 test (Ctrl+C to stop)")
+    parser.add_argument("--interval", type=float, default=5.0,
+                        help="seconds between polls in --follow mode (default: 5)")
+    parser.add_argument("--save-sketches", metavar="FILE",
+                        help="serialize trend sketches to FILE for later merging")
+    parser.add_argument("--merge-sketches", nargs="+", metavar="FILE",
+                        help="merge saved sketch files instead of reading a results file")
+    parser.add_argument("--check-thresholds", action="store_true",
+                        help="evaluate the thresholds recorded in the results; exit 1 on failure")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_arg_parser().parse_args(argv)
+    analyzer = K6ResultsAnalyzer(args.metrics)
+
+    if args.merge_sketches:
+        print(f"[*] Merging {len(args.merge_sketches)} sketch file(s)")
+        for sketch_file in args.merge_sketches:
+            analyzer.merge_sketch_file(sketch_file)
+        summary = analyzer.summary(", ".join(args.merge_sketches))
+    elif args.follow:
+        results_file = Path(args.results)
+        print(f"[*] Following k6 results in: {results_file} (every {args.interval}s, Ctrl+C to stop)")
+        try:
+            analyzer.follow(results_file, args.interval, use_mmap=not args.no_mmap, on_update=print_progress)
+        except KeyboardInterrupt:
+            print("\n[*] Stopped following")
+        summary = analyzer.summary(results_file)
+    else:
+        results_file = Path(args.results)
+        if not results_file.exists():
+            print(f"[!] Results file not found: {results_file}")
+            return 1
+        print(f"[*] Analyzing k6 results from: {results_file}")
+        size_mb = results_file.stat().st_size / (1024 * 1024)
+        started = time.perf_counter()
+        summary = analyzer.analyze_file(results_file, workers=max(1, args.workers),
+                                        use_mmap=not args.no_mmap)
+        elapsed = time.perf_counter() - started
+        throughput = size_mb / elapsed if elapsed > 0 else 0
+        print(f"[*] Parsed {size_mb:.2f} MB in {elapsed:.2f}s ({throughput:.1f} MB/s, workers={max(1, args.workers)})")
+
+    if not args.quiet:
+        analyzer.print_summary(summary)
+    if args.output:
+        save_summary_json(summary, args.output)
+    if args.save_sketches:
+        analyzer.save_sketches(args.save_sketches)
+
+    if args.check_thresholds and not print_threshold_results(analyzer.check_thresholds()):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+K6 Columnar Store - One-time conversion of k6 NDJSON results into a compact columnar file
+Timestamps are stored as int64 nanoseconds, values as float64 and the metric name plus the
+name/status/method/url tags as dictionary-encoded int32 columns. Later queries memory-map the
+columns with NumPy instead of re-parsing the JSON.
+
+File layout (.k6col):
+    8 bytes   magic b"K6COL01\\n"
+    8 bytes   little-endian uint64 header length
+    N bytes   JSON header (row count, column offsets/dtypes, dictionaries, metric definitions)
+    columns   raw little-endian arrays, each aligned to 8 bytes
+
+Usage: python k6_columnar.py convert [k6-results.json] [-o k6-results.k6col]
+       python k6_columnar.py query k6-results.k6col --metric http_req_duration --group-by name
+"""
+
+import sys
+import json
+import struct
+import argparse
+import tempfile
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from k6_analyzer import DEFAULT_RESULTS_FILE, parse_time_ns, read_lines, scan_metric_lines, parse_records
+
+try:
+    import numpy as np
+except ImportError:  # conversion works without NumPy, queries need it
+    np = None
+
+MAGIC = b"K6COL01\n"
+FORMAT_VERSION = 1
+DEFAULT_TAG_COLUMNS = ("name", "status", "method", "url")
+MISSING_CODE = -1
+
+# Rows buffered per column before spilling to the temporary column files
+FLUSH_ROWS = 65536
+
+
+class ColumnWriter:
+    """Streams k6 points into per-column temporary files with constant memory"""
+
+    def __init__(self, tag_columns: Sequence[str] = DEFAULT_TAG_COLUMNS):
+        self.tag_columns = list(tag_columns)
+        self.column_types = {"time_ns": "q", "value": "d", "metric": "i"}
+        self.column_types.update({f"tag_{tag}": "i" for tag in self.tag_columns})
+        self.dictionaries: Dict[str, Dict[str, int]] = {"metric": {}}
+        self.dictionaries.update({tag: {} for tag in self.tag_columns})
+        self.definitions: Dict[str, Dict] = {}
+        self.rows = 0
+        self._tmpdir = tempfile.TemporaryDirectory(prefix="k6col-")
+        self._spill = {
+            column: open(Path(self._tmpdir.name) / column, "wb")
+            for column in self.column_types
+        }
+        self._buffers = {column: array(code) for column, code in self.column_types.items()}
+
+    @staticmethod
+    def _encode(dictionary: Dict[str, int], value) -> int:
+        if value is None:
+            return MISSING_CODE
+        code = dictionary.get(value)
+        if code is None:
+            code = dictionary[value] = len(dictionary)
+        return code
+
+    def add_records(self, records: Iterable[Dict]):
+        buffers = self._buffers
+        for record in records:
+            record_type = record.get("type")
+            data = record.get("data") or {}
+            if record_type == "Metric":
+                self.definitions[data.get("name") or record.get("metric")] = {
+                    "type": data.get("type"),
+                    "thresholds": data.get("thresholds") or [],
+                }
+                continue
+            if record_type != "Point" or data.get("value") is None or not data.get("time"):
+                continue
+
+            tags = data.get("tags") or {}
+            buffers["time_ns"].append(parse_time_ns(data["time"]))
+            buffers["value"].append(float(data["value"]))
+            buffers["metric"].append(self._encode(self.dictionaries["metric"], record.get("metric")))
+            for tag in self.tag_columns:
+                buffers[f"tag_{tag}"].append(self._encode(self.dictionaries[tag], tags.get(tag)))
+
+            self.rows += 1
+            if len(buffers["value"]) >= FLUSH_ROWS:
+                self._flush()
+
+    def _flush(self):
+        for column, buffer in self._buffers.items():
+            if sys.byteorder != "little":
+                buffer.byteswap()
+            buffer.tofile(self._spill[column])
+            self._buffers[column] = array(buffer.typecode)
+
+    def write(self, output_file, source=None) -> Path:
+        """Assemble header and column blocks into the final file"""
+        self._flush()
+        for handle in self._spill.values():
+            handle.close()
+
+        dtypes = {"q": "<i8", "d": "<f8", "i": "<i4"}
+        columns = {}
+        header = {
+            "version": FORMAT_VERSION,
+            "source": str(source) if source else None,
+            "rows": self.rows,
+            "tag_columns": self.tag_columns,
+            "metrics": self.definitions,
+            "dictionaries": {
+                name: sorted(mapping, key=mapping.get)
+                for name, mapping in self.dictionaries.items()
+            },
+            "columns": columns,
+        }
+
+        # Offsets depend on the header size, which depends on the offsets; iterate until stable
+        data_start = 0
+        while True:
+            offset = data_start
+            for column, code in self.column_types.items():
+                columns[column] = {"dtype": dtypes[code], "offset": offset}
+                offset += self.rows * array(code).itemsize
+                offset += -offset % 8
+            header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+            needed = len(MAGIC) + 8 + len(header_bytes)
+            needed += -needed % 8
+            if needed == data_start:
+                break
+            data_start = needed
+
+        output_path = Path(output_file)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(output_path, "wb") as out:
+            out.write(MAGIC)
+            out.write(struct.pack("<Q", len(header_bytes)))
+            out.write(header_bytes)
+            for column in self.column_types:
+                out.write(b"\0" * (columns[column]["offset"] - out.tell()))
+                with open(Path(self._tmpdir.name) / column, "rb") as spill:
+                    while True:
+                        block = spill.read(1 << 20)
+                        if not block:
+                            break
+                        out.write(block)
+            out.write(b"\0" * (-out.tell() % 8))
+
+        self._tmpdir.cleanup()
+        return output_path
+
+
+def convert(results_file, output_file, metrics: Optional[List[str]] = None,
+            tag_columns: Sequence[str] = DEFAULT_TAG_COLUMNS) -> Path:
+    """Convert a k6 NDJSON results file to the columnar format"""
+    lines = scan_metric_lines(results_file, metrics) if metrics else read_lines(results_file)
+    writer = ColumnWriter(tag_columns)
+    writer.add_records(parse_records(lines))
+    return writer.write(output_file, source=results_file)
+
+
+def read_header(path) -> Dict:
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a k6 columnar file")
+        (length,) = struct.unpack("<Q", f.read(8))
+        return json.loads(f.read(length))
+
+
+class K6Columns:
+    """Memory-mapped view of a .k6col file with vectorized filters and group-bys"""
+
+    def __init__(self, path):
+        if np is None:
+            raise ImportError("NumPy is required to query columnar files: pip install numpy")
+        self.path = Path(path)
+        self.header = read_header(self.path)
+        self.rows = self.header["rows"]
+        self.dictionaries: Dict[str, List[str]] = self.header["dictionaries"]
+        self.tag_columns: List[str] = self.header["tag_columns"]
+        self._codes = {name: {value: code for code, value in enumerate(values)}
+                       for name, values in self.dictionaries.items()}
+        self.metrics: Dict[str, Dict] = self.header["metrics"]
+        self.columns = {}
+        for column, spec in self.header["columns"].items():
+            if self.rows == 0:
+                self.columns[column] = np.empty(0, dtype=spec["dtype"])
+            else:
+                self.columns[column] = np.memmap(self.path, dtype=spec["dtype"], mode="r",
+                                                 offset=spec["offset"], shape=(self.rows,))
+
+    def __getitem__(self, column: str):
+        return self.columns[column]
+
+    def code(self, dictionary: str, value: str) -> int:
+        """Integer code of a dictionary value (MISSING_CODE when absent)"""
+        return self._codes[dictionary].get(value, MISSING_CODE)
+
+    def mask(self, metric: Optional[str] = None, **tags):
+        """Boolean row mask for a metric and exact tag values, e.g. mask('http_reqs', status='200')"""
+        selected = np.ones(self.rows, dtype=bool)
+        if metric is not None:
+            selected &= self.columns["metric"] == self.code("metric", metric)
+        for tag, value in tags.items():
+            selected &= self.columns[f"tag_{tag}"] == self.code(tag, value)
+        return selected
+
+    def group_by(self, tag: str, metric: str, quantiles: Sequence[float] = (0.5, 0.95, 0.99)) -> Dict[str, Dict]:
+        """Count/sum/min/max/avg and quantiles of a metric's values grouped by a tag"""
+        selected = self.mask(metric)
+        codes = np.asarray(self.columns[f"tag_{tag}"][selected])
+        values = np.asarray(self.columns["value"][selected])
+        labels = self.dictionaries[tag] + ["<none>"]
+        return {
+            labels[code]: stats
+            for code, stats in group_stats(codes, values, quantiles).items()
+        }
+
+
+def group_stats(codes, values, quantiles: Sequence[float] = (0.5, 0.95, 0.99)) -> Dict[int, Dict]:
+    """
+    Vectorized per-group statistics. One lexsort orders values inside each group; quantiles
+    (linear interpolation, like numpy.quantile) are then gathered for all groups at once.
+    Code MISSING_CODE (-1) is reported under index -1.
+    """
+    if len(values) == 0:
+        return {}
+    order = np.lexsort((values, codes))
+    sorted_codes = codes[order]
+    sorted_values = values[order]
+
+    boundaries = np.flatnonzero(np.diff(sorted_codes)) + 1
+    starts = np.concatenate(([0], boundaries))
+    counts = np.diff(np.concatenate((starts, [len(sorted_values)])))
+    sums = np.add.reduceat(sorted_values, starts)
+    mins = sorted_values[starts]
+    maxs = sorted_values[starts + counts - 1]
+
+    quantile_values = {}
+    for q in quantiles:
+        position = starts + q * (counts - 1)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        weight = position - lower
+        quantile_values[q] = sorted_values[lower] * (1 - weight) + sorted_values[upper] * weight
+
+    result = {}
+    for i, code in enumerate(sorted_codes[starts].tolist()):
+        stats = {
+            "count": int(counts[i]),
+            "sum": float(sums[i]),
+            "avg": float(sums[i] / counts[i]),
+            "min": float(mins[i]),
+            "max": float(maxs[i]),
+        }
+        for q, estimates in quantile_values.items():
+            stats[f"p{q * 100:g}"] = float(estimates[i])
+        result[int(code)] = stats
+    return result
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Columnar export and queries for k6 results")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert_cmd = commands.add_parser("convert", help="convert k6 NDJSON to a .k6col file")
+    convert_cmd.add_argument("results", nargs="?", default=str(DEFAULT_RESULTS_FILE))
+    convert_cmd.add_argument("-o", "--output", help="output file (default: <results>.k6col)")
+    convert_cmd.add_argument("-m", "--metric", action="append", dest="metrics",
+                             help="only export this metric (repeatable)")
+    convert_cmd.add_argument("--tag", action="append", dest="tags",
+                             help=f"tag columns to keep (default: {', '.join(DEFAULT_TAG_COLUMNS)})")
+
+    query_cmd = commands.add_parser("query", help="group a metric by a tag")
+    query_cmd.add_argument("columnar", help=".k6col file")
+    query_cmd.add_argument("-m", "--metric", default="http_req_duration")
+    query_cmd.add_argument("-g", "--group-by", default="name")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_arg_parser().parse_args(argv)
+
+    if args.command == "convert":
+        results_file = Path(args.results)
+        if not results_file.exists():
+            print(f"[!] Results file not found: {results_file}")
+            return 1
+        output_file = Path(args.output) if args.output else results_file.with_suffix(".k6col")
+        print(f"[*] Converting {results_file} -> {output_file}")
+        convert(results_file, output_file, args.metrics, args.tags or DEFAULT_TAG_COLUMNS)
+        source_size = results_file.stat().st_size
+        output_size = output_file.stat().st_size
+        print(f"[+] {read_header(output_file)['rows']} points written "
+              f"({output_size / 1024:.1f} KB, {output_size / source_size * 100:.1f}% of the NDJSON)")
+        return 0
+
+    columns = K6Columns(args.columnar)
+    if args.group_by not in columns.tag_columns:
+        print(f"[!] Unknown tag '{args.group_by}': {columns.path.name} has {', '.join(columns.tag_columns)}")
+        return 1
+    groups = columns.group_by(args.group_by, args.metric)
+    print(f"\n[*] {args.metric} by {args.group_by} ({columns.rows} rows in {columns.path.name})")
+    print("-" * 70)
+    for label, stats in sorted(groups.items()):
+        print(f"{label:<24} n={stats['count']:<8} avg={stats['avg']:<10.3f} "
+              f"p50={stats['p50']:<10.3f} p95={stats['p95']:<10.3f} p99={stats['p99']:.3f}")
+    print("-" * 70 + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
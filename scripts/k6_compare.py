@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+K6 Compare - Baseline vs candidate performance regression check
+Compares two k6 runs (raw NDJSON results or sketch files saved with
+`k6_analyzer.py --save-sketches`) per endpoint (`name` tag): throughput and latency
+percentile deltas, with a one-sided Mann-Whitney U test for significance.
+
+The test runs directly on the DDSketch bins of both runs: samples in the same bin are
+treated as ties, which makes it slightly conservative but needs no raw samples, so saved
+summaries of old releases can still be compared. Throughput is measured over the first to
+last http_req_duration sample of each run, which both input types record the same way.
+
+Exits 1 when an endpoint regresses beyond the tolerance, so CI can gate on performance.
+
+Usage: python k6_compare.py baseline.json candidate.json [--tolerance 10] [--alpha 0.05] [-o report.json]
+"""
+
+import sys
+import json
+import math
+import argparse
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from k6_analyzer import K6ResultsAnalyzer, MetricStats, save_summary_json
+from k6_sketch import DDSketch
+
+LATENCY_METRIC = "http_req_duration"
+DEFAULT_PERCENTILES = (50, 95, 99)
+OVERALL = "(all)"
+
+
+def load_run(path) -> K6ResultsAnalyzer:
+    """Aggregate a run from a k6 NDJSON file or a saved sketch file"""
+    with open(path, "rb") as f:
+        first_line = f.readline()
+    try:
+        head = json.loads(first_line)
+    except ValueError:
+        head = {}
+
+    analyzer = K6ResultsAnalyzer([LATENCY_METRIC])
+    if isinstance(head, dict) and "version" in head and "metrics" in head:
+        analyzer.merge_sketch_file(path)
+    else:
+        analyzer.analyze_file(path)
+    return analyzer
+
+
+def _ordered_bins(sketch: DDSketch) -> Iterator[Tuple[Tuple[int, int], int]]:
+    """(order key, count) for every bin from the smallest value to the largest"""
+    for key in sorted(sketch.negative, reverse=True):
+        yield (0, -key), sketch.negative[key]
+    if sketch.zero_count:
+        yield (1, 0), sketch.zero_count
+    for key in sorted(sketch.positive):
+        yield (2, key), sketch.positive[key]
+
+
+def mann_whitney_greater(baseline: DDSketch, candidate: DDSketch) -> Tuple[float, float]:
+    """
+    One-sided Mann-Whitney U test that candidate values tend to be larger than baseline values.
+    Returns (p_value, effect) where effect = P(candidate > baseline) + 0.5 * P(tie).
+    """
+    n1, n2 = baseline.count, candidate.count
+    if n1 == 0 or n2 == 0:
+        return 1.0, 0.5
+    if not math.isclose(baseline.gamma, candidate.gamma):
+        raise ValueError("sketches must share the same relative accuracy")
+
+    bins: Dict[Tuple[int, int], List[int]] = {}
+    for key, count in _ordered_bins(baseline):
+        bins.setdefault(key, [0, 0])[0] += count
+    for key, count in _ordered_bins(candidate):
+        bins.setdefault(key, [0, 0])[1] += count
+
+    rank = 0
+    rank_sum_candidate = 0.0
+    tie_term = 0
+    for key in sorted(bins):
+        base_count, cand_count = bins[key]
+        tied = base_count + cand_count
+        average_rank = rank + (tied + 1) / 2
+        rank_sum_candidate += cand_count * average_rank
+        tie_term += tied ** 3 - tied
+        rank += tied
+
+    total = n1 + n2
+    u_candidate = rank_sum_candidate - n2 * (n2 + 1) / 2
+    mean = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((total + 1) - tie_term / (total * (total - 1)))
+    effect = u_candidate / (n1 * n2)
+    if variance <= 0:
+        return 1.0, effect
+
+    z = (u_candidate - mean - 0.5) / math.sqrt(variance)
+    p_value = 0.5 * math.erfc(z / math.sqrt(2))
+    return p_value, effect
+
+
+def _pct_change(before: Optional[float], after: Optional[float]) -> Optional[float]:
+    if before is None or after is None or before == 0:
+        return None
+    return (after - before) / before * 100
+
+
+def compare_endpoint(name: str, baseline: MetricStats, candidate: MetricStats,
+                     baseline_duration: float, candidate_duration: float, args) -> Dict:
+    base_rps = baseline.count / baseline_duration if baseline_duration > 0 else 0
+    cand_rps = candidate.count / candidate_duration if candidate_duration > 0 else 0
+    result = {
+        "endpoint": name,
+        "baseline_count": baseline.count,
+        "candidate_count": candidate.count,
+        "baseline_rps": round(base_rps, 3),
+        "candidate_rps": round(cand_rps, 3),
+        "rps_change_pct": _round(_pct_change(base_rps, cand_rps)),
+        "percentiles": {},
+        "regressions": [],
+    }
+
+    for pct in args.percentiles:
+        before = baseline.sketch.quantile(pct / 100)
+        after = candidate.sketch.quantile(pct / 100)
+        result["percentiles"][f"p{pct:g}"] = {
+            "baseline": _round(before),
+            "candidate": _round(after),
+            "change_pct": _round(_pct_change(before, after)),
+        }
+
+    if min(baseline.count, candidate.count) < args.min_samples:
+        result["status"] = "INSUFFICIENT_DATA"
+        return result
+
+    p_value, effect = mann_whitney_greater(baseline.sketch, candidate.sketch)
+    result["p_value"] = _round(p_value)
+    result["effect"] = _round(effect)
+
+    if p_value < args.alpha:
+        for pct in args.percentiles:
+            change = result["percentiles"][f"p{pct:g}"]["change_pct"]
+            if change is not None and change > args.tolerance:
+                result["regressions"].append(f"p{pct:g} +{change:.1f}%")
+
+    rps_change = result["rps_change_pct"]
+    if rps_change is not None and rps_change < -args.throughput_tolerance:
+        result["regressions"].append(f"rps {rps_change:.1f}%")
+
+    result["status"] = "REGRESSION" if result["regressions"] else "OK"
+    return result
+
+
+def _round(value: Optional[float], digits: int = 6) -> Optional[float]:
+    return round(value, digits) if value is not None else None
+
+
+def run_span(analyzer: K6ResultsAnalyzer, metric) -> float:
+    # Sketch files saved before per-metric spans were recorded only have the run span
+    return metric.duration_sec if metric.start_ns is not None else analyzer.duration_sec
+
+
+def compare_runs(baseline: K6ResultsAnalyzer, candidate: K6ResultsAnalyzer, args) -> List[Dict]:
+    base_metric = baseline.aggregates.get(LATENCY_METRIC)
+    cand_metric = candidate.aggregates.get(LATENCY_METRIC)
+    if base_metric is None or cand_metric is None:
+        raise ValueError(f"both runs must contain {LATENCY_METRIC} points")
+
+    # Throughput over the latency metric's own first-to-last sample span: the run span
+    # depends on which metrics were read (filtered NDJSON vs. a full sketch file)
+    base_duration, cand_duration = run_span(baseline, base_metric), run_span(candidate, cand_metric)
+    results = [compare_endpoint(OVERALL, base_metric.overall, cand_metric.overall,
+                                base_duration, cand_duration, args)]
+
+    base_groups = base_metric.by_tag.get(args.tag, {})
+    cand_groups = cand_metric.by_tag.get(args.tag, {})
+    for endpoint in sorted(set(base_groups) | set(cand_groups)):
+        if endpoint not in base_groups or endpoint not in cand_groups:
+            results.append({
+                "endpoint": endpoint,
+                "status": "NEW" if endpoint not in base_groups else "MISSING",
+                "regressions": [],
+            })
+            continue
+        results.append(compare_endpoint(endpoint, base_groups[endpoint], cand_groups[endpoint],
+                                        base_duration, cand_duration, args))
+    return results
+
+
+def print_report(results: List[Dict], args):
+    print("\n" + "=" * 96)
+    print(f"[*] K6 REGRESSION REPORT  (tolerance {args.tolerance}% latency, "
+          f"{args.throughput_tolerance}% throughput, alpha {args.alpha})")
+    print("=" * 96)
+    header = f"{'Endpoint':<24} {'RPS base->cand':<22}"
+    for pct in args.percentiles:
+        header += f" {f'p{pct:g} change':<12}"
+    print(header + f" {'p-value':<10} Status")
+    print("-" * 96)
+
+    for result in results:
+        if "percentiles" not in result:
+            print(f"{result['endpoint']:<24} {'-':<22}" + " " * (13 * len(args.percentiles)) +
+                  f" {'-':<10} {result['status']}")
+            continue
+        rps = f"{result['baseline_rps']}->{result['candidate_rps']}"
+        line = f"{result['endpoint']:<24} {rps:<22}"
+        for pct in args.percentiles:
+            change = result["percentiles"][f"p{pct:g}"]["change_pct"]
+            line += f" {(f'{change:+.1f}%' if change is not None else '-'):<12}"
+        p_value = result.get("p_value")
+        status = result["status"]
+        if result["regressions"]:
+            status += " (" + ", ".join(result["regressions"]) + ")"
+        print(line + f" {(f'{p_value:.4f}' if p_value is not None else '-'):<10} {status}")
+    print("-" * 96 + "\n")
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Compare two k6 runs and fail on performance regressions")
+    parser.add_argument("baseline", help="baseline k6 results (NDJSON) or sketch file")
+    parser.add_argument("candidate", help="candidate k6 results (NDJSON) or sketch file")
+    parser.add_argument("-t", "--tolerance", type=float, default=10.0,
+                        help="allowed latency percentile increase in percent (default: 10)")
+    parser.add_argument("--throughput-tolerance", type=float, default=10.0,
+                        help="allowed throughput drop in percent (default: 10)")
+    parser.add_argument("-a", "--alpha", type=float, default=0.05,
+                        help="significance level of the Mann-Whitney test (default: 0.05)")
+    parser.add_argument("-p", "--percentile", type=float, action="append", dest="percentiles",
+                        help="latency percentile to compare (repeatable, default: 50, 95, 99)")
+    parser.add_argument("--tag", default="name", help="tag that identifies an endpoint (default: name)")
+    parser.add_argument("--min-samples", type=int, default=20,
+                        help="minimum samples per side before an endpoint can fail (default: 20)")
+    parser.add_argument("-o", "--output", help="write the comparison as JSON to this file")
+    return parser
+
+
+def main(argv=None) -> int:
+    parser = build_arg_parser()
+    args = parser.parse_args(argv)
+    args.percentiles = args.percentiles or list(DEFAULT_PERCENTILES)
+
+    for path in (args.baseline, args.candidate):
+        if not Path(path).exists():
+            print(f"[!] File not found: {path}")
+            return 2
+
+    print(f"[*] Baseline:  {args.baseline}")
+    print(f"[*] Candidate: {args.candidate}")
+    results = compare_runs(load_run(args.baseline), load_run(args.candidate), args)
+    print_report(results, args)
+
+    if args.output:
+        save_summary_json({"baseline": args.baseline, "candidate": args.candidate,
+                           "endpoints": results}, args.output)
+
+    regressions = [result["endpoint"] for result in results if result["status"] == "REGRESSION"]
+    if regressions:
+        print(f"[FAIL] Performance regression in: {', '.join(regressions)}")
+        return 1
+    print("[OK] No performance regression detected")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+K6 Prometheus Ingest - Turns k6 NDJSON results into Prometheus exposition text
+Builds real histograms (_bucket/_sum/_count) for http_req_duration labeled by endpoint
+(`name` tag) and status, plus request/failure/check counters and the VU gauge.
+Only the metrics needed are scanned (mmap byte search), and everything is aggregated once;
+render() just formats the cached aggregates. update() consumes only lines appended since
+the previous call, so a file k6 is still writing can be followed incrementally.
+
+Used by monitoring/metrics-server.py (served on /k6/metrics); can also be run standalone:
+Usage: python k6_prometheus.py [k6-results.json] [-o k6_metrics.txt]
+"""
+
+import sys
+import argparse
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from k6_analyzer import DEFAULT_RESULTS_FILE, FileFollower, parse_records, scan_metric_lines
+from metric_registry import format_labels, format_value
+
+# Histogram buckets for http_req_duration, in milliseconds (k6 reports durations in ms)
+DEFAULT_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+INGESTED_METRICS = ("http_req_duration", "http_reqs", "http_req_failed", "checks", "iterations", "vus")
+
+
+class DurationHistogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class K6PrometheusIngest:
+    def __init__(self, results_file=DEFAULT_RESULTS_FILE, buckets: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self.results_file = Path(results_file)
+        self.buckets = sorted(buckets)
+        self.follower = FileFollower(self.results_file)
+        self.reset()
+
+    def reset(self):
+        self.histograms: Dict[Tuple[str, str], DurationHistogram] = {}
+        self.requests: Dict[Tuple[str, str], float] = {}
+        self.failed: Dict[str, float] = {}
+        self.checks: Dict[Tuple[str, str], int] = {}
+        self.iterations = 0.0
+        self.vus = None
+
+    def ingest(self):
+        """(Re)aggregate the whole results file"""
+        self.reset()
+        self.follower.offset = 0
+        self.update()
+
+    def update(self) -> bool:
+        """Fold in lines appended since the last call; returns True if anything changed"""
+        reset, new_range = self.follower.poll()
+        if reset:
+            self.reset()
+        if new_range:
+            start, end = new_range
+            self.consume(parse_records(scan_metric_lines(self.results_file, INGESTED_METRICS, start, end)))
+        return reset or new_range is not None
+
+    def consume(self, records: Iterable[Dict]):
+        buckets = self.buckets
+        for record in records:
+            if record.get("type") != "Point":
+                continue
+            data = record.get("data") or {}
+            value = data.get("value")
+            if value is None:
+                continue
+            tags = data.get("tags") or {}
+            metric = record.get("metric")
+            endpoint = tags.get("name", "")
+
+            if metric == "http_req_duration":
+                key = (endpoint, tags.get("status", ""))
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = DurationHistogram(len(buckets) + 1)
+                histogram.counts[bisect_left(buckets, value)] += 1
+                histogram.sum += value
+                histogram.count += 1
+            elif metric == "http_reqs":
+                key = (endpoint, tags.get("status", ""))
+                self.requests[key] = self.requests.get(key, 0) + value
+            elif metric == "http_req_failed":
+                self.failed[endpoint] = self.failed.get(endpoint, 0) + value
+            elif metric == "checks":
+                key = (tags.get("check", ""), "pass" if value else "fail")
+                self.checks[key] = self.checks.get(key, 0) + 1
+            elif metric == "iterations":
+                self.iterations += value
+            elif metric == "vus":
+                self.vus = value
+
+    def render(self) -> str:
+        """Prometheus text exposition of the current aggregates"""
+        lines: List[str] = []
+
+        lines.append("# HELP k6_http_req_duration HTTP request duration in milliseconds")
+        lines.append("# TYPE k6_http_req_duration histogram")
+        for (endpoint, status), histogram in sorted(self.histograms.items()):
+            base = [("endpoint", endpoint), ("status", status)]
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f"k6_http_req_duration_bucket{format_labels(base + [('le', format_value(bound))])} {cumulative}")
+            lines.append(f"k6_http_req_duration_bucket{format_labels(base + [('le', '+Inf')])} {histogram.count}")
+            lines.append(f"k6_http_req_duration_sum{format_labels(base)} {format_value(round(histogram.sum, 6))}")
+            lines.append(f"k6_http_req_duration_count{format_labels(base)} {histogram.count}")
+
+        lines.append("# HELP k6_http_reqs_total Total HTTP requests")
+        lines.append("# TYPE k6_http_reqs_total counter")
+        for (endpoint, status), value in sorted(self.requests.items()):
+            lines.append(f"k6_http_reqs_total{format_labels([('endpoint', endpoint), ('status', status)])} {format_value(value)}")
+
+        lines.append("# HELP k6_http_req_failed_total Failed HTTP requests")
+        lines.append("# TYPE k6_http_req_failed_total counter")
+        for endpoint, value in sorted(self.failed.items()):
+            lines.append(f"k6_http_req_failed_total{format_labels([('endpoint', endpoint)])} {format_value(value)}")
+
+        lines.append("# HELP k6_checks_total Check results")
+        lines.append("# TYPE k6_checks_total counter")
+        for (check, result), value in sorted(self.checks.items()):
+            lines.append(f"k6_checks_total{format_labels([('check', check), ('result', result)])} {value}")
+
+        lines.append("# HELP k6_iterations_total Completed VU iterations")
+        lines.append("# TYPE k6_iterations_total counter")
+        lines.append(f"k6_iterations_total {format_value(self.iterations)}")
+
+        if self.vus is not None:
+            lines.append("# HELP k6_vus Active virtual users")
+            lines.append("# TYPE k6_vus gauge")
+            lines.append(f"k6_vus {format_value(self.vus)}")
+
+        return "\n".join(lines) + "\n"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Render k6 results as Prometheus exposition text")
+    parser.add_argument("results", nargs="?", default=str(DEFAULT_RESULTS_FILE))
+    parser.add_argument("-o", "--output", help="write to this file instead of stdout")
+    args = parser.parse_args(argv)
+
+    ingest = K6PrometheusIngest(args.results)
+    ingest.ingest()
+    text = ingest.render()
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"[+] Prometheus metrics saved to {args.output}")
+    else:
+        sys.stdout.write(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
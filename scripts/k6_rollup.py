@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+K6 Rollup - Time-bucketed summaries of a k6 run (latency and RPS over time)
+Bins points by data.time into fixed windows (1s/10s/1m, ...) and computes, per window and per
+`name` tag: request count and RPS (over the part of the window the run covers), error rate
+from http_req_failed, latency quantiles of http_req_duration, plus bytes from
+data_sent/data_received per window. Aggregation is done in batched NumPy operations over
+the columnar file (see k6_columnar.py).
+
+The JSON output is small enough for Grafana (JSON/Infinity datasource) or the metrics server
+to serve directly; --prom additionally writes timestamped Prometheus samples.
+
+Usage: python k6_rollup.py [k6-results.json | run.k6col] --window 10s [--window 1m] [-o rollup.json]
+"""
+
+import re
+import sys
+import json
+import argparse
+import tempfile
+from pathlib import Path
+from datetime import datetime, timezone
+from typing import Dict, Sequence
+
+import numpy as np
+
+from k6_analyzer import DEFAULT_RESULTS_FILE
+from k6_columnar import K6Columns, MAGIC, MISSING_CODE, convert, group_stats
+
+LATENCY_METRIC = "http_req_duration"
+ROLLUP_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+WINDOW_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)(ms|s|m|h)$")
+WINDOW_UNITS_NS = {"ms": 10**6, "s": 10**9, "m": 60 * 10**9, "h": 3600 * 10**9}
+
+
+def parse_window(window: str) -> int:
+    """Window length in nanoseconds, e.g. '10s' or '1m'"""
+    match = WINDOW_PATTERN.match(window.strip())
+    if not match:
+        raise ValueError(f"invalid window '{window}' (expected e.g. 1s, 10s, 1m)")
+    return int(float(match.group(1)) * WINDOW_UNITS_NS[match.group(2)])
+
+
+def _bucket_sums(bucket, values, size: int):
+    """Per-bucket count and sum in one pass each (np.bincount)"""
+    counts = np.bincount(bucket, minlength=size)
+    sums = np.bincount(bucket, weights=values, minlength=size)
+    return counts, sums
+
+
+class K6Rollup:
+    def __init__(self, columns: K6Columns, group_tag: str = "name"):
+        self.columns = columns
+        self.group_tag = group_tag
+        times = columns["time_ns"]
+        self.start_ns = int(times.min()) if columns.rows else 0
+        self.end_ns = int(times.max()) if columns.rows else 0
+
+    def _metric(self, metric: str, base_ns: int):
+        """(time since base_ns, group code, value) arrays for one metric"""
+        selected = self.columns.mask(metric)
+        times = np.asarray(self.columns["time_ns"][selected]) - base_ns
+        groups = np.asarray(self.columns[f"tag_{self.group_tag}"][selected])
+        values = np.asarray(self.columns["value"][selected])
+        return times, groups, values
+
+    def rollup(self, window_ns: int) -> Dict:
+        # Windows are aligned to the epoch so rollups of different runs line up
+        base_ns = self.start_ns - self.start_ns % window_ns
+        windows = (self.end_ns - base_ns) // window_ns + 1 if self.columns.rows else 0
+        labels = self.columns.dictionaries[self.group_tag]
+        group_count = len(labels) + 1  # slot 0 holds points without the tag
+        size = windows * group_count
+        window_sec = window_ns / 1e9
+        # RPS is per second of the window the run actually covers: the first and last windows are
+        # clamped to the first and last sample (a window holding a single instant keeps its full length)
+        window_starts = base_ns + np.arange(windows, dtype=np.int64) * window_ns
+        covered = np.minimum(window_starts + window_ns, self.end_ns) - np.maximum(window_starts, self.start_ns)
+        covered_sec = np.where(covered > 0, covered, window_ns) / 1e9
+
+        def keys(times, groups):
+            return (times // window_ns) * group_count + (groups - MISSING_CODE)
+
+        req_times, req_groups, req_values = self._metric("http_reqs", base_ns)
+        requests = _bucket_sums(keys(req_times, req_groups), req_values, size)[1]
+
+        fail_times, fail_groups, fail_values = self._metric("http_req_failed", base_ns)
+        fail_counts, fail_sums = _bucket_sums(keys(fail_times, fail_groups), fail_values, size)
+
+        lat_times, lat_groups, lat_values = self._metric(LATENCY_METRIC, base_ns)
+        latency = group_stats(keys(lat_times, lat_groups), lat_values, ROLLUP_QUANTILES)
+
+        window_bytes = {}
+        for metric in ("data_sent", "data_received"):
+            times, _, values = self._metric(metric, base_ns)
+            window_bytes[metric] = np.bincount(times // window_ns, weights=values, minlength=windows)
+
+        series = []
+        active = np.flatnonzero((requests > 0) | (fail_counts > 0))
+        active = np.union1d(active, np.fromiter(latency.keys(), dtype=np.int64, count=len(latency)))
+        for key in active.tolist():
+            window, slot = divmod(key, group_count)
+            entry = {
+                "time": (base_ns + window * window_ns) // 10**6,
+                self.group_tag: labels[slot - 1] if slot else None,
+                "requests": int(requests[key]),
+                "rps": round(float(requests[key] / covered_sec[window]), 3),
+                "error_rate": round(float(fail_sums[key] / fail_counts[key]), 6) if fail_counts[key] else 0.0,
+            }
+            stats = latency.get(key)
+            if stats:
+                entry.update({
+                    f"{LATENCY_METRIC}_{name}": round(value, 3)
+                    for name, value in stats.items() if name in ("avg", "max") or name.startswith("p")
+                })
+            series.append(entry)
+
+        # Per-window totals: fold the group axis of the (window, group) grid
+        window_requests = requests.reshape(windows, group_count).sum(axis=1)
+        window_fail_counts = fail_counts.reshape(windows, group_count).sum(axis=1)
+        window_fail_sums = fail_sums.reshape(windows, group_count).sum(axis=1)
+        window_error_rate = np.divide(window_fail_sums, window_fail_counts,
+                                      out=np.zeros(windows), where=window_fail_counts > 0)
+        totals = [
+            {
+                "time": (base_ns + window * window_ns) // 10**6,
+                "requests": int(window_requests[window]),
+                "rps": round(float(window_requests[window] / covered_sec[window]), 3),
+                "error_rate": round(float(window_error_rate[window]), 6),
+                "data_sent": int(window_bytes["data_sent"][window]),
+                "data_received": int(window_bytes["data_received"][window]),
+            }
+            for window in range(windows)
+        ]
+
+        return {"window_sec": window_sec, "series": series, "totals": totals}
+
+
+def render_prometheus(rollups: Dict[str, Dict], group_tag: str) -> str:
+    """Timestamped Prometheus samples for every rollup window"""
+    families = {
+        "k6_rollup_requests": ("gauge", "HTTP requests per window"),
+        "k6_rollup_rps": ("gauge", "HTTP requests per second per window"),
+        "k6_rollup_error_rate": ("gauge", "http_req_failed rate per window"),
+    }
+    for q in ROLLUP_QUANTILES:
+        families[f"k6_rollup_duration_p{q * 100:g}_ms".replace(".", "_")] = (
+            "gauge", f"p{q * 100:g} of {LATENCY_METRIC} per window in ms")
+
+    samples = {name: [] for name in families}
+    for window_name, rollup in rollups.items():
+        for entry in rollup["series"]:
+            labels = f'window="{window_name}",{group_tag}="{entry[group_tag] or ""}"'
+            samples["k6_rollup_requests"].append(f"k6_rollup_requests{{{labels}}} {entry['requests']} {entry['time']}")
+            samples["k6_rollup_rps"].append(f"k6_rollup_rps{{{labels}}} {entry['rps']} {entry['time']}")
+            samples["k6_rollup_error_rate"].append(f"k6_rollup_error_rate{{{labels}}} {entry['error_rate']} {entry['time']}")
+            for q in ROLLUP_QUANTILES:
+                value = entry.get(f"{LATENCY_METRIC}_p{q * 100:g}")
+                if value is not None:
+                    name = f"k6_rollup_duration_p{q * 100:g}_ms".replace(".", "_")
+                    samples[name].append(f"{name}{{{labels}}} {value} {entry['time']}")
+
+    lines = []
+    for name, (metric_type, help_text) in families.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.extend(samples[name])
+    return "\n".join(lines) + "\n"
+
+
+def load_columns(input_file: Path, workdir: str) -> K6Columns:
+    """Open a .k6col file, converting NDJSON input to a temporary one first"""
+    with open(input_file, "rb") as f:
+        is_columnar = f.read(len(MAGIC)) == MAGIC
+    if is_columnar:
+        return K6Columns(input_file)
+    columnar_file = Path(workdir) / (input_file.stem + ".k6col")
+    print(f"[*] Converting {input_file.name} to columnar format")
+    convert(input_file, columnar_file)
+    return K6Columns(columnar_file)
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Time-bucketed rollups of k6 results")
+    parser.add_argument("input", nargs="?", default=str(DEFAULT_RESULTS_FILE),
+                        help="k6 NDJSON results or a .k6col file")
+    parser.add_argument("-w", "--window", action="append", dest="windows",
+                        help="window size, e.g. 1s, 10s, 1m (repeatable, default: 10s)")
+    parser.add_argument("-g", "--group-by", default="name", help="tag to break series down by")
+    parser.add_argument("-o", "--output", help="rollup JSON output (default: <input>.rollup.json)")
+    parser.add_argument("--prom", help="also write timestamped Prometheus samples to this file")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_arg_parser().parse_args(argv)
+    input_file = Path(args.input)
+    if not input_file.exists():
+        print(f"[!] Input file not found: {input_file}")
+        return 1
+
+    windows: Sequence[str] = args.windows or ["10s"]
+    output_file = Path(args.output) if args.output else input_file.with_suffix(".rollup.json")
+
+    with tempfile.TemporaryDirectory(prefix="k6-rollup-") as workdir:
+        columns = load_columns(input_file, workdir)
+        roller = K6Rollup(columns, args.group_by)
+        rollups = {window: roller.rollup(parse_window(window)) for window in windows}
+        start = datetime.fromtimestamp(roller.start_ns / 1e9, tz=timezone.utc).isoformat()
+        del columns, roller  # release the memory maps before the temp dir is removed
+
+    document = {
+        "source": str(input_file),
+        "start": start,
+        "group_by": args.group_by,
+        "rollups": rollups,
+    }
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_file, "w", encoding="utf-8") as f:
+        json.dump(document, f, separators=(",", ":"))
+    print(f"[+] Rollup saved to {output_file} ({output_file.stat().st_size / 1024:.1f} KB)")
+
+    if args.prom:
+        prom_file = Path(args.prom)
+        prom_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(prom_file, "w", encoding="utf-8") as f:
+            f.write(render_prometheus(rollups, args.group_by))
+        print(f"[+] Prometheus samples saved to {prom_file}")
+
+    for window, rollup in rollups.items():
+        print(f"\n[*] {window} windows: {len(rollup['totals'])}")
+        for total in rollup["totals"][:5]:
+            print(f"    {total['time']}  rps={total['rps']:<8} errors={total['error_rate']:<8} "
+                  f"sent={total['data_sent']} received={total['data_received']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Mergeable quantile sketch (DDSketch) for k6 trend metrics
+
+Error bound: every quantile estimate q' returned for a true quantile q satisfies
+    |q' - q| <= relative_accuracy * |q|
+as long as the bins holding that rank were not collapsed. With the defaults
+(relative_accuracy=0.01, max_bins=2048) collapsing only starts once the tracked
+values span more than ~17 orders of magnitude, so in practice it never happens
+for latencies. Memory is bounded by max_bins per sketch regardless of sample count.
+
+Sketches merge by adding bin counts, so the result does not depend on how the
+samples were split across runs, shards or worker processes.
+"""
+
+import json
+import math
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+DEFAULT_MAX_BINS = 2048
+
+# Values closer to zero than this are counted in the zero bucket
+MIN_INDEXABLE_VALUE = 1e-9
+
+
+class ExactSum:
+    """
+    Running float sum without rounding error (Shewchuk partials, as in math.fsum).
+    Merging partial sums gives the same result in any order, so aggregates
+    computed in parallel chunks match the single-pass result exactly.
+    """
+
+    __slots__ = ("partials",)
+
+    def __init__(self, value: float = 0.0):
+        self.partials = [value] if value else []
+
+    def add(self, x: float):
+        partials = self.partials
+        i = 0
+        for y in partials:
+            if abs(x) < abs(y):
+                x, y = y, x
+            hi = x + y
+            lo = y - (hi - x)
+            if lo:
+                partials[i] = lo
+                i += 1
+            x = hi
+        partials[i:] = [x]
+
+    def merge(self, other: "ExactSum"):
+        for partial in other.partials:
+            self.add(partial)
+
+    @property
+    def value(self) -> float:
+        return math.fsum(self.partials)
+
+
+class DDSketch:
+    """Relative-error quantile sketch with logarithmically sized bins"""
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY,
+                 max_bins: int = DEFAULT_MAX_BINS):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive: Dict[int, int] = {}
+        self.negative: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self._sum = ExactSum()
+        self.min = None
+        self.max = None
+
+    def _key(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, key: int) -> float:
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def _collapse(self, bins: Dict[int, int]):
+        """Fold the lowest keys into one bin once the store exceeds max_bins"""
+        if len(bins) <= self.max_bins:
+            return
+        keys = sorted(bins)
+        floor_key = keys[-self.max_bins]
+        folded = sum(bins.pop(key) for key in keys[:-self.max_bins])
+        bins[floor_key] += folded
+
+    def add(self, value: float, weight: int = 1):
+        if value > MIN_INDEXABLE_VALUE:
+            key = self._key(value)
+            self.positive[key] = self.positive.get(key, 0) + weight
+            self._collapse(self.positive)
+        elif value < -MIN_INDEXABLE_VALUE:
+            key = self._key(-value)
+            self.negative[key] = self.negative.get(key, 0) + weight
+            self._collapse(self.negative)
+        else:
+            self.zero_count += weight
+
+        self.count += weight
+        self._sum.add(value * weight)
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other: "DDSketch"):
+        """Add another sketch's samples into this one (both must share relative_accuracy)"""
+        if not math.isclose(self.gamma, other.gamma):
+            raise ValueError("cannot merge sketches with different relative accuracy")
+        for key, count in other.positive.items():
+            self.positive[key] = self.positive.get(key, 0) + count
+        for key, count in other.negative.items():
+            self.negative[key] = self.negative.get(key, 0) + count
+        self._collapse(self.positive)
+        self._collapse(self.negative)
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self._sum.merge(other._sum)
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate the q-quantile (0 <= q <= 1); None for an empty sketch"""
+        if self.count == 0:
+            return None
+        if not 0 <= q <= 1:
+            raise ValueError("quantile must be between 0 and 1")
+
+        rank = q * (self.count - 1)
+        seen = 0
+        estimate = None
+
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                estimate = -self._value(key)
+                break
+
+        if estimate is None:
+            seen += self.zero_count
+            if seen > rank:
+                estimate = 0.0
+
+        if estimate is None:
+            for key in sorted(self.positive):
+                seen += self.positive[key]
+                if seen > rank:
+                    estimate = self._value(key)
+                    break
+
+        if estimate is None:
+            estimate = self.max
+        # Exact extremes are tracked, so never report outside them
+        return min(max(estimate, self.min), self.max)
+
+    def quantiles(self, qs: Iterable[float]) -> Dict[float, Optional[float]]:
+        return {q: self.quantile(q) for q in qs}
+
+    @property
+    def sum(self) -> float:
+        return self._sum.value
+
+    @property
+    def avg(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "max_bins": self.max_bins,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min,
+            "max": self.max,
+            "zero_count": self.zero_count,
+            "positive": sorted(self.positive.items()),
+            "negative": sorted(self.negative.items()),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "DDSketch":
+        sketch = cls(data.get("relative_accuracy", DEFAULT_RELATIVE_ACCURACY),
+                     data.get("max_bins", DEFAULT_MAX_BINS))
+        sketch.positive = {int(key): count for key, count in data.get("positive", [])}
+        sketch.negative = {int(key): count for key, count in data.get("negative", [])}
+        sketch.zero_count = data.get("zero_count", 0)
+        sketch.count = data.get("count", 0)
+        sketch._sum = ExactSum(data.get("sum", 0.0))
+        sketch.min = data.get("min")
+        sketch.max = data.get("max")
+        return sketch
+
+
+def save_sketch_file(data: Dict, output_file):
+    """Write a JSON document containing serialized sketches"""
+    output_path = Path(output_file)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+
+
+def load_sketch_file(input_file) -> Dict:
+    with open(input_file, "r", encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+Metric Registry - In-memory Prometheus metric families with labeled series
+Families are keyed by name and series by their (sorted) label set, so writing the same
+series twice updates it in place instead of emitting a duplicate. The exposition is rendered
+in one sorted pass (one HELP/TYPE block per family) and cached until the next change.
+
+parse_exposition() loads Prometheus text format into a registry (timestamps are dropped),
+which is how the metrics server merges the metrics files and how runners update a file
+without clobbering other services. Timestamps are never written: Prometheus stamps
+samples with the scrape time.
+
+Usage: python metric_registry.py monitoring/metrics/test_metrics.txt [more.txt ...]  (dedup + print)
+"""
+
+import os
+import sys
+import math
+import time
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+METRIC_TYPES = ("counter", "gauge", "histogram", "summary", "untyped")
+# Sample name suffixes that belong to the family without the suffix
+FAMILY_SUFFIXES = {
+    "histogram": ("_bucket", "_sum", "_count"),
+    "summary": ("_sum", "_count"),
+}
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+def escape_label(value) -> str:
+    value = str(value)
+    if "\\" not in value and '"' not in value and "\n" not in value:
+        return value
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def escape_help(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def format_labels(labels) -> str:
+    if not labels:
+        return ""
+    # Join first and escape only if needed: label values rarely contain a backslash, newline or quote
+    text = '",'.join(f'{key}="{value}' for key, value in labels)
+    if "\\" in text or "\n" in text or text.count('"') != 2 * len(labels) - 1:
+        text = '",'.join(f'{key}="{escape_label(value)}' for key, value in labels)
+    return "{" + text + '"}'
+
+
+def format_value(value: float) -> str:
+    if value != value:
+        return "NaN"
+    if value in (math.inf, -math.inf):
+        return "+Inf" if value > 0 else "-Inf"
+    as_int = int(value)
+    if as_int == value:
+        return str(as_int)
+    return repr(float(value))
+
+
+def label_key(labels: Optional[Dict[str, object]]) -> LabelSet:
+    if not labels:
+        return ()
+    return tuple(sorted((str(key), str(value)) for key, value in labels.items()))
+
+
+def _bucket_bound(labels: LabelSet) -> float:
+    for key, value in labels:
+        if key == "le":
+            try:
+                return float(value)
+            except ValueError:
+                return math.inf
+    return 0.0
+
+
+class MetricFamily:
+    """One metric name: type, help text and its series keyed by (sample name, label set)"""
+
+    def __init__(self, registry: "MetricRegistry", name: str, metric_type: str, help_text: str):
+        self.registry = registry
+        self.name = name
+        self.type = metric_type
+        self.help = help_text
+        self.series: Dict[Tuple[str, LabelSet], float] = {}
+
+    def set(self, value: float, **labels):
+        self.set_sample(self.name, label_key(labels), value)
+
+    def inc(self, value: float = 1, **labels):
+        key = (self.name, label_key(labels))
+        with self.registry.lock:
+            self.series[key] = self.series.get(key, 0) + value
+            self.registry.changed()
+
+    def get(self, **labels) -> Optional[float]:
+        return self.series.get((self.name, label_key(labels)))
+
+    def set_sample(self, sample_name: str, labels: LabelSet, value: float):
+        with self.registry.lock:
+            self.series[(sample_name, labels)] = value
+            self.registry.changed()
+
+    def remove(self, **labels):
+        with self.registry.lock:
+            self.series.pop((self.name, label_key(labels)), None)
+            self.registry.changed()
+
+    def samples(self) -> List[Tuple[str, LabelSet, float]]:
+        """Series sorted by labels, then sample name; histogram buckets by numeric le"""
+        def sort_key(item):
+            (sample_name, labels), _ = item
+            base = tuple(pair for pair in labels if pair[0] != "le")
+            return base, sample_name, _bucket_bound(labels)
+
+        return [(sample_name, labels, value)
+                for (sample_name, labels), value in sorted(self.series.items(), key=sort_key)]
+
+    def render(self, lines: List[str]):
+        if self.help:
+            lines.append(f"# HELP {self.name} {escape_help(self.help)}")
+        if self.type != "untyped" or self.help:
+            lines.append(f"# TYPE {self.name} {self.type}")
+        if self.type == "histogram":
+            for sample_name, labels, value in self.samples():
+                lines.append(f"{sample_name}{format_labels(labels)} {format_value(value)}")
+            return
+        # Sorting the formatted label strings is much cheaper than comparing nested tuples
+        rows = sorted((format_labels(labels), sample_name, value)
+                      for (sample_name, labels), value in self.series.items())
+        lines.extend(f"{sample_name}{labels} {format_value(value)}" for labels, sample_name, value in rows)
+
+
+class MetricRegistry:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.families: Dict[str, MetricFamily] = {}
+        self.version = 0
+        self._rendered: Optional[Tuple[int, str]] = None
+
+    def changed(self):
+        self.version += 1
+
+    def family(self, name: str, metric_type: str = "untyped", help_text: str = "") -> MetricFamily:
+        """Get or create a family; raises ValueError if it exists with another type"""
+        if metric_type not in METRIC_TYPES:
+            raise ValueError(f"unknown metric type '{metric_type}' for {name}")
+        with self.lock:
+            family = self.families.get(name)
+            if family is None:
+                family = self.families[name] = MetricFamily(self, name, metric_type, help_text)
+                self.changed()
+            elif family.type != metric_type:
+                if family.type != "untyped":
+                    raise ValueError(f"metric {name} is a {family.type}, not a {metric_type}")
+                family.type = metric_type
+                self.changed()
+            if help_text and family.help != help_text:
+                family.help = help_text
+                self.changed()
+            return family
+
+    def gauge(self, name: str, help_text: str = "") -> MetricFamily:
+        return self.family(name, "gauge", help_text)
+
+    def counter(self, name: str, help_text: str = "") -> MetricFamily:
+        return self.family(name, "counter", help_text)
+
+    def histogram(self, name: str, help_text: str = "") -> MetricFamily:
+        return self.family(name, "histogram", help_text)
+
+    def family_for_sample(self, sample_name: str) -> MetricFamily:
+        """Family a sample belongs to (handles _bucket/_sum/_count), created as untyped if unknown"""
+        family = self.families.get(sample_name)
+        if family is not None:
+            return family
+        for metric_type, suffixes in FAMILY_SUFFIXES.items():
+            for suffix in suffixes:
+                if sample_name.endswith(suffix):
+                    base = self.families.get(sample_name[:-len(suffix)])
+                    if base is not None and base.type == metric_type:
+                        return base
+        return self.family(sample_name)
+
+    def to_json(self) -> List:
+        """Plain-list form [[name, type, help, [[sample, [[key, value], ...], value], ...]], ...]"""
+        with self.lock:
+            return [[family.name, family.type, family.help,
+                     [[sample_name, [list(pair) for pair in labels], value]
+                      for (sample_name, labels), value in family.series.items()]]
+                    for family in self.families.values()]
+
+    @classmethod
+    def from_json(cls, families: List, extra_labels: Optional[Dict[str, str]] = None) -> "MetricRegistry":
+        """Inverse of to_json; `extra_labels` are added to every series as merge() would add them"""
+        extra = dict(label_key(extra_labels))
+        registry = cls()
+        for name, metric_type, help_text, series in families:
+            family = registry.families[name] = MetricFamily(registry, name, metric_type, help_text)
+            if extra:
+                family.series = {(sample_name, tuple(sorted({**dict(labels), **extra}.items()))): value
+                                 for sample_name, labels, value in series}
+            else:
+                family.series = {(sample_name, tuple(map(tuple, labels))): value
+                                 for sample_name, labels, value in series}
+        return registry
+
+    def replace_families(self, other: "MetricRegistry"):
+        """Replace the families of the same name with copies of those in `other` (Pushgateway POST)"""
+        with self.lock:
+            for name, family in other.families.items():
+                replacement = MetricFamily(self, name, family.type, family.help)
+                replacement.series = dict(family.series)
+                self.families[name] = replacement
+            self.changed()
+
+    def merge(self, other: "MetricRegistry", extra_labels: Optional[Dict[str, str]] = None) -> List[str]:
+        """
+        Upsert every series of `other`, adding `extra_labels` (which win over pushed labels).
+        Families whose type conflicts with an existing one are skipped; their names are returned.
+        """
+        extra = dict(label_key(extra_labels))
+        skipped = []
+        with self.lock:
+            for name, family in other.families.items():
+                try:
+                    target = self.family(name, family.type, family.help)
+                except ValueError:
+                    skipped.append(name)
+                    continue
+                if not extra:
+                    target.series.update(family.series)
+                    continue
+                series = target.series
+                for (sample_name, labels), value in family.series.items():
+                    # Both sides are already normalized label sets
+                    series[(sample_name, tuple(sorted({**dict(labels), **extra}.items())))] = value
+            self.changed()
+        return skipped
+
+    def remove_matching(self, **labels) -> int:
+        """Drop every series whose labels include all of the given ones; returns the count"""
+        wanted = set(label_key(labels))
+        removed = 0
+        with self.lock:
+            for family in self.families.values():
+                stale = [key for key in family.series if wanted.issubset(key[1])]
+                for key in stale:
+                    del family.series[key]
+                removed += len(stale)
+            if removed:
+                self.changed()
+        return removed
+
+    def render(self) -> str:
+        """Prometheus text exposition: one sorted pass, cached until the next change"""
+        with self.lock:
+            if self._rendered is not None and self._rendered[0] == self.version:
+                return self._rendered[1]
+            lines: List[str] = []
+            for name in sorted(self.families):
+                family = self.families[name]
+                if family.series:
+                    family.render(lines)
+            text = "\n".join(lines) + "\n" if lines else ""
+            self._rendered = (self.version, text)
+            return text
+
+    def write_file(self, path):
+        """Atomically replace `path` with the rendered exposition"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(path.name + ".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(temp_path, path)
+
+
+@contextmanager
+def file_lock(path, timeout: float = 60.0, stale_after: float = 300.0):
+    """
+    Cross-process lock for read-modify-write of a metrics file (runners update it concurrently).
+    Uses an O_EXCL lock file next to it, which works the same on Windows and Linux; a lock
+    older than `stale_after` seconds is assumed to be left over from a killed process.
+    """
+    lock_path = Path(str(path) + ".lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - lock_path.stat().st_mtime > stale_after:
+                    lock_path.unlink()
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"could not lock {path} within {timeout}s (remove {lock_path} if stale)")
+            time.sleep(0.05)
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        os.close(fd)
+        yield
+    finally:
+        try:
+            lock_path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _parse_labels(text: str, start: int) -> Tuple[LabelSet, int]:
+    """Parse `{a="x",b="y"}` starting at text[start] == '{'; returns (labels, index after '}')"""
+    labels = []
+    i = start + 1
+    length = len(text)
+    while i < length:
+        while i < length and text[i] in " ,":
+            i += 1
+        if i < length and text[i] == "}":
+            return label_key(dict(labels)), i + 1
+        equals = text.index("=", i)
+        key = text[i:equals].strip()
+        i = text.index('"', equals) + 1
+        value = []
+        while text[i] != '"':
+            if text[i] == "\\":
+                i += 1
+                value.append("\n" if text[i] == "n" else text[i])
+            else:
+                value.append(text[i])
+            i += 1
+        labels.append((key, "".join(value)))
+        i += 1
+    raise ValueError("unterminated label set")
+
+
+def parse_sample(line: str) -> Tuple[str, LabelSet, float]:
+    """(sample name, labels, value) of one exposition line; a trailing timestamp is ignored"""
+    brace = line.find("{")
+    space = line.find(" ")
+    if brace != -1 and (space == -1 or brace < space):
+        name = line[:brace].strip()
+        labels, end = _parse_labels(line, brace)
+    else:
+        if space == -1:
+            raise ValueError("sample without value")
+        name, labels, end = line[:space], (), space
+    fields = line[end:].split()
+    if not fields:
+        raise ValueError("sample without value")
+    return name, labels, float(fields[0])
+
+
+def parse_exposition(text: str, registry: Optional[MetricRegistry] = None) -> MetricRegistry:
+    """
+    Load Prometheus text format into `registry` (a new one if omitted). Repeated series
+    overwrite earlier values; a TYPE conflicting with an earlier declaration is ignored.
+    Malformed lines raise ValueError with the line number.
+    """
+    registry = registry if registry is not None else MetricRegistry()
+    with registry.lock:
+        for number, raw_line in enumerate(text.splitlines(), 1):
+            line = raw_line.strip().lstrip("\ufeff")
+            if not line:
+                continue
+            if line.startswith("#"):
+                parts = line[1:].split(None, 2)
+                if len(parts) >= 3 and parts[0] == "HELP":
+                    help_text = parts[2].replace("\\n", "\n").replace("\\\\", "\\")
+                    family = registry.families.get(parts[1])
+                    if family is None:
+                        registry.family(parts[1], help_text=help_text)
+                    elif help_text != family.help:
+                        family.help = help_text
+                        registry.changed()
+                elif len(parts) >= 3 and parts[0] == "TYPE":
+                    metric_type = parts[2].strip()
+                    family = registry.families.get(parts[1])
+                    if metric_type in METRIC_TYPES and (family is None or family.type == "untyped"):
+                        registry.family(parts[1], metric_type)
+                continue
+            try:
+                name, labels, value = parse_sample(line)
+            except (ValueError, IndexError) as e:
+                raise ValueError(f"line {number}: cannot parse '{raw_line}': {e}") from None
+            registry.family_for_sample(name).set_sample(name, labels, value)
+    return registry
+
+
+def load_file(path, registry: Optional[MetricRegistry] = None) -> MetricRegistry:
+    """parse_exposition() of a file (a missing file leaves the registry unchanged)"""
+    registry = registry if registry is not None else MetricRegistry()
+    path = Path(path)
+    if path.exists():
+        with open(path, "r", encoding="utf-8-sig") as f:
+            parse_exposition(f.read(), registry)
+    return registry
+
+
+def main(argv: Optional[Iterable[str]] = None) -> int:
+    paths = list(argv if argv is not None else sys.argv[1:])
+    if not paths:
+        print("Usage: python metric_registry.py <metrics.txt> [more.txt ...]")
+        return 1
+    registry = MetricRegistry()
+    for path in paths:
+        load_file(path, registry)
+    sys.stdout.write(registry.render())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Metric Snapshot Log - Crash-safe on-disk state for metrics pushed to the metrics server
+An append-only JSON-lines log: every push/delete is one record, written immediately and
+fsynced in batches by a background flusher (at most `fsync_interval` seconds of pushes can
+be lost on power failure; a process crash loses nothing). A torn last line is dropped on replay.
+
+When the log grows past `compact_ratio` times the last snapshot, it is compacted: the
+current state is written as one record per group to a temp file, fsynced, and atomically
+renamed over the log, so a crash during compaction leaves either the old or the new log.
+
+Records:
+  {"op": "put" | "post", "group": [[label, value], ...], "time": <unix>, "families": <MetricRegistry.to_json()>}
+  {"op": "delete", "group": [[label, value], ...]}
+
+Usage: python metric_snapshot_log.py monitoring/metrics/push_state.log      (summary)
+       python metric_snapshot_log.py --benchmark 100000                     (time to first scrape)
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional
+
+from metric_registry import MetricRegistry
+
+
+class SnapshotLog:
+    def __init__(self, path, fsync_interval: float = 1.0, compact_ratio: float = 2.0,
+                 min_compact_bytes: int = 1024 * 1024):
+        self.path = Path(path)
+        self.fsync_interval = fsync_interval
+        self.compact_ratio = compact_ratio
+        self.min_compact_bytes = min_compact_bytes
+        self.snapshot_bytes = 0
+        self.replayed_records = 0
+        self._file = None
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._closed = threading.Event()
+        self._flusher = None
+
+    def replay(self) -> Iterator[Dict]:
+        """Yield every complete record; a torn or corrupt tail is truncated away"""
+        if not self.path.exists():
+            return
+        good_end = 0
+        self.replayed_records = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                good_end += len(line)
+                self.replayed_records += 1
+                yield record
+        if good_end < self.path.stat().st_size:
+            print(f"[!] {self.path.name}: dropping {self.path.stat().st_size - good_end} bytes of torn records")
+            with open(self.path, "r+b") as f:
+                f.truncate(good_end)
+        self.snapshot_bytes = good_end
+
+    def open(self):
+        """Open for appending and start the batched fsync thread"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "ab")
+        self._closed.clear()
+        if self.fsync_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name="snapshot-fsync", daemon=True)
+            self._flusher.start()
+
+    def append(self, record: Dict):
+        line = json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self._dirty = True
+            if self.fsync_interval <= 0:
+                self._sync_locked()
+
+    def is_compact(self, live_groups: int) -> bool:
+        """After a replay: one record per live group, i.e. the log already is a snapshot"""
+        return self.replayed_records == live_groups
+
+    def should_compact(self) -> bool:
+        size = self._file.tell() if self._file is not None else 0
+        return size > max(self.min_compact_bytes, self.compact_ratio * self.snapshot_bytes)
+
+    def compact(self, records: Iterable[Dict]):
+        """Atomically replace the log with `records` (the current state)"""
+        with self._lock:
+            fd, temp_name = tempfile.mkstemp(prefix=self.path.name + ".", suffix=".tmp", dir=self.path.parent)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    for record in records:
+                        f.write(json.dumps(record, separators=(",", ":")).encode("utf-8") + b"\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                if self._file is not None:
+                    self._file.close()
+                os.replace(temp_name, self.path)
+            except BaseException:
+                if os.path.exists(temp_name):
+                    os.unlink(temp_name)
+                raise
+            finally:
+                if self._file is not None and self._file.closed:
+                    self._file = open(self.path, "ab")
+            self._fsync_directory()
+            self.snapshot_bytes = self.path.stat().st_size
+            self._dirty = False
+
+    def sync(self):
+        with self._lock:
+            self._sync_locked()
+
+    def close(self):
+        self._closed.set()
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def _sync_locked(self):
+        if self._dirty and self._file is not None:
+            os.fsync(self._file.fileno())
+            self._dirty = False
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.fsync_interval):
+            try:
+                self.sync()
+            except (OSError, ValueError) as e:
+                print(f"[ERROR] snapshot fsync failed: {e}")
+
+    def _fsync_directory(self):
+        # Persist the rename itself (not supported on Windows)
+        try:
+            fd = os.open(self.path.parent, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+def load_groups(log: SnapshotLog, with_grouping: bool = False):
+    """
+    Replay a log into ({group: MetricRegistry}, {group: push time}).
+    With `with_grouping` every series also carries its group's labels, as the metrics server keeps them.
+    """
+    groups: Dict = {}
+    push_times: Dict = {}
+    for record in log.replay():
+        group = tuple(map(tuple, record["group"]))
+        if record["op"] == "delete":
+            groups.pop(group, None)
+            push_times.pop(group, None)
+            continue
+        incoming = MetricRegistry.from_json(record["families"], dict(group) if with_grouping else None)
+        if record["op"] == "put" or group not in groups:
+            groups[group] = incoming
+        else:
+            groups[group].replace_families(incoming)
+        push_times[group] = record.get("time", 0)
+    return groups, push_times
+
+
+def snapshot_records(groups: Dict, push_times: Dict) -> Iterator[Dict]:
+    for group, registry in groups.items():
+        yield {"op": "put", "group": [list(pair) for pair in group], "time": push_times.get(group, 0),
+               "families": registry.to_json()}
+
+
+def benchmark(series: int, groups: int, workdir: Optional[str] = None):
+    """Write `series` series spread over `groups` push groups, then time a cold replay and the first render"""
+    with tempfile.TemporaryDirectory(prefix="snapshot-bench-", dir=workdir) as tmp:
+        path = Path(tmp) / "push_state.log"
+        log = SnapshotLog(path, fsync_interval=0.5)
+        log.open()
+        per_group = max(1, series // groups)
+        started = time.perf_counter()
+        for g in range(groups):
+            registry = MetricRegistry()
+            family = registry.gauge("test_case_duration_seconds", "Test case duration")
+            for i in range(per_group):
+                family.set(i * 0.001, suite=f"Suite{i % 200}", testcase=f"test_{g}_{i}")
+            log.append({"op": "put", "group": [["job", "bench"], ["service", f"svc{g}"]],
+                        "time": time.time(), "families": registry.to_json()})
+        write_sec = time.perf_counter() - started
+        log.close()
+        size_mb = path.stat().st_size / (1024 * 1024)
+
+        # What the metrics server does before it can answer the first scrape: replay the log
+        # (grouping labels applied once, here), then merge the groups and render
+        started = time.perf_counter()
+        restored, _ = load_groups(SnapshotLog(path), with_grouping=True)
+        replay_sec = time.perf_counter() - started
+        total = sum(len(family.series) for registry in restored.values() for family in registry.families.values())
+
+        started = time.perf_counter()
+        merged = MetricRegistry()
+        for registry in restored.values():
+            merged.merge(registry)
+        merged.render()
+        render_sec = time.perf_counter() - started
+
+    print(f"[*] {total} series in {groups} groups, log {size_mb:.1f} MB")
+    print(f"[+] Append: {write_sec:.3f}s   Replay: {replay_sec:.3f}s   Merge + render: {render_sec:.3f}s")
+    print(f"[+] Time to first scrape: {replay_sec + render_sec:.3f}s")
+    return replay_sec + render_sec
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Inspect or benchmark the metrics server snapshot log")
+    parser.add_argument("log", nargs="?", help="snapshot log to summarize")
+    parser.add_argument("--benchmark", type=int, metavar="SERIES", help="time replay and first render with this many series")
+    parser.add_argument("--groups", type=int, default=50, help="push groups for --benchmark (default: 50)")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        benchmark(args.benchmark, args.groups)
+        return 0
+    if not args.log:
+        parser.error("give a log file or --benchmark")
+    started = time.perf_counter()
+    groups, push_times = load_groups(SnapshotLog(args.log))
+    elapsed = time.perf_counter() - started
+    for group, registry in sorted(groups.items()):
+        series = sum(len(family.series) for family in registry.families.values())
+        labels = ",".join(f"{key}={value}" for key, value in group)
+        print(f"{labels:<50} {len(registry.families):>4} families {series:>8} series  pushed {time.ctime(push_times[group])}")
+    print(f"[+] {len(groups)} groups replayed in {elapsed:.3f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
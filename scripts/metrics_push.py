@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Metrics Push - Send test metrics to the metrics server's push API (Pushgateway-compatible)
+Runners push their results to /metrics/job/<job>/service/<svc> instead of rewriting the
+files in monitoring/metrics/, so updates show up on the next scrape without restarts.
+Only the standard library is used (urllib).
+
+The server URL comes from --url or the METRICS_PUSH_URL environment variable
+(default: http://localhost:9091).
+
+Usage: python metrics_push.py metrics.txt --job unit-tests --label service=user_service [--method POST]
+       python metrics_push.py --delete --job unit-tests --label service=user_service
+"""
+
+import os
+import sys
+import argparse
+import urllib.error
+import urllib.request
+from urllib.parse import quote
+from typing import Dict, Optional
+
+from metric_registry import MetricRegistry, load_file
+
+DEFAULT_PUSH_URL = "http://localhost:9091"
+
+
+def push_url(job: str, grouping: Optional[Dict[str, str]] = None, base_url: Optional[str] = None) -> str:
+    base_url = (base_url or os.environ.get("METRICS_PUSH_URL") or DEFAULT_PUSH_URL).rstrip("/")
+    path = f"/metrics/job/{quote(job, safe='')}"
+    for key, value in (grouping or {}).items():
+        path += f"/{quote(key, safe='')}/{quote(str(value), safe='')}"
+    return base_url + path
+
+
+def _send(method: str, url: str, body: bytes = b"", timeout: float = 10) -> bool:
+    request = urllib.request.Request(url, data=body if method != "DELETE" else None, method=method,
+                                     headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+        return True
+    except urllib.error.HTTPError as e:
+        print(f"[!] {method} {url} failed: HTTP {e.code} {e.read().decode('utf-8', 'replace').strip()}")
+    except (urllib.error.URLError, OSError) as e:
+        print(f"[!] {method} {url} failed: {e}")
+    return False
+
+
+def push_registry(registry: MetricRegistry, job: str, grouping: Optional[Dict[str, str]] = None,
+                  base_url: Optional[str] = None, method: str = "PUT", timeout: float = 10) -> bool:
+    """
+    Push a registry to the group job/<job>[/<label>/<value>...].
+    PUT replaces everything in the group; POST only replaces the families being pushed.
+    """
+    url = push_url(job, grouping, base_url)
+    if _send(method, url, registry.render().encode("utf-8"), timeout):
+        print(f"[+] Metrics pushed to {url}")
+        return True
+    return False
+
+
+def delete_group(job: str, grouping: Optional[Dict[str, str]] = None, base_url: Optional[str] = None,
+                 timeout: float = 10) -> bool:
+    url = push_url(job, grouping, base_url)
+    if _send("DELETE", url, timeout=timeout):
+        print(f"[+] Deleted metrics group {url}")
+        return True
+    return False
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Push Prometheus text metrics to the metrics server")
+    parser.add_argument("files", nargs="*", help="exposition files to push (merged)")
+    parser.add_argument("--job", required=True)
+    parser.add_argument("--label", action="append", default=[], help="grouping label key=value (repeatable)")
+    parser.add_argument("--url", help=f"metrics server base URL (default: $METRICS_PUSH_URL or {DEFAULT_PUSH_URL})")
+    parser.add_argument("--method", choices=("PUT", "POST"), default="PUT")
+    parser.add_argument("--delete", action="store_true", help="delete the group instead of pushing")
+    args = parser.parse_args(argv)
+
+    grouping = {}
+    for item in args.label:
+        key, sep, value = item.partition("=")
+        if not sep:
+            parser.error(f"--label expects key=value, got '{item}'")
+        grouping[key] = value
+
+    if args.delete:
+        return 0 if delete_group(args.job, grouping, args.url) else 1
+    if not args.files:
+        parser.error("no files to push")
+    registry = MetricRegistry()
+    for path in args.files:
+        load_file(path, registry)
+    return 0 if push_registry(registry, args.job, grouping, args.url, args.method) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,85 +2,53 @@
 """
 Parse JUnit XML test results and export as Prometheus metrics
 """
-import xml.etree.ElementTree as ET
-import os
-import glob
-from datetime import datetime
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from metric_registry import MetricRegistry
+from junit_ingest import find_reports, ingest
+
 def parse_junit_files():
     """Parse all JUnit XML files and generate Prometheus metrics"""
     
-    metrics = []
-    timestamp = int(datetime.now().timestamp() * 1000)
+    registry = MetricRegistry()
+    tests_total = registry.gauge('unit_tests_total', 'Total number of unit tests')
+    passed_total = registry.gauge('unit_tests_passed', 'Number of passed tests')
+    failed_total = registry.gauge('unit_tests_failed', 'Number of failed tests')
+    errors_total = registry.gauge('unit_tests_errors', 'Number of test errors')
+    skipped_total = registry.gauge('unit_tests_skipped', 'Number of skipped tests')
+    duration_total = registry.gauge('unit_tests_duration_seconds', 'Test execution time')
+    success_rate = registry.gauge('unit_tests_success_rate', 'Test success rate percentage')
     
-    # Find all surefire reports
-    junit_paths = glob.glob('**/target/surefire-reports/*.xml', recursive=True)
+    # Find all surefire reports (parsed in parallel; unchanged files come from the junit_ingest index)
+    for suite in ingest(find_reports('.', '**/target/surefire-reports/*.xml')):
+        service_name = suite['service']
+        tests = suite['tests']
+        failures = suite['failures']
+        errors = suite['errors']
+        skipped = suite['skipped']
+        
+        success = tests - failures - errors - skipped
+        
+        # One report file per test class: accumulate into the service's series
+        tests_total.inc(tests, service=service_name)
+        passed_total.inc(success, service=service_name)
+        failed_total.inc(failures, service=service_name)
+        errors_total.inc(errors, service=service_name)
+        skipped_total.inc(skipped, service=service_name)
+        duration_total.inc(suite['time'], service=service_name)
+        
+        print(f"✓ Parsed {service_name}: {success}/{tests} passed")
     
-    for junit_file in junit_paths:
-        try:
-            tree = ET.parse(junit_file)
-            root = tree.getroot()
-            
-            # Extract service name from path: DoAnCNPM_Backend/service_name/target/surefire-reports/...
-            path_parts = junit_file.replace('\\', '/').split('/')
-            # Find service directory (parent of 'target')
-            service_name = 'unknown'
-            for i, part in enumerate(path_parts):
-                if part == 'target' and i > 0:
-                    service_name = path_parts[i - 1]
-                    break
-            
-            tests = int(root.get('tests', 0))
-            failures = int(root.get('failures', 0))
-            errors = int(root.get('errors', 0))
-            skipped = int(root.get('skipped', 0))
-            time_taken = float(root.get('time', 0))
-            
-            success = tests - failures - errors - skipped
-            
-            # Generate Prometheus metrics
-            metrics.append(f'# HELP unit_tests_total Total number of unit tests')
-            metrics.append(f'# TYPE unit_tests_total gauge')
-            metrics.append(f'unit_tests_total{{service="{service_name}"}} {tests} {timestamp}')
-            
-            metrics.append(f'# HELP unit_tests_passed Number of passed tests')
-            metrics.append(f'# TYPE unit_tests_passed gauge')
-            metrics.append(f'unit_tests_passed{{service="{service_name}"}} {success} {timestamp}')
-            
-            metrics.append(f'# HELP unit_tests_failed Number of failed tests')
-            metrics.append(f'# TYPE unit_tests_failed gauge')
-            metrics.append(f'unit_tests_failed{{service="{service_name}"}} {failures} {timestamp}')
-            
-            metrics.append(f'# HELP unit_tests_errors Number of test errors')
-            metrics.append(f'# TYPE unit_tests_errors gauge')
-            metrics.append(f'unit_tests_errors{{service="{service_name}"}} {errors} {timestamp}')
-            
-            metrics.append(f'# HELP unit_tests_skipped Number of skipped tests')
-            metrics.append(f'# TYPE unit_tests_skipped gauge')
-            metrics.append(f'unit_tests_skipped{{service="{service_name}"}} {skipped} {timestamp}')
-            
-            metrics.append(f'# HELP unit_tests_duration_seconds Test execution time')
-            metrics.append(f'# TYPE unit_tests_duration_seconds gauge')
-            metrics.append(f'unit_tests_duration_seconds{{service="{service_name}"}} {time_taken} {timestamp}')
-            
-            success_rate = (success / tests * 100) if tests > 0 else 0
-            metrics.append(f'# HELP unit_tests_success_rate Test success rate percentage')
-            metrics.append(f'# TYPE unit_tests_success_rate gauge')
-            metrics.append(f'unit_tests_success_rate{{service="{service_name}"}} {success_rate} {timestamp}')
-            
-            print(f"✓ Parsed {service_name}: {success}/{tests} passed")
-            
-        except Exception as e:
-            print(f"✗ Error parsing {junit_file}: {e}")
+    for (_, labels), tests in list(tests_total.series.items()):
+        service_name = dict(labels)['service']
+        success = passed_total.get(service=service_name)
+        success_rate.set((success / tests * 100) if tests > 0 else 0, service=service_name)
     
     # Write metrics file
-    metrics_dir = Path('monitoring/metrics')
-    metrics_dir.mkdir(parents=True, exist_ok=True)
-    
-    metrics_file = metrics_dir / 'unit-tests.prom'
-    with open(metrics_file, 'w') as f:
-        f.write('\n'.join(metrics))
+    metrics_file = Path('monitoring/metrics') / 'unit-tests.prom'
+    registry.write_file(metrics_file)
     
     print(f"\n✓ Metrics written to {metrics_file}")
     return metrics_file
@@ -1,17 +1,35 @@
 #!/usr/bin/env python3
 """
-Run tests for all services sequentially and update dashboard
-Shows results for each service one by one with real-time dashboard updates
+Run tests for all services and update dashboard
+Each service runs run_single_service_test.py in its own process; with --workers N (or
+--parallel) up to N services run at once. Output is captured per service and streamed
+with a [service] prefix. With --measure-serial a real --workers 1 pass is timed first, and the
+parallel wall-clock is compared with it (implies --no-cache, so both passes do the same work).
+Services whose inputs are unchanged since a passing run are served from the result cache
+(test_result_cache.py); hits and misses are listed in the summary. --since REF runs only the
+test classes affected by changes since REF (test_impact.py). Failed test cases are rerun on
+their own up to --reruns times; those that pass are reported as flaky (flaky_tests.py).
+
+Usage: python run_all_services_test.py <backend_path> [--workers N | --parallel] [--measure-serial] [--no-cache]
+                                       [--since REF] [--reruns N]
 """
 
 import os
 import sys
+import time
+import argparse
+import threading
 import subprocess
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from test_result_cache import HIT_MARKER, MISS_MARKER
 
 class AllServicesTestRunner:
-    def __init__(self, backend_path: str):
+    def __init__(self, backend_path: str, workers: int = 1, use_cache: bool = True, since: str = None,
+                 reruns: int = None, measure_serial: bool = False):
         self.backend_path = Path(backend_path)
         self.services = [
             'user_service',
@@ -22,87 +40,161 @@ class AllServicesTestRunner:
             'restaurant-service'
         ]
         self.script_path = self.backend_path.parent / "scripts" / "run_single_service_test.py"
+        self.workers = len(self.services) if workers <= 0 else min(workers, len(self.services))
         self.results = {}
-    
+        self.durations = {}
+        self.wall_clock = 0.0
+        self.serial_seconds = None
+        self.measure_serial = measure_serial
+        self.use_cache = use_cache and not measure_serial
+        self.since = since
+        self.reruns = reruns
+        self.cache_status = {}
+        self._print_lock = threading.Lock()
+        self._processes = []
+
+    def log(self, message: str):
+        with self._print_lock:
+            print(message, flush=True)
+
+    def run_service(self, service: str) -> int:
+        """Run one service's tests, streaming its output with a [service] prefix"""
+        cmd = [sys.executable, str(self.script_path), str(self.backend_path), service]
+        if not self.use_cache:
+            cmd.append("--no-cache")
+        if self.since:
+            cmd += ["--since", self.since]
+        if self.reruns is not None:
+            cmd += ["--reruns", str(self.reruns)]
+        env = dict(os.environ, PYTHONUNBUFFERED="1")
+        prefix = f"[{service}]".ljust(max(len(s) for s in self.services) + 3)
+        started = time.perf_counter()
+        process = subprocess.Popen(cmd, cwd=str(self.backend_path.parent), env=env, stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT, text=True, encoding="utf-8", errors="replace")
+        self._processes.append(process)
+        for line in process.stdout:
+            if line.startswith(HIT_MARKER):
+                self.cache_status[service] = "hit"
+            elif line.startswith(MISS_MARKER):
+                self.cache_status[service] = "miss"
+            self.log(prefix + line.rstrip("\n"))
+        returncode = process.wait()
+        self.durations[service] = time.perf_counter() - started
+        return returncode
+
+    def measure_serial_baseline(self) -> float:
+        """Wall time of one real --workers 1 pass over every service; its results are replaced by the real run"""
+        print(f"\n[*] Measuring the serial baseline: one --workers 1 pass over all services")
+        started = time.perf_counter()
+        for service in self.services:
+            self.run_service(service)
+        elapsed = time.perf_counter() - started
+        self.durations.clear()
+        self.cache_status.clear()
+        print(f"[*] Serial baseline: {elapsed:.1f}s")
+        return elapsed
+
     def run_all_services(self) -> int:
-        """Run tests for all services sequentially"""
+        """Run tests for all services, up to self.workers at a time"""
+        if self.measure_serial and self.workers > 1:
+            self.serial_seconds = self.measure_serial_baseline()
+        mode = "sequentially" if self.workers == 1 else f"in parallel ({self.workers} workers)"
         print(f"\n{'='*70}")
-        print(f"[*] RUNNING TESTS FOR ALL SERVICES")
+        print(f"[*] RUNNING TESTS FOR ALL SERVICES {mode.upper()}")
         print(f"[*] Start Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"{'='*70}\n")
-        
+
         total_failed = 0
-        
-        for i, service in enumerate(self.services, 1):
-            print(f"\n{'='*70}")
-            print(f"[*] SERVICE {i}/{len(self.services)}: {service.upper()}")
-            print(f"{'='*70}\n")
-            
-            cmd = [
-                "python",
-                str(self.script_path),
-                str(self.backend_path),
-                service
-            ]
-            
+        started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self.run_service, service): service for service in self.services}
             try:
-                result = subprocess.run(cmd, cwd=str(self.backend_path.parent))
-                
-                if result.returncode == 0:
-                    self.results[service] = "✓ PASS"
-                    print(f"[✓] {service} - PASSED")
-                else:
-                    self.results[service] = "✗ FAIL"
-                    total_failed += 1
-                    print(f"[✗] {service} - FAILED")
-                    
-            except Exception as e:
-                self.results[service] = f"✗ ERROR: {e}"
-                total_failed += 1
-                print(f"[!] Error running {service}: {e}")
-            
-            # Add delay between services
-            print(f"\n[*] Waiting 5 seconds before next service...\n")
-            import time
-            time.sleep(5)
-        
+                for future in as_completed(futures):
+                    service = futures[future]
+                    try:
+                        returncode = future.result()
+                    except Exception as e:
+                        self.results[service] = f"✗ ERROR: {e}"
+                        total_failed += 1
+                        self.log(f"[!] Error running {service}: {e}")
+                        continue
+
+                    if returncode == 0:
+                        self.results[service] = "✓ PASS"
+                        self.log(f"[✓] {service} - PASSED ({self.durations[service]:.1f}s)")
+                    else:
+                        self.results[service] = "✗ FAIL"
+                        total_failed += 1
+                        self.log(f"[✗] {service} - FAILED ({self.durations[service]:.1f}s)")
+            except KeyboardInterrupt:
+                for future in futures:
+                    future.cancel()
+                for process in self._processes:
+                    process.kill()
+                raise
+
+        self.wall_clock = time.perf_counter() - started
         self.print_summary()
         return total_failed
-    
+
     def print_summary(self):
         """Print summary of all test results"""
         print(f"\n{'='*70}")
         print(f"[*] SUMMARY - ALL SERVICES TEST RUN")
         print(f"{'='*70}\n")
-        
+
         passed_count = sum(1 for v in self.results.values() if "PASS" in v)
-        failed_count = sum(1 for v in self.results.values() if "FAIL" in v)
-        
-        for service, result in self.results.items():
-            print(f"{result:8} | {service}")
-        
+        failed_count = sum(1 for v in self.results.values() if "FAIL" in v or "ERROR" in v)
+
+        for service in self.services:
+            duration = f"{self.durations[service]:7.1f}s" if service in self.durations else " " * 8
+            cached = " (cached)" if self.cache_status.get(service) == "hit" else ""
+            print(f"{self.results.get(service, '- SKIPPED'):8} | {duration} | {service}{cached}")
+
         print(f"\n{'='*70}")
         print(f"Total Services: {len(self.results)}")
         print(f"Passed:         {passed_count}")
         print(f"Failed:         {failed_count}")
+        if self.cache_status:
+            hits = sum(1 for status in self.cache_status.values() if status == "hit")
+            print(f"Result cache:   {hits} hits, {len(self.cache_status) - hits} misses")
+        print(f"Wall-clock:     {self.wall_clock:.1f}s ({self.workers} worker{'s' if self.workers > 1 else ''})")
+        if self.serial_seconds and self.wall_clock > 0:
+            print(f"Sequential:     {self.serial_seconds:.1f}s (measured --workers 1 pass) -> "
+                  f"{self.serial_seconds / self.wall_clock:.2f}x speedup")
+        elif self.workers > 1:
+            # Services that ran side by side competed for CPU and disk, so their durations
+            # added up are not a sequential baseline; no speedup without a measured one
+            print(f"Sequential:     not measured (use --measure-serial)")
         print(f"{'='*70}\n")
-        
+
         print("[✓] All results updated in Grafana")
         print("[*] Dashboard URL: http://localhost:3001")
         print("[*] Prometheus will scrape metrics in ~30 seconds")
         print(f"[*] End Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python run_all_services_test.py <backend_path>")
-        print("\nExample:")
-        print("  python run_all_services_test.py D:\\cnpm\\CNPM-3\\DoAnCNPM_Backend")
-        return 1
-    
-    backend_path = sys.argv[1]
-    runner = AllServicesTestRunner(backend_path)
+    parser = argparse.ArgumentParser(
+        description="Run the unit tests of every backend service",
+        epilog="Example: python run_all_services_test.py D:\\cnpm\\CNPM-3\\DoAnCNPM_Backend --workers 3")
+    parser.add_argument("backend_path")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="services to test at once (default: 1, sequential; 0: one per service)")
+    parser.add_argument("--parallel", action="store_true", help="same as --workers 0")
+    parser.add_argument("--measure-serial", action="store_true",
+                        help="time a real --workers 1 pass first and report the measured speedup (implies --no-cache)")
+    parser.add_argument("--no-cache", action="store_true", help="run Maven for every service, ignoring cached results")
+    parser.add_argument("--since", metavar="REF", help="only run tests affected by changes since git REF")
+    parser.add_argument("--reruns", type=int, metavar="N",
+                        help="rerun each failed test case up to N times on its own (default: 2, 0: off)")
+    args = parser.parse_args()
+
+    runner = AllServicesTestRunner(args.backend_path, workers=0 if args.parallel else args.workers,
+                                   use_cache=not args.no_cache, since=args.since,
+                                   reruns=args.reruns, measure_serial=args.measure_serial)
     total_failed = runner.run_all_services()
-    
+
     return 0 if total_failed == 0 else 1
 
 if __name__ == "__main__":
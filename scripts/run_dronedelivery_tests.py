@@ -1,6 +1,12 @@
 #!/usr/bin/env python3
 """
 DroneDelivery Test Runner - Runs Jest tests and exports metrics
+With --since REF only the tests related to files changed since git REF run
+(jest --findRelatedTests); their results are merged into the last full test-results.json.
+Failed tests are rerun on their own up to --reruns times; those that pass are flaky (flaky_tests.py).
+With --workers N the test files run in N parallel Jest processes, each on its own database
+namespace, and the run reports its speedup over a serial run (jest_workers.py).
+Usage: python run_dronedelivery_tests.py <project_path> [--push] [--since REF] [--reruns N] [--workers N]
 """
 
 import subprocess
@@ -8,13 +14,27 @@ import json
 import os
 import sys
 from pathlib import Path
-from datetime import datetime
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from metric_registry import MetricRegistry
+from metrics_push import push_registry
+from test_impact import jest_related_files, merge_jest_results
+from test_run_store import record_suites
+from test_timing import JEST_SERVICE, read_jest_suites
+from jest_ingest import build_registry as build_jest_registry, ingest as ingest_jest, pass_rate, test_totals
+from flaky_tests import DEFAULT_RERUNS, print_rerun_summary, rerun_jest_failures
+from jest_workers import add_speedup_metrics, run_workers
 
 class DroneDeliveryTestRunner:
-    def __init__(self, project_path):
-        self.project_path = Path(project_path)
+    def __init__(self, project_path, push=False, since=None, reruns=DEFAULT_RERUNS, workers=1):
+        # Absolute: run_tests() changes into BackEnd before the results are read
+        self.project_path = Path(project_path).resolve()
+        self.push = push
+        self.since = since
+        self.reruns = reruns
+        self.workers = workers
+        self.parallel_stats = None
         self.backend_path = self.project_path / "BackEnd"
-        self.coverage_file = self.backend_path / "coverage" / "coverage-summary.json"
         self.metrics_output = Path(__file__).parent.parent / "monitoring" / "metrics" / "dronedelivery_test_metrics.txt"
         
     def run_tests(self):
@@ -25,6 +45,12 @@ class DroneDeliveryTestRunner:
             # Change to backend directory
             os.chdir(self.backend_path)
             
+            related = jest_related_files(self.backend_path, self.since) if self.since else None
+            if related is not None and (self.backend_path / "test-results.json").exists():
+                return self.run_related_tests(related)
+            if self.workers > 1:
+                return self.run_parallel_tests()
+            
             # Run npm test
             result = subprocess.run(
                 ["npm", "test", "--", "--coverage", "--json", "--outputFile=test-results.json"],
@@ -35,7 +61,7 @@ class DroneDeliveryTestRunner:
             
             print(f"✅ Tests completed with exit code: {result.returncode}")
             
-            return result.returncode == 0
+            return result.returncode == 0 or self.rerun_failures()
             
         except subprocess.TimeoutExpired:
             print("❌ Tests timed out after 5 minutes")
@@ -44,101 +70,79 @@ class DroneDeliveryTestRunner:
             print(f"❌ Error running tests: {e}")
             return False
     
-    def parse_coverage(self):
-        """Parse coverage summary"""
-        if not self.coverage_file.exists():
-            print(f"⚠️ Coverage file not found: {self.coverage_file}")
-            return None
-            
+    def run_related_tests(self, related):
+        """Run only the tests related to `related` files and merge them into test-results.json"""
+        if not related:
+            print(f"✅ No source changes since {self.since}; keeping the previous test results")
+            totals = test_totals(ingest_jest(self.backend_path)["suites"])
+            return totals["tests"] > 0 and not totals["failed"] and not totals["errors"]
+        print(f"🎯 Running tests related to {len(related)} changed files since {self.since}")
+        related_file = self.backend_path / "test-results.related.json"
+        # Coverage is left off: a partial run would overwrite the full coverage summary
+        result = subprocess.run(
+            ["npx", "jest", "--json", f"--outputFile={related_file.name}", "--passWithNoTests",
+             "--findRelatedTests", *related],
+            capture_output=True,
+            text=True,
+            timeout=300,
+            env=dict(os.environ, NODE_ENV="test")
+        )
+        print(f"✅ Related tests completed with exit code: {result.returncode}")
         try:
-            with open(self.coverage_file, 'r') as f:
-                coverage = json.load(f)
-            
-            total = coverage.get('total', {})
-            return {
-                'statements': total.get('statements', {}).get('pct', 0),
-                'branches': total.get('branches', {}).get('pct', 0),
-                'functions': total.get('functions', {}).get('pct', 0),
-                'lines': total.get('lines', {}).get('pct', 0),
-            }
-        except Exception as e:
-            print(f"❌ Error parsing coverage: {e}")
-            return None
+            with open(self.backend_path / "test-results.json", 'r') as f:
+                previous = json.load(f)
+            with open(related_file, 'r') as f:
+                merged = merge_jest_results(previous, json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"❌ Error merging related test results: {e}")
+            return False
+        with open(self.backend_path / "test-results.json", 'w') as f:
+            json.dump(merged, f)
+        related_file.unlink()
+        return result.returncode == 0 or self.rerun_failures()
     
-    def parse_test_results(self):
-        """Parse test results"""
-        test_results_file = self.backend_path / "test-results.json"
-        
-        if not test_results_file.exists():
-            print(f"⚠️ Test results file not found: {test_results_file}")
-            return None
-        
-        try:
-            with open(test_results_file, 'r') as f:
-                results = json.load(f)
-            
-            return {
-                'numTotalTests': results.get('numTotalTests', 0),
-                'numPassedTests': results.get('numPassedTests', 0),
-                'numFailedTests': results.get('numFailedTests', 0),
-                'numPendingTests': results.get('numPendingTests', 0),
-                'success': results.get('success', False),
-            }
-        except Exception as e:
-            print(f"❌ Error parsing test results: {e}")
-            return None
+    def run_parallel_tests(self):
+        """Run the test files in parallel Jest workers and merge them into test-results.json"""
+        print(f"⚡ Running tests in {self.workers} parallel workers")
+        self.parallel_stats = run_workers(self.backend_path, self.workers)
+        if self.parallel_stats is None:
+            return False
+        return self.parallel_stats["failures"] == 0 or self.rerun_failures()
+    
+    def rerun_failures(self):
+        """Rerun only the failed tests; True if every one of them passed again (flaky)"""
+        if self.reruns <= 0 or not (self.backend_path / "test-results.json").exists():
+            return False
+        flaky, failed = rerun_jest_failures(self.backend_path, self.reruns)
+        print_rerun_summary(flaky, failed)
+        return bool(flaky) and not failed
+    
+    def record_history(self, source="run_dronedelivery_tests"):
+        """Keep the per-test results in the test run store (per-test timings, regressions)"""
+        suites = read_jest_suites(self.backend_path / "test-results.json")
+        if suites:
+            record_suites(suites, source, self.metrics_output.parent, JEST_SERVICE)
     
-    def export_metrics(self, coverage, test_results):
-        """Export metrics in Prometheus format"""
-        if not coverage or not test_results:
+    def build_registry(self, ingested) -> MetricRegistry:
+        # Totals, per-suite, per-module and per-file coverage series (jest_ingest.py)
+        registry = build_jest_registry(ingested)
+        if self.parallel_stats:
+            add_speedup_metrics(registry, self.parallel_stats)
+        return registry
+    
+    def export_metrics(self, ingested):
+        """Export metrics in Prometheus format (pushed to the metrics server with --push)"""
+        if not ingested["suites"]:
             print("⚠️ No metrics to export")
             return False
         
-        timestamp = int(datetime.now().timestamp() * 1000)
-        
-        metrics = []
-        
-        # Test metrics
-        metrics.append("# HELP dronedelivery_test_total Total number of tests")
-        metrics.append("# TYPE dronedelivery_test_total gauge")
-        metrics.append(f"dronedelivery_test_total {test_results['numTotalTests']} {timestamp}")
-        
-        metrics.append("# HELP dronedelivery_test_passed Number of passed tests")
-        metrics.append("# TYPE dronedelivery_test_passed gauge")
-        metrics.append(f"dronedelivery_test_passed {test_results['numPassedTests']} {timestamp}")
-        
-        metrics.append("# HELP dronedelivery_test_failed Number of failed tests")
-        metrics.append("# TYPE dronedelivery_test_failed gauge")
-        metrics.append(f"dronedelivery_test_failed {test_results['numFailedTests']} {timestamp}")
-        
-        metrics.append("# HELP dronedelivery_test_pass_rate Test pass rate percentage")
-        metrics.append("# TYPE dronedelivery_test_pass_rate gauge")
-        pass_rate = (test_results['numPassedTests'] / test_results['numTotalTests'] * 100) if test_results['numTotalTests'] > 0 else 0
-        metrics.append(f"dronedelivery_test_pass_rate {pass_rate:.2f} {timestamp}")
-        
-        # Coverage metrics
-        metrics.append("# HELP dronedelivery_coverage_statements Statement coverage percentage")
-        metrics.append("# TYPE dronedelivery_coverage_statements gauge")
-        metrics.append(f"dronedelivery_coverage_statements {coverage['statements']} {timestamp}")
-        
-        metrics.append("# HELP dronedelivery_coverage_branches Branch coverage percentage")
-        metrics.append("# TYPE dronedelivery_coverage_branches gauge")
-        metrics.append(f"dronedelivery_coverage_branches {coverage['branches']} {timestamp}")
-        
-        metrics.append("# HELP dronedelivery_coverage_functions Function coverage percentage")
-        metrics.append("# TYPE dronedelivery_coverage_functions gauge")
-        metrics.append(f"dronedelivery_coverage_functions {coverage['functions']} {timestamp}")
-        
-        metrics.append("# HELP dronedelivery_coverage_lines Line coverage percentage")
-        metrics.append("# TYPE dronedelivery_coverage_lines gauge")
-        metrics.append(f"dronedelivery_coverage_lines {coverage['lines']} {timestamp}")
+        registry = self.build_registry(ingested)
+        if self.push and push_registry(registry, "dronedelivery-tests", {"service": "backend"}):
+            return True
         
         # Write metrics file
         try:
-            self.metrics_output.parent.mkdir(parents=True, exist_ok=True)
-            with open(self.metrics_output, 'w') as f:
-                f.write('\n'.join(metrics) + '\n')
-            
+            registry.write_file(self.metrics_output)
             print(f"✅ Metrics exported to: {self.metrics_output}")
             return True
         except Exception as e:
@@ -154,42 +158,65 @@ class DroneDeliveryTestRunner:
         # Run tests
         success = self.run_tests()
         
-        # Parse results
-        coverage = self.parse_coverage()
-        test_results = self.parse_test_results()
-        
-        # Export metrics
-        if coverage and test_results:
-            self.export_metrics(coverage, test_results)
+        # Parse results and coverage, then export metrics
+        ingested = ingest_jest(self.backend_path)
+        if ingested["suites"]:
+            self.export_metrics(ingested)
+            self.record_history()
         
         # Print summary
         print("\n" + "=" * 60)
         print("📊 Test Summary")
         print("=" * 60)
         
-        if test_results:
-            print(f"Total Tests: {test_results['numTotalTests']}")
-            print(f"✅ Passed: {test_results['numPassedTests']}")
-            print(f"❌ Failed: {test_results['numFailedTests']}")
-            print(f"⏸️  Pending: {test_results['numPendingTests']}")
-            print(f"Pass Rate: {pass_rate:.2f}%")
-        
-        if coverage:
+        if ingested["suites"]:
+            totals = test_totals(ingested["suites"])
+            print(f"Total Tests: {totals['tests']}")
+            print(f"✅ Passed: {totals['passed'] + totals['flaky']}")
+            print(f"❌ Failed: {totals['failed']}")
+            print(f"⏸️  Pending: {totals['skipped']}")
+            if totals['flaky']:
+                print(f"🔁 Flaky: {totals['flaky']} (passed on rerun)")
+            print(f"Pass Rate: {pass_rate(totals):.2f}%")
+        
+        if self.parallel_stats:
+            baseline = "measured serial" if self.parallel_stats['serial_measured'] else "estimated serial ~"
+            print(f"\n⚡ {self.parallel_stats['workers']} workers: {self.parallel_stats['wall_seconds']}s "
+                  f"({baseline}{self.parallel_stats['serial_seconds']}s, speedup x{self.parallel_stats['speedup']})")
+        
+        if ingested["total"]:
             print(f"\n📈 Coverage:")
-            print(f"Statements: {coverage['statements']}%")
-            print(f"Branches: {coverage['branches']}%")
-            print(f"Functions: {coverage['functions']}%")
-            print(f"Lines: {coverage['lines']}%")
+            print(f"Statements: {ingested['total']['statements']}%")
+            print(f"Branches: {ingested['total']['branches']}%")
+            print(f"Functions: {ingested['total']['functions']}%")
+            print(f"Lines: {ingested['total']['lines']}%")
         
         print("=" * 60)
         
         return 0 if success else 1
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python run_dronedelivery_tests.py <project_path>")
+    argv = sys.argv[1:]
+    since = None
+    if "--since" in argv:
+        i = argv.index("--since")
+        since = argv[i + 1] if i + 1 < len(argv) else "HEAD"
+        del argv[i:i + 2]
+    reruns = DEFAULT_RERUNS
+    if "--reruns" in argv:
+        i = argv.index("--reruns")
+        reruns = int(argv[i + 1]) if i + 1 < len(argv) else DEFAULT_RERUNS
+        del argv[i:i + 2]
+    workers = 1
+    if "--workers" in argv:
+        i = argv.index("--workers")
+        workers = int(argv[i + 1]) if i + 1 < len(argv) else os.cpu_count() or 2
+        del argv[i:i + 2]
+    args = [arg for arg in argv if arg != "--push"]
+    if not args:
+        print("Usage: python run_dronedelivery_tests.py <project_path> [--push] [--since REF] [--reruns N] [--workers N]")
         sys.exit(1)
     
-    project_path = sys.argv[1]
-    runner = DroneDeliveryTestRunner(project_path)
+    project_path = args[0]
+    runner = DroneDeliveryTestRunner(project_path, push="--push" in argv, since=since, reruns=reruns, workers=workers)
     sys.exit(runner.run())
@@ -2,24 +2,45 @@
 """
 Run tests for a single service and update metrics in real-time
 Supports individual project testing with live Grafana dashboard updates
+Unchanged services reuse their cached surefire reports (test_result_cache.py) unless --no-cache;
+with --since REF only the test classes affected by changes since REF run (test_impact.py);
+failed test cases are rerun in isolation (flaky_tests.py) and count as flaky if they pass
 """
 
 import os
 import sys
+import time
 import subprocess
 import json
 import glob
-import xml.etree.ElementTree as ET
 from pathlib import Path
 from datetime import datetime
 from typing import Tuple
 
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from metric_registry import MetricRegistry, file_lock, load_file
+from metrics_push import push_registry
+from junit_ingest import ingest
+from test_run_store import record_suites
+from test_result_cache import HIT_MARKER, MISS_MARKER, open_cache
+from test_impact import select_java_tests
+from flaky_tests import DEFAULT_RERUNS, print_rerun_summary, rerun_java_failures
+
 class SingleServiceTestRunner:
-    def __init__(self, backend_path: str, service_name: str):
+    def __init__(self, backend_path: str, service_name: str, push: bool = False, push_url: str = None,
+                 use_cache: bool = True, since: str = None, reruns: int = DEFAULT_RERUNS):
         self.backend_path = Path(backend_path)
         self.service_path = self.backend_path / service_name
         self.service_name = service_name
         self.metrics_dir = self.backend_path.parent / "monitoring" / "metrics"
+        self.push = push
+        self.push_url = push_url
+        self.suites = []
+        self.cache = open_cache() if use_cache else None
+        self.cache_hit = False
+        self.since = since
+        self.reruns = reruns
+        self.flaky = 0
         
     def run_tests(self) -> bool:
         """Run Maven tests for the service"""
@@ -32,17 +53,42 @@ class SingleServiceTestRunner:
             print(f"[!] ERROR: Service path does not exist: {self.service_path}")
             return False
         
+        # Same inputs as a cached passing run: reuse its reports instead of running Maven
+        cache_key = self.cache.fingerprint(self.service_path, "mvn test") if self.cache else None
+        if cache_key:
+            entry = self.cache.restore(self.service_path, cache_key)
+            if entry is not None:
+                self.cache_hit = True
+                print(f"{HIT_MARKER} {self.service_name} ({cache_key[:12]}): reused {len(entry['files'])} report "
+                      f"files, saved ~{entry['duration_sec']:.0f}s")
+                return True
+            print(f"{MISS_MARKER} {self.service_name} ({cache_key[:12]})")
+        
+        # Test impact: only the test classes that depend on what changed since self.since
+        selection = select_java_tests(self.service_path, self.since) if self.since else None
+        if selection is not None and not selection:
+            if list((self.service_path / "target" / "surefire-reports").glob("TEST-*.xml")):
+                print(f"[impact] No test classes affected by changes since {self.since}; keeping the previous reports")
+                return True
+            print(f"[impact] No test classes affected, but there are no previous reports; running all tests")
+            selection = None
+        
         # Use Maven wrapper
         mvnw_cmd = self.service_path / "mvnw.cmd"
         if mvnw_cmd.exists():
             cmd = ["cmd", "/c", str(mvnw_cmd), "test", "-q"]
         else:
             cmd = ["mvn", "test", "-q"]
+        if selection:
+            # Reports of the other classes stay in target/ from earlier runs, so totals still cover the suite
+            cmd += [f"-Dtest={','.join(selection)}", "-Dsurefire.failIfNoSpecifiedTests=false"]
+            print(f"[impact] {len(selection)} affected test classes since {self.since}: {', '.join(selection)}")
         
         print(f"[*] Running: {' '.join(cmd)}")
         print(f"{'='*70}\n")
         
         try:
+            started = time.perf_counter()
             result = subprocess.run(
                 cmd,
                 cwd=str(self.service_path),
@@ -50,15 +96,28 @@ class SingleServiceTestRunner:
             )
             
             if result.returncode == 0:
+                # Only full runs are cached: a selected run may leave reports from older inputs behind
+                if cache_key and not selection and \
+                        self.cache.store(self.service_path, cache_key, time.perf_counter() - started):
+                    self.cache.evict()
                 print(f"\n{'='*70}")
                 print(f"[✓] Tests PASSED for {self.service_name}")
                 print(f"{'='*70}\n")
                 return True
-            else:
-                print(f"\n{'='*70}")
-                print(f"[✗] Tests FAILED for {self.service_name}")
-                print(f"{'='*70}\n")
-                return False
+            elif self.reruns > 0:
+                # Only the failed cases are rerun; a run whose failures all pass again is not cached
+                flaky, failed = rerun_java_failures(self.service_path, self.reruns)
+                print_rerun_summary(flaky, failed)
+                if flaky and not failed:
+                    print(f"\n{'='*70}")
+                    print(f"[✓] Tests PASSED for {self.service_name} ({len(flaky)} flaky)")
+                    print(f"{'='*70}\n")
+                    return True
+            
+            print(f"\n{'='*70}")
+            print(f"[✗] Tests FAILED for {self.service_name}")
+            print(f"{'='*70}\n")
+            return False
                 
         except Exception as e:
             print(f"[!] Error running tests: {e}")
@@ -83,86 +142,77 @@ class SingleServiceTestRunner:
         total_passed = 0
         total_failed = 0
         total_time = 0
-        
-        for test_file in test_files:
-            try:
-                tree = ET.parse(test_file)
-                root = tree.getroot()
-                
-                tests = int(root.get('tests', 0))
-                failures = int(root.get('failures', 0))
-                errors = int(root.get('errors', 0))
-                time = float(root.get('time', 0))
-                
-                passed = tests - failures - errors
-                
-                total_tests += tests
-                total_passed += passed
-                total_failed += failures + errors
-                total_time += time
-                
-                print(f"[+] {Path(test_file).name}: {tests} tests, {passed} passed, {failures + errors} failed ({time:.2f}s)")
-                
-            except Exception as e:
-                print(f"[!] Error parsing {test_file}: {e}")
+        self.suites = ingest(test_files, self.service_name)
+        self.flaky = sum(1 for suite in self.suites for case in suite['testcases'] if case['status'] == 'flaky')
+        for suite in self.suites:
+            tests = suite['tests']
+            failed = suite['failures'] + suite['errors']
+            passed = tests - failed
+            
+            total_tests += tests
+            total_passed += passed
+            total_failed += failed
+            total_time += suite['time']
+            
+            print(f"[+] {suite['file']}: {tests} tests, {passed} passed, {failed} failed ({suite['time']:.2f}s)")
         
         return total_tests, total_passed, total_failed, total_time
     
+    def service_registry(self, tests: int, passed: int, failed: int, exec_time: float) -> MetricRegistry:
+        """Per-service series of this run"""
+        registry = MetricRegistry()
+        pass_rate = (passed / tests * 100) if tests > 0 else 0
+        labels = {"service": self.service_name}
+        registry.gauge("test_count_by_service", "Test count by service").set(tests, **labels)
+        registry.gauge("test_pass_count_by_service", "Passed tests by service").set(passed, **labels)
+        registry.gauge("test_fail_count_by_service", "Failed tests by service").set(failed, **labels)
+        registry.gauge("test_pass_rate_by_service", "Pass rate by service").set(round(pass_rate, 2), **labels)
+        registry.gauge("test_execution_time_by_service", "Execution time by service").set(round(exec_time, 2), **labels)
+        registry.gauge("test_flaky_count_by_service", "Flaky tests (passed on rerun) by service").set(self.flaky, **labels)
+        return registry
+    
+    def push_metrics(self, service: MetricRegistry, summary: MetricRegistry) -> bool:
+        """Push this service's series (job unit-tests, service=<name>) and the summary (job unit-tests)"""
+        pushed = push_registry(service, "unit-tests", {"service": self.service_name}, self.push_url)
+        return push_registry(summary, "unit-tests", None, self.push_url) and pushed
+    
     def update_metrics_file(self, tests: int, passed: int, failed: int, exec_time: float):
-        """Update the metrics file with new data"""
-        self.metrics_dir.mkdir(parents=True, exist_ok=True)
+        """
+        Upsert this service's series into the metrics file, keeping the other services, and
+        push them when pushing. Pushed series are written with the pushed job label, so the
+        server serves one copy of each and the file still totals every service.
+        """
         metrics_file = self.metrics_dir / "test_metrics.txt"
-        
-        # Read existing metrics
-        all_metrics = {}
-        if metrics_file.exists():
-            with open(metrics_file, 'r') as f:
-                content = f.read()
-                # Parse existing metrics (simplified)
-                for line in content.split('\n'):
-                    if line.startswith('test_') and '{' in line and '}' in line:
-                        all_metrics[line] = True
-        
-        timestamp = int(datetime.now().timestamp() * 1000)
-        
-        # Build Prometheus format with updated service data
-        lines = []
-        
-        # Summary metrics (keep existing)
-        lines.append(f"# HELP test_count_total Total number of tests")
-        lines.append(f"# TYPE test_count_total counter")
-        lines.append(f"test_count_total {tests} {timestamp}")
-        
-        lines.append(f"# HELP test_pass_count Total number of passed tests")
-        lines.append(f"# TYPE test_pass_count counter")
-        lines.append(f"test_pass_count {passed} {timestamp}")
-        
-        lines.append(f"# HELP test_fail_count Total number of failed tests")
-        lines.append(f"# TYPE test_fail_count counter")
-        lines.append(f"test_fail_count {failed} {timestamp}")
-        
-        pass_rate = (passed / tests * 100) if tests > 0 else 0
-        lines.append(f"# HELP test_pass_rate_percent Overall test pass rate")
-        lines.append(f"# TYPE test_pass_rate_percent gauge")
-        lines.append(f"test_pass_rate_percent {pass_rate} {timestamp}")
-        
-        lines.append(f"# HELP test_execution_time_seconds Total test execution time")
-        lines.append(f"# TYPE test_execution_time_seconds gauge")
-        lines.append(f"test_execution_time_seconds {exec_time} {timestamp}")
-        
-        # Per-service metrics
-        lines.append(f"# HELP test_count_by_service Test count by service")
-        lines.append(f"# TYPE test_count_by_service gauge")
-        lines.append(f'test_count_by_service{{service="{self.service_name}"}} {tests} {timestamp}')
-        lines.append(f'test_pass_count_by_service{{service="{self.service_name}"}} {passed} {timestamp}')
-        lines.append(f'test_fail_count_by_service{{service="{self.service_name}"}} {failed} {timestamp}')
-        lines.append(f'test_pass_rate_by_service{{service="{self.service_name}"}} {pass_rate} {timestamp}')
-        lines.append(f'test_execution_time_by_service{{service="{self.service_name}"}} {exec_time} {timestamp}')
-        
-        # Save metrics
-        with open(metrics_file, 'w') as f:
-            f.write('\n'.join(lines))
-        
+        # Locked: run_all_services_test.py --workers N updates this file from several processes
+        with file_lock(metrics_file):
+            registry = load_file(metrics_file)
+            service = self.service_registry(tests, passed, failed, exec_time)
+            registry.remove_matching(service=self.service_name)  # with or without a job label
+            registry.merge(service)
+        
+            # Summary metrics across every service in the file
+            def total(name):
+                return sum(registry.families[name].series.values())
+        
+            all_tests = total("test_count_by_service")
+            all_passed = total("test_pass_count_by_service")
+            summary = MetricRegistry()
+            summary.counter("test_count_total", "Total number of tests").set(all_tests)
+            summary.counter("test_pass_count", "Total number of passed tests").set(all_passed)
+            summary.counter("test_fail_count", "Total number of failed tests").set(total("test_fail_count_by_service"))
+            summary.gauge("test_flaky_count", "Total number of flaky tests").set(total("test_flaky_count_by_service"))
+            summary.gauge("test_pass_rate_percent", "Overall test pass rate").set(
+                round(all_passed / all_tests * 100, 2) if all_tests > 0 else 0)
+            summary.gauge("test_execution_time_seconds", "Total test execution time").set(
+                round(total("test_execution_time_by_service"), 2))
+        
+            if self.push and self.push_metrics(service, summary):
+                registry.remove_matching(service=self.service_name)
+                registry.merge(service, {"job": "unit-tests"})
+                pushed, summary = summary, MetricRegistry()
+                summary.merge(pushed, {"job": "unit-tests"})
+            registry.replace_families(summary)
+            registry.write_file(metrics_file)
         print(f"[+] Metrics updated: {metrics_file}")
     
     def save_json_report(self, tests: int, passed: int, failed: int, exec_time: float):
@@ -179,6 +229,7 @@ class SingleServiceTestRunner:
                 "total_tests": tests,
                 "passed_tests": passed,
                 "failed_tests": failed,
+                "flaky_tests": self.flaky,
                 "execution_time_seconds": round(exec_time, 2),
                 "pass_rate_percent": round(pass_rate, 2),
                 "status": "PASS" if failed == 0 else "FAIL"
@@ -205,6 +256,8 @@ class SingleServiceTestRunner:
         print(f"Total Tests:     {tests}")
         print(f"Passed:          {passed} [✓]")
         print(f"Failed:          {failed} [✗]")
+        if self.flaky:
+            print(f"Flaky:           {self.flaky} (passed on rerun, counted as passed)")
         print(f"Pass Rate:       {pass_rate:.2f}%")
         print(f"Execution Time:  {exec_time:.2f}s")
         print(f"Status:          {status}")
@@ -229,19 +282,42 @@ class SingleServiceTestRunner:
         # Print results
         self.print_results(tests, passed, failed, exec_time)
         
-        # Update metrics
+        # Update metrics: the metrics file, and the metrics server when pushing
         self.update_metrics_file(tests, passed, failed, exec_time)
         
-        # Save JSON report
+        # Save JSON report, and the run (down to test cases) to the history store
         self.save_json_report(tests, passed, failed, exec_time)
+        source = "run_single_service_test:cached" if self.cache_hit else "run_single_service_test"
+        record_suites(self.suites, source, self.metrics_dir, service=self.service_name)
         
-        print("[✓] Grafana dashboard will update in 30 seconds (Prometheus scrape interval)")
+        print("[✓] Grafana dashboard will update with the next Prometheus scrape (30s interval)")
         
         return 0 if failed == 0 else 1
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python run_single_service_test.py <backend_path> <service_name>")
+    argv = sys.argv[1:]
+    since = None
+    if "--since" in argv:
+        i = argv.index("--since")
+        since = argv[i + 1] if i + 1 < len(argv) else "HEAD"
+        del argv[i:i + 2]
+    reruns = DEFAULT_RERUNS
+    if "--reruns" in argv:
+        i = argv.index("--reruns")
+        reruns = int(argv[i + 1]) if i + 1 < len(argv) else DEFAULT_RERUNS
+        del argv[i:i + 2]
+    flags = {"--push", "--no-cache"}
+    args = [arg for arg in argv if arg not in flags]
+    push = "--push" in argv
+    use_cache = "--no-cache" not in argv
+    if len(args) < 2:
+        print("Usage: python run_single_service_test.py <backend_path> <service_name> [--push] [--no-cache] "
+              "[--since REF] [--reruns N]")
+        print("\n  --push         send results to the metrics server push API ($METRICS_PUSH_URL)")
+        print("  --no-cache     always run Maven, even if the service is unchanged since a cached passing run")
+        print("  --since REF    only run the test classes affected by changes since git REF (e.g. HEAD, origin/main)")
+        print(f"  --reruns N     rerun each failed test case up to N times on its own; passing ones are flaky "
+              f"(default: {DEFAULT_RERUNS}, 0: off)")
         print("\nExamples:")
         print("  python run_single_service_test.py D:\\cnpm\\CNPM-3\\DoAnCNPM_Backend user_service")
         print("  python run_single_service_test.py D:\\cnpm\\CNPM-3\\DoAnCNPM_Backend product_service")
@@ -255,10 +331,11 @@ def main():
         print("  - restaurant-service")
         return 1
     
-    backend_path = sys.argv[1]
-    service_name = sys.argv[2]
+    backend_path = args[0]
+    service_name = args[1]
     
-    runner = SingleServiceTestRunner(backend_path, service_name)
+    runner = SingleServiceTestRunner(backend_path, service_name, push=push, use_cache=use_cache, since=since,
+                                     reruns=reruns)
     return runner.run()
 
 if __name__ == "__main__":
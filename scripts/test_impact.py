@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Test Impact - Select only the tests affected by changed sources
+Java (Maven services): an index of every class under src/main/java and src/test/java with
+its package, imports and referenced type names maps changed classes to the test classes that
+depend on them (transitively), which are then run with -Dtest=. The index is stored under
+.test-cache/impact/ and re-scans only files whose mtime/size changed.
+Spring context tests (@SpringBootTest, @WebMvcTest, @DataJpaTest, ...) load the whole
+application, so they are selected for any main class change. Changes to anything that is
+not a Java source (pom.xml, resources) select the full suite.
+
+Jest (DroneDelivery BackEnd): changed files are handed to `jest --findRelatedTests`, which
+resolves the import graph itself (cached by Jest's haste map).
+
+Changed files come from git: working tree changes against --since (default HEAD) plus
+untracked files.
+
+Usage: python test_impact.py DoAnCNPM_Backend/order_service [--since origin/main]
+       python test_impact.py DoAnCNPM_Backend/order_service --files src/main/java/.../OrderService.java
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from test_result_cache import DEFAULT_CACHE_DIR
+
+INDEX_VERSION = 1
+CONTEXT_ANNOTATIONS = ("SpringBootTest", "WebMvcTest", "WebFluxTest", "DataJpaTest", "DataMongoTest",
+                       "JsonTest", "RestClientTest")
+
+_PACKAGE = re.compile(r"^\s*package\s+([\w.]+)\s*;", re.MULTILINE)
+_IMPORT = re.compile(r"^\s*import\s+(static\s+)?([\w.]+?)(\.\*)?\s*;", re.MULTILINE)
+_COMMENTS_AND_STRINGS = re.compile(r'//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\\n])*"', re.DOTALL)
+_TYPE_NAME = re.compile(r"\b[A-Z][A-Za-z0-9_]*\b")
+_ANNOTATION = re.compile(r"@([A-Z]\w*)")
+# Surefire's default includes; anything else (e.g. *IT, run by failsafe) must not be forced in with -Dtest=
+_SUREFIRE_DEFAULT = re.compile(r"^(Test\w*|\w*Test|\w*Tests|\w*TestCase)$")
+
+
+def changed_files(path, since: str = "HEAD") -> Optional[List[Path]]:
+    """Files under `path` changed since `since` (plus untracked ones); None if git is unavailable"""
+    path = Path(path).resolve()
+    try:
+        top = subprocess.run(["git", "rev-parse", "--show-toplevel"], cwd=str(path), capture_output=True,
+                             text=True, check=True).stdout.strip()
+        diff = subprocess.run(["git", "diff", "--name-only", since, "--", "."], cwd=str(path),
+                              capture_output=True, text=True, check=True).stdout.splitlines()
+        untracked = subprocess.run(["git", "ls-files", "--others", "--exclude-standard", "--full-name", "--", "."],
+                                   cwd=str(path), capture_output=True, text=True, check=True).stdout.splitlines()
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"[!] Could not list changed files with git ({e}); running all tests")
+        return None
+    return sorted({Path(top) / name for name in diff + untracked if name})
+
+
+class JavaDependencyIndex:
+    def __init__(self, service_path, index_path: Optional[Path] = None):
+        self.service_path = Path(service_path).resolve()
+        cache_dir = Path(os.environ.get("TEST_RESULT_CACHE_DIR") or DEFAULT_CACHE_DIR)
+        self.index_path = Path(index_path) if index_path else cache_dir / "impact" / f"{self.service_path.name}.json"
+        self.files: Dict[str, Dict] = {}
+        try:
+            data = json.loads(self.index_path.read_text(encoding="utf-8"))
+            if data.get("version") == INDEX_VERSION:
+                self.files = data["files"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def source_files(self) -> List[Path]:
+        files = []
+        for root in ("src/main/java", "src/test/java"):
+            base = self.service_path / root
+            if base.is_dir():
+                files.extend(base.rglob("*.java"))
+        return files
+
+    def update(self) -> int:
+        """Re-scan new and modified files and drop deleted ones; returns the number re-scanned"""
+        seen = set()
+        rescanned = 0
+        for path in self.source_files():
+            rel = path.relative_to(self.service_path).as_posix()
+            seen.add(rel)
+            stat = path.stat()
+            entry = self.files.get(rel)
+            if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                continue
+            self.files[rel] = dict(self._scan(path), mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+            rescanned += 1
+        stale = set(self.files) - seen
+        for rel in stale:
+            del self.files[rel]
+        if rescanned or stale:
+            self.save()
+        return rescanned
+
+    @staticmethod
+    def _scan(path: Path) -> Dict:
+        text = path.read_text(encoding="utf-8", errors="replace")
+        package = _PACKAGE.search(text)
+        imports = [(match.group(2), bool(match.group(1)), bool(match.group(3))) for match in _IMPORT.finditer(text)]
+        code = _COMMENTS_AND_STRINGS.sub(" ", text)
+        annotations = set(_ANNOTATION.findall(code))
+        return {
+            "package": package.group(1) if package else "",
+            "imports": imports,
+            "names": sorted(set(_TYPE_NAME.findall(code))),
+            "context": any(name in annotations for name in CONTEXT_ANNOTATIONS),
+        }
+
+    def save(self):
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        temp_path.write_text(json.dumps({"version": INDEX_VERSION, "files": self.files}), encoding="utf-8")
+        os.replace(temp_path, self.index_path)
+
+    def _class_name(self, rel: str) -> str:
+        entry = self.files[rel]
+        simple = Path(rel).stem
+        return f"{entry['package']}.{simple}" if entry["package"] else simple
+
+    def dependents(self) -> Dict[str, Set[str]]:
+        """class -> classes that reference it directly"""
+        by_package: Dict[str, Dict[str, str]] = {}
+        classes = {}
+        for rel, entry in self.files.items():
+            name = self._class_name(rel)
+            classes[name] = rel
+            by_package.setdefault(entry["package"], {})[Path(rel).stem] = name
+
+        reverse: Dict[str, Set[str]] = {}
+        for rel, entry in self.files.items():
+            me = self._class_name(rel)
+            names = set(entry["names"])
+            deps = {cls for simple, cls in by_package.get(entry["package"], {}).items() if simple in names}
+            for target, static, wildcard in entry["imports"]:
+                if wildcard:
+                    deps.update(cls for simple, cls in by_package.get(target, {}).items() if simple in names)
+                elif target in classes:
+                    deps.add(target)
+                elif static and target.rpartition(".")[0] in classes:
+                    deps.add(target.rpartition(".")[0])
+            deps.discard(me)
+            for dep in deps:
+                reverse.setdefault(dep, set()).add(me)
+        return reverse
+
+    def affected_tests(self, changed: List[Path]) -> Optional[List[str]]:
+        """
+        Simple names of the test classes to run for `changed` files of this service,
+        or None when the change cannot be narrowed down (run everything)
+        """
+        self.update()
+        test_classes = {self._class_name(rel): rel for rel in self.files if rel.startswith("src/test/")}
+        start = set()
+        main_changed = False
+        for path in changed:
+            try:
+                rel = Path(path).resolve().relative_to(self.service_path).as_posix()
+            except ValueError:
+                continue  # another service
+            if rel.startswith("target/"):
+                continue
+            if not rel.endswith(".java") or not rel.startswith(("src/main/java/", "src/test/java/")):
+                print(f"[impact] {rel} is not a Java source; running all tests")
+                return None
+            if rel not in self.files:
+                print(f"[impact] {rel} was deleted; running all tests")
+                return None
+            start.add(self._class_name(rel))
+            main_changed = main_changed or rel.startswith("src/main/")
+
+        reverse = self.dependents()
+        reached = set(start)
+        queue = list(start)
+        while queue:
+            for dependent in reverse.get(queue.pop(), ()):
+                if dependent not in reached:
+                    reached.add(dependent)
+                    queue.append(dependent)
+
+        selected = {cls for cls in reached if cls in test_classes}
+        if main_changed:
+            selected.update(cls for cls, rel in test_classes.items() if self.files[rel]["context"])
+        return sorted({cls.rpartition(".")[2] for cls in selected} & self._surefire_tests(test_classes))
+
+    @staticmethod
+    def _surefire_tests(test_classes) -> Set[str]:
+        return {cls.rpartition(".")[2] for cls in test_classes if _SUREFIRE_DEFAULT.match(cls.rpartition(".")[2])}
+
+
+def select_java_tests(service_path, since: str = "HEAD", files: Optional[List[Path]] = None) -> Optional[List[str]]:
+    """Test classes to pass to -Dtest= for a service; None means run the full suite"""
+    changed = files if files is not None else changed_files(service_path, since)
+    if changed is None:
+        return None
+    return JavaDependencyIndex(service_path).affected_tests(changed)
+
+
+def jest_related_files(backend_path, since: str = "HEAD") -> Optional[List[str]]:
+    """Changed source files (relative to BackEnd) for `jest --findRelatedTests`; None means run all"""
+    backend_path = Path(backend_path).resolve()
+    changed = changed_files(backend_path, since)
+    if changed is None:
+        return None
+    related = []
+    for path in changed:
+        rel = path.relative_to(backend_path).as_posix()
+        if rel in ("package.json", "package-lock.json", "jest.config.js", "babel.config.js", ".babelrc") \
+                or rel.startswith("__tests__/setup"):
+            print(f"[impact] {rel} changed; running all tests")
+            return None
+        if path.suffix in (".js", ".mjs", ".cjs", ".json") and not rel.startswith(("coverage/", "node_modules/")) \
+                and rel != "test-results.json":
+            related.append(rel)
+    return related
+
+
+def merge_jest_results(previous: Dict, related: Dict) -> Dict:
+    """
+    Overlay a --findRelatedTests run on the last full `jest --json` output (per test file),
+    so the exported totals still describe the whole suite
+    """
+    by_file = {result["name"]: result for result in previous.get("testResults", [])}
+    by_file.update({result["name"]: result for result in related.get("testResults", [])})
+    merged = dict(previous, **{key: related[key] for key in ("startTime", "wasInterrupted") if key in related})
+    merged["testResults"] = list(by_file.values())
+
+    statuses = [assertion["status"] for result in merged["testResults"] for assertion in result["assertionResults"]]
+    suite_statuses = [result["status"] for result in merged["testResults"]]
+    merged.update({
+        "numTotalTests": len(statuses),
+        "numPassedTests": statuses.count("passed"),
+        "numFailedTests": statuses.count("failed"),
+        "numPendingTests": statuses.count("pending"),
+        "numTodoTests": statuses.count("todo"),
+        "numTotalTestSuites": len(suite_statuses),
+        "numPassedTestSuites": suite_statuses.count("passed"),
+        "numFailedTestSuites": suite_statuses.count("failed"),
+        "numPendingTestSuites": suite_statuses.count("pending"),
+    })
+    merged["success"] = merged["numFailedTests"] == 0 and merged["numFailedTestSuites"] == 0
+    return merged
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="List the test classes affected by changed sources")
+    parser.add_argument("service", help="Maven service directory")
+    parser.add_argument("--since", default="HEAD", help="git ref to diff against (default: HEAD)")
+    parser.add_argument("--files", nargs="+", type=Path, help="changed files instead of git diff")
+    args = parser.parse_args(argv)
+
+    index = JavaDependencyIndex(args.service)
+    rescanned = index.update()
+    print(f"[*] Index {index.index_path}: {len(index.files)} classes, {rescanned} re-scanned")
+    selected = select_java_tests(args.service, args.since, args.files)
+    if selected is None:
+        print("[*] Full suite")
+    elif not selected:
+        print("[*] No test classes affected")
+    else:
+        print(f"[+] {len(selected)} test classes: -Dtest={','.join(selected)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,30 @@
 #!/usr/bin/env python3
 """
 Test Metrics Parser - Extracts test results from JUnit XML and exports to Prometheus
-Parses Maven test reports and pushes metrics to Prometheus Push Gateway
+Parses Maven test reports and writes Prometheus metrics (or pushes them to the
+metrics server with --push); every run is also kept in the test run store (test_run_store.py)
 """
 
 import os
 import sys
 import json
 import glob
-import xml.etree.ElementTree as ET
 from pathlib import Path
 from datetime import datetime
-import requests
+import argparse
 from typing import Dict, List, Tuple
 
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from metric_registry import MetricRegistry
+from metrics_push import push_registry
+from junit_ingest import ingest
+from test_run_store import record_suites
+
 class TestMetricsParser:
     def __init__(self, backend_path: str):
         self.backend_path = Path(backend_path)
         self.metrics = {}
+        self.suites = []
         self.services = [
             'user_service',
             'product_service',
@@ -32,28 +39,15 @@ class TestMetricsParser:
         pattern = self.backend_path / service / "target" / "surefire-reports" / "TEST-*.xml"
         return list(glob.glob(str(pattern)))
     
-    def parse_test_file(self, file_path: str) -> Tuple[int, int, int, float]:
+    @staticmethod
+    def suite_counts(suite: Dict) -> Tuple[int, int, int, float]:
         """
-        Parse JUnit XML test report
+        Counts of one parsed report (junit_ingest.py)
         Returns: (total_tests, passed_tests, failed_tests, execution_time)
         """
-        try:
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-            
-            # Extract metrics from testsuite element
-            tests = int(root.get('tests', 0))
-            failures = int(root.get('failures', 0))
-            errors = int(root.get('errors', 0))
-            time = float(root.get('time', 0))
-            
-            # Passed = total - failures - errors
-            passed = tests - failures - errors
-            
-            return tests, passed, failures + errors, time
-        except Exception as e:
-            print(f"Error parsing {file_path}: {e}")
-            return 0, 0, 0, 0
+        # Passed = total - failures - errors
+        failed = suite['failures'] + suite['errors']
+        return suite['tests'], suite['tests'] - failed, failed, suite['time']
     
     def collect_metrics(self) -> Dict:
         """Collect test metrics from all services"""
@@ -61,24 +55,33 @@ class TestMetricsParser:
             'timestamp': datetime.now().isoformat(),
             'services': {}
         }
+        self.suites = []
         
         total_tests = 0
         total_passed = 0
         total_failed = 0
+        total_flaky = 0
         total_time = 0
         
+        # One ingest for every service, so new reports are parsed by a single process pool
+        by_service = {}
+        for suite in ingest(path for service in self.services for path in self.find_test_reports(service)):
+            by_service.setdefault(suite['service'], []).append(suite)
+        
         for service in self.services:
             service_key = service.replace('-', '_')
-            test_files = self.find_test_reports(service)
+            suites = [dict(suite, service=service_key) for suite in by_service.get(service, [])]
+            self.suites.extend(suites)
             
             service_tests = 0
             service_passed = 0
             service_failed = 0
             service_time = 0
             test_class_count = 0
+            service_flaky = sum(1 for suite in suites for case in suite['testcases'] if case['status'] == 'flaky')
             
-            for test_file in test_files:
-                tests, passed, failed, exec_time = self.parse_test_file(test_file)
+            for suite in suites:
+                tests, passed, failed, exec_time = self.suite_counts(suite)
                 service_tests += tests
                 service_passed += passed
                 service_failed += failed
@@ -92,6 +95,7 @@ class TestMetricsParser:
                 'total_tests': service_tests,
                 'passed_tests': service_passed,
                 'failed_tests': service_failed,
+                'flaky_tests': service_flaky,
                 'execution_time_sec': round(service_time, 2),
                 'pass_rate_percent': round(pass_rate, 2),
                 'test_classes': test_class_count,
@@ -101,6 +105,7 @@ class TestMetricsParser:
             total_tests += service_tests
             total_passed += service_passed
             total_failed += service_failed
+            total_flaky += service_flaky
             total_time += service_time
         
         # Add summary
@@ -109,6 +114,7 @@ class TestMetricsParser:
             'total_tests': total_tests,
             'total_passed': total_passed,
             'total_failed': total_failed,
+            'total_flaky': total_flaky,
             'total_time_sec': round(total_time, 2),
             'pass_rate_percent': round(overall_pass_rate, 2),
             'services_count': len(self.services),
@@ -117,45 +123,35 @@ class TestMetricsParser:
         
         return all_metrics
     
-    def export_prometheus_format(self, metrics: Dict) -> str:
-        """Export metrics in Prometheus text format"""
-        lines = []
-        timestamp = int(datetime.now().timestamp() * 1000)
-        
-        # Summary metrics
+    def fill_registry(self, metrics: Dict, registry: MetricRegistry, include_summary: bool = True) -> MetricRegistry:
+        """Upsert summary and per-service series into a metric registry"""
         summary = metrics['summary']
-        lines.append(f"# HELP test_count_total Total number of tests")
-        lines.append(f"# TYPE test_count_total counter")
-        lines.append(f"test_count_total {summary['total_tests']} {timestamp}")
-        
-        lines.append(f"# HELP test_pass_count Total number of passed tests")
-        lines.append(f"# TYPE test_pass_count counter")
-        lines.append(f"test_pass_count {summary['total_passed']} {timestamp}")
-        
-        lines.append(f"# HELP test_fail_count Total number of failed tests")
-        lines.append(f"# TYPE test_fail_count counter")
-        lines.append(f"test_fail_count {summary['total_failed']} {timestamp}")
-        
-        lines.append(f"# HELP test_pass_rate_percent Overall test pass rate")
-        lines.append(f"# TYPE test_pass_rate_percent gauge")
-        lines.append(f"test_pass_rate_percent {summary['pass_rate_percent']} {timestamp}")
-        
-        lines.append(f"# HELP test_execution_time_seconds Total test execution time")
-        lines.append(f"# TYPE test_execution_time_seconds gauge")
-        lines.append(f"test_execution_time_seconds {summary['total_time_sec']} {timestamp}")
+        if include_summary:
+            registry.counter('test_count_total', 'Total number of tests').set(summary['total_tests'])
+            registry.counter('test_pass_count', 'Total number of passed tests').set(summary['total_passed'])
+            registry.counter('test_fail_count', 'Total number of failed tests').set(summary['total_failed'])
+            registry.gauge('test_flaky_count', 'Total number of flaky tests').set(summary['total_flaky'])
+            registry.gauge('test_pass_rate_percent', 'Overall test pass rate').set(summary['pass_rate_percent'])
+            registry.gauge('test_execution_time_seconds', 'Total test execution time').set(summary['total_time_sec'])
         
         # Per-service metrics
-        lines.append(f"# HELP test_count_by_service Test count by service")
-        lines.append(f"# TYPE test_count_by_service gauge")
-        
-        for service, data in metrics['services'].items():
-            lines.append(f'test_count_by_service{{service="{service}"}} {data["total_tests"]} {timestamp}')
-            lines.append(f'test_pass_count_by_service{{service="{service}"}} {data["passed_tests"]} {timestamp}')
-            lines.append(f'test_fail_count_by_service{{service="{service}"}} {data["failed_tests"]} {timestamp}')
-            lines.append(f'test_pass_rate_by_service{{service="{service}"}} {data["pass_rate_percent"]} {timestamp}')
-            lines.append(f'test_execution_time_by_service{{service="{service}"}} {data["execution_time_sec"]} {timestamp}')
-        
-        return '\n'.join(lines)
+        by_service = [
+            ('test_count_by_service', 'Test count by service', 'total_tests'),
+            ('test_pass_count_by_service', 'Passed tests by service', 'passed_tests'),
+            ('test_fail_count_by_service', 'Failed tests by service', 'failed_tests'),
+            ('test_pass_rate_by_service', 'Pass rate by service', 'pass_rate_percent'),
+            ('test_execution_time_by_service', 'Execution time by service', 'execution_time_sec'),
+            ('test_flaky_count_by_service', 'Flaky tests (passed on rerun) by service', 'flaky_tests'),
+        ]
+        for name, help_text, key in by_service:
+            family = registry.gauge(name, help_text)
+            for service, data in metrics['services'].items():
+                family.set(data[key], service=service)
+        return registry
+    
+    def export_prometheus_format(self, metrics: Dict) -> str:
+        """Export metrics in Prometheus text format"""
+        return self.fill_registry(metrics, MetricRegistry()).render()
     
     def save_metrics_json(self, metrics: Dict, output_file: str):
         """Save metrics to JSON file"""
@@ -164,17 +160,32 @@ class TestMetricsParser:
             json.dump(metrics, f, indent=2)
         print(f"[+] Metrics saved to {output_file}")
     
-    def push_to_prometheus(self, prometheus_url: str, prometheus_port: int, job_name: str):
-        """Push metrics to Prometheus Push Gateway"""
-        push_gateway_url = f"http://{prometheus_url}:{prometheus_port}/metrics/job/{job_name}"
+    def push_to_prometheus(self, metrics: Dict, job_name: str = "unit-tests", push_url: str = None) -> bool:
+        """Push one group per service plus the summary families in a group of their own (job only)"""
+        pushed = True
+        for service in metrics['services']:
+            service_metrics = {'summary': metrics['summary'], 'services': {service: metrics['services'][service]}}
+            registry = self.fill_registry(service_metrics, MetricRegistry(), include_summary=False)
+            pushed = push_registry(registry, job_name, {'service': service}, push_url) and pushed
+        summary = self.fill_registry({'summary': metrics['summary'], 'services': {}}, MetricRegistry())
+        return push_registry(summary, job_name, None, push_url) and pushed
+    
+    def export(self, metrics: Dict, push: bool = False, source: str = "test_metrics_parser", job_name: str = "unit-tests"):
+        """Write test_metrics.json, record the run in the history store, push and write test_metrics.txt"""
+        metrics_dir = self.backend_path.parent / "monitoring" / "metrics"
+        self.save_metrics_json(metrics, str(metrics_dir / "test_metrics.json"))
+        record_suites(self.suites, source, metrics_dir)
         
-        try:
-            # For this example, we'll save to a file instead
-            # In production, you would use: requests.post(push_gateway_url, data=prometheus_data)
-            print(f"[*] Prometheus Push Gateway URL: {push_gateway_url}")
-            print("   (Metrics saved to file for visualization)")
-        except Exception as e:
-            print(f"[!] Warning: Could not push to Prometheus: {e}")
+        # Push to the metrics server, and export to the Prometheus metrics file either way
+        registry = self.fill_registry(metrics, MetricRegistry())
+        if push and self.push_to_prometheus(metrics, job_name):
+            # The file then holds the very series that were pushed (same job label), so the
+            # server serves each once instead of a stale file copy next to the pushed one
+            pushed, registry = registry, MetricRegistry()
+            registry.merge(pushed, {'job': job_name})
+        prometheus_output = metrics_dir / "test_metrics.txt"
+        registry.write_file(prometheus_output)
+        print(f"[+] Prometheus metrics saved to {prometheus_output}")
     
     def print_summary(self, metrics: Dict):
         """Print summary to console"""
@@ -185,6 +196,8 @@ class TestMetricsParser:
         print(f"Total Tests: {summary['total_tests']}")
         print(f"Passed: {summary['total_passed']} [OK]")
         print(f"Failed: {summary['total_failed']} [FAIL]")
+        if summary['total_flaky']:
+            print(f"Flaky: {summary['total_flaky']} (passed on rerun)")
         print(f"Pass Rate: {summary['pass_rate_percent']}%")
         print(f"Total Time: {summary['total_time_sec']}s")
         print(f"Status: {summary['status']}")
@@ -201,35 +214,25 @@ class TestMetricsParser:
         print("-"*60 + "\n")
 
 def main():
-    # Get backend path from command line or use default
-    backend_path = sys.argv[1] if len(sys.argv) > 1 else "D:\\cnpm\\CNPM-3\\DoAnCNPM_Backend"
+    arg_parser = argparse.ArgumentParser(description="Export Maven surefire results as Prometheus metrics")
+    arg_parser.add_argument("backend_path", nargs="?", default="D:\\cnpm\\CNPM-3\\DoAnCNPM_Backend")
+    arg_parser.add_argument("--push", action="store_true",
+                            help="push to the metrics server ($METRICS_PUSH_URL) instead of writing test_metrics.txt")
+    args = arg_parser.parse_args()
+    backend_path = args.backend_path
     
     print(f"[*] Parsing test reports from: {backend_path}")
     print("="*60)
     
     parser = TestMetricsParser(backend_path)
     
-    # Collect metrics
+    # Collect metrics, then save them (JSON, run history, Prometheus file or push)
     metrics = parser.collect_metrics()
-    
-    # Save metrics to JSON
-    json_output = os.path.join(os.path.dirname(backend_path), "monitoring", "metrics", "test_metrics.json")
-    parser.save_metrics_json(metrics, json_output)
-    
-    # Export to Prometheus format
-    prometheus_output = os.path.join(os.path.dirname(backend_path), "monitoring", "metrics", "test_metrics.txt")
-    prometheus_data = parser.export_prometheus_format(metrics)
-    os.makedirs(os.path.dirname(prometheus_output), exist_ok=True)
-    with open(prometheus_output, 'w') as f:
-        f.write(prometheus_data)
-    print(f"[+] Prometheus metrics saved to {prometheus_output}")
+    parser.export(metrics, push=args.push)
     
     # Print summary
     parser.print_summary(metrics)
     
-    # Optionally push to Prometheus (commented out for file-based setup)
-    # parser.push_to_prometheus("localhost", 9091, "test-metrics")
-    
     return 0 if metrics['summary']['total_failed'] == 0 else 1
 
 if __name__ == "__main__":
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Test Result Cache - Skip `mvn test` for services whose inputs have not changed
+The cache key is a SHA-256 over a service's src/, pom.xml, Maven wrapper (mvnw, mvnw.cmd,
+.mvn/), the test command and the environment that changes test behaviour (SPRING_*,
+JAVA_HOME). A passing run stores its surefire XML under the key; the next run with the same
+key restores the XML into target/surefire-reports instead of invoking Maven, and the usual
+parsing/metrics path runs on it. Only passing runs are cached, so failures are always re-run.
+
+File digests are memoized by (mtime, size), so computing a key for an unchanged service
+reads no file contents. Entries are evicted by age and then least-recently-used until the
+cache fits its size budget.
+
+Cache directory: .test-cache/ at the repo root, or TEST_RESULT_CACHE_DIR (empty disables).
+Limits: TEST_CACHE_MAX_MB (default 512), TEST_CACHE_MAX_AGE_DAYS (default 14).
+
+Usage: python test_result_cache.py stats | evict | clear
+       python test_result_cache.py key DoAnCNPM_Backend/order_service
+       python test_result_cache.py run DoAnCNPM_Backend/order_service -- mvn clean test     (CI wrapper)
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+CACHE_VERSION = "1"
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent / ".test-cache"
+INPUT_FILES = ("pom.xml", "mvnw", "mvnw.cmd")
+INPUT_DIRS = ("src", ".mvn")
+ENV_PREFIXES = ("SPRING_", "JAVA_HOME")
+REPORTS_DIR = Path("target") / "surefire-reports"
+HIT_MARKER = "[cache] HIT"
+MISS_MARKER = "[cache] MISS"
+
+
+class TestResultCache:
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes: Optional[int] = None, max_age_days: Optional[float] = None):
+        self.root = Path(root)
+        self.max_bytes = max_bytes if max_bytes is not None else \
+            int(float(os.environ.get("TEST_CACHE_MAX_MB", "512")) * 1024 * 1024)
+        self.max_age = (max_age_days if max_age_days is not None else
+                        float(os.environ.get("TEST_CACHE_MAX_AGE_DAYS", "14"))) * 86400
+        self._index_path = self.root / "file_index.json"
+        self._index: Optional[Dict[str, List]] = None
+        self._index_dirty = False
+
+    # ----- keys -----
+
+    def input_files(self, service_path: Path) -> List[Path]:
+        files = [service_path / name for name in INPUT_FILES if (service_path / name).is_file()]
+        for directory in INPUT_DIRS:
+            base = service_path / directory
+            if base.is_dir():
+                files.extend(path for path in base.rglob("*") if path.is_file())
+        return sorted(files)
+
+    def fingerprint(self, service_path, command: str = "mvn test") -> str:
+        """Content hash of everything that decides a service's test results"""
+        service_path = Path(service_path).resolve()
+        digest = hashlib.sha256()
+        digest.update(f"v{CACHE_VERSION}\0{command}\0".encode())
+        for key in sorted(os.environ):
+            if key.startswith(ENV_PREFIXES):
+                digest.update(f"{key}={os.environ[key]}\0".encode())
+        for path in self.input_files(service_path):
+            digest.update(path.relative_to(service_path).as_posix().encode() + b"\0")
+            digest.update(self._file_digest(path).encode() + b"\n")
+        self._save_index()
+        return digest.hexdigest()
+
+    def _file_digest(self, path: Path) -> str:
+        if self._index is None:
+            try:
+                self._index = json.loads(self._index_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                self._index = {}
+        stat = path.stat()
+        cached = self._index.get(str(path))
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+        file_hash = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                file_hash.update(block)
+        self._index[str(path)] = [stat.st_mtime_ns, stat.st_size, file_hash.hexdigest()]
+        self._index_dirty = True
+        return file_hash.hexdigest()
+
+    def _save_index(self):
+        # Only a memo: concurrent runners may overwrite each other's additions
+        if not self._index_dirty:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        fd, temp_name = tempfile.mkstemp(prefix="file_index.", suffix=".tmp", dir=self.root)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(temp_name, self._index_path)
+        self._index_dirty = False
+
+    # ----- entries -----
+
+    def entry_dir(self, service: str, key: str) -> Path:
+        return self.root / service / key
+
+    def restore(self, service_path, key: str) -> Optional[Dict]:
+        """Copy the cached surefire reports into target/; returns the entry or None on a miss"""
+        service_path = Path(service_path).resolve()
+        entry_dir = self.entry_dir(service_path.name, key)
+        entry = _read_entry(entry_dir)
+        if entry is None:
+            return None
+        reports = service_path / REPORTS_DIR
+        if reports.exists():
+            shutil.rmtree(reports)
+        reports.mkdir(parents=True)
+        for name in entry["files"]:
+            shutil.copy2(entry_dir / name, reports / name)
+        entry["last_used"] = time.time()
+        entry["hits"] = entry.get("hits", 0) + 1
+        _write_entry(entry_dir, entry)
+        return entry
+
+    def store(self, service_path, key: str, duration_sec: float) -> Optional[Dict]:
+        """Save target/surefire-reports of a passing run under `key`"""
+        service_path = Path(service_path).resolve()
+        reports = service_path / REPORTS_DIR
+        files = sorted(path for path in reports.glob("*") if path.is_file()) if reports.is_dir() else []
+        if not any(path.name.startswith("TEST-") for path in files):
+            return None
+        service_dir = self.root / service_path.name
+        service_dir.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=key[:12] + ".", dir=service_dir))
+        for path in files:
+            shutil.copy2(path, staging / path.name)
+        now = time.time()
+        entry = {
+            "service": service_path.name,
+            "key": key,
+            "created": now,
+            "last_used": now,
+            "duration_sec": round(duration_sec, 2),
+            "files": [path.name for path in files],
+            "bytes": sum(path.stat().st_size for path in files),
+            "hits": 0,
+        }
+        _write_entry(staging, entry)
+        target = self.entry_dir(service_path.name, key)
+        if target.exists():
+            shutil.rmtree(target, ignore_errors=True)
+        try:
+            os.replace(staging, target)
+        except OSError:
+            # Another runner stored the same key first
+            shutil.rmtree(staging, ignore_errors=True)
+        return entry
+
+    def entries(self) -> List[Tuple[Path, Dict]]:
+        found = []
+        if not self.root.is_dir():
+            return found
+        for service_dir in self.root.iterdir():
+            if not service_dir.is_dir():
+                continue
+            for entry_dir in service_dir.iterdir():
+                entry = _read_entry(entry_dir)
+                if entry is not None:
+                    found.append((entry_dir, entry))
+        return found
+
+    def evict(self) -> Tuple[int, int]:
+        """Drop entries older than max_age, then least recently used ones over max_bytes"""
+        now = time.time()
+        entries = sorted(self.entries(), key=lambda item: item[1]["last_used"])
+        total = sum(entry["bytes"] for _, entry in entries)
+        removed = freed = 0
+        for entry_dir, entry in entries:
+            if now - entry["last_used"] <= self.max_age and total <= self.max_bytes:
+                continue
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            total -= entry["bytes"]
+            removed += 1
+            freed += entry["bytes"]
+        return removed, freed
+
+    def clear(self):
+        if self.root.exists():
+            shutil.rmtree(self.root)
+
+
+def _read_entry(entry_dir: Path) -> Optional[Dict]:
+    try:
+        return json.loads((entry_dir / "entry.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _write_entry(entry_dir: Path, entry: Dict):
+    temp_path = entry_dir / "entry.json.tmp"
+    temp_path.write_text(json.dumps(entry, indent=2), encoding="utf-8")
+    os.replace(temp_path, entry_dir / "entry.json")
+
+
+def open_cache() -> Optional[TestResultCache]:
+    """The shared cache, or None when TEST_RESULT_CACHE_DIR is set to an empty value"""
+    root = os.environ.get("TEST_RESULT_CACHE_DIR")
+    if root is None:
+        return TestResultCache()
+    return TestResultCache(root) if root else None
+
+
+def run_cached(service_path, command: List[str], cache: Optional[TestResultCache] = None) -> int:
+    """Run `command` in `service_path` unless a cached passing result exists for its inputs"""
+    cache = cache or TestResultCache()
+    service_path = Path(service_path).resolve()
+    key = cache.fingerprint(service_path, " ".join(command))
+    entry = cache.restore(service_path, key)
+    if entry is not None:
+        print(f"{HIT_MARKER} {service_path.name} ({key[:12]}): reused {len(entry['files'])} report files, "
+              f"saved ~{entry['duration_sec']:.0f}s")
+        return 0
+    print(f"{MISS_MARKER} {service_path.name} ({key[:12]}): running {' '.join(command)}")
+    started = time.perf_counter()
+    try:
+        returncode = subprocess.call(command, cwd=str(service_path))
+    except OSError as e:
+        print(f"[!] Could not run {command[0]}: {e}")
+        return 127
+    if returncode == 0 and cache.store(service_path, key, time.perf_counter() - started):
+        cache.evict()
+    return returncode
+
+
+def main(argv=None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    command = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, command = argv[:split], argv[split + 1:]
+
+    parser = argparse.ArgumentParser(description="Content-hash cache for per-service Maven test results")
+    parser.add_argument("action", choices=("stats", "evict", "clear", "key", "run"))
+    parser.add_argument("service", nargs="?", help="service directory (key, run)")
+    parser.add_argument("--dir", help=f"cache directory (default: $TEST_RESULT_CACHE_DIR or {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--max-mb", type=float, help="size budget for evict (default: $TEST_CACHE_MAX_MB or 512)")
+    parser.add_argument("--max-age-days", type=float, help="age limit for evict (default: 14)")
+    args = parser.parse_args(argv)
+
+    cache = TestResultCache(args.dir or os.environ.get("TEST_RESULT_CACHE_DIR") or DEFAULT_CACHE_DIR,
+                            int(args.max_mb * 1024 * 1024) if args.max_mb is not None else None,
+                            args.max_age_days)
+    if args.action in ("key", "run") and not args.service:
+        parser.error(f"{args.action} needs a service directory")
+
+    if args.action == "stats":
+        entries = cache.entries()
+        for entry_dir, entry in sorted(entries, key=lambda item: (item[1]["service"], -item[1]["last_used"])):
+            print(f"{entry['service']:<20} {entry['key'][:12]}  {entry['bytes'] / 1024:8.1f} KB  "
+                  f"{entry['hits']:>4} hits  saves ~{entry['duration_sec']:.0f}s  "
+                  f"last used {time.ctime(entry['last_used'])}")
+        total = sum(entry["bytes"] for _, entry in entries)
+        print(f"[*] {len(entries)} entries, {total / (1024 * 1024):.1f} MB in {cache.root}")
+    elif args.action == "evict":
+        removed, freed = cache.evict()
+        print(f"[+] Evicted {removed} entries ({freed / (1024 * 1024):.1f} MB)")
+    elif args.action == "clear":
+        cache.clear()
+        print(f"[+] Cleared {cache.root}")
+    elif args.action == "key":
+        started = time.perf_counter()
+        key = cache.fingerprint(args.service, " ".join(command) if command else "mvn test")
+        print(f"{key}  ({len(cache.input_files(Path(args.service).resolve()))} files, "
+              f"{(time.perf_counter() - started) * 1000:.0f} ms)")
+    else:
+        if not command:
+            parser.error("run needs a command after --")
+        return run_cached(args.service, command, cache)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+Test Run Store - SQLite history of unit test runs (runs / suites / testcases)
+Every runner writes one run row plus one row per JUnit suite and test case, in a single
+transaction, so history no longer depends on Prometheus retention. Service, suite and
+test case rows carry the run timestamp; (service, timestamp) and (testcase, timestamp)
+indexes keep trend and "slowest tests" queries in milliseconds after thousands of runs.
+
+The database is monitoring/metrics/test_runs.db unless TEST_RUN_DB is set (empty disables).
+
+Usage: python test_run_store.py runs [--service order_service]
+       python test_run_store.py slowest [--runs 50] [--service order_service] [--limit 20]
+       python test_run_store.py trend order_service [--limit 30]
+       python test_run_store.py history <testcase> [--classname <class>]
+       python test_run_store.py --benchmark 2000                      (synthetic runs + query timings)
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_DB = Path(__file__).resolve().parent.parent / "monitoring" / "metrics" / "test_runs.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id           INTEGER PRIMARY KEY,
+    timestamp    REAL NOT NULL,
+    source       TEXT NOT NULL,
+    service      TEXT,
+    total_tests  INTEGER NOT NULL,
+    passed_tests INTEGER NOT NULL,
+    failed_tests INTEGER NOT NULL,
+    skipped      INTEGER NOT NULL,
+    duration_sec REAL NOT NULL,
+    status       TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS suites (
+    id           INTEGER PRIMARY KEY,
+    run_id       INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    timestamp    REAL NOT NULL,
+    service      TEXT NOT NULL,
+    suite        TEXT NOT NULL,
+    tests        INTEGER NOT NULL,
+    failures     INTEGER NOT NULL,
+    errors       INTEGER NOT NULL,
+    skipped      INTEGER NOT NULL,
+    duration_sec REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS testcases (
+    id           INTEGER PRIMARY KEY,
+    run_id       INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    suite_id     INTEGER NOT NULL REFERENCES suites(id) ON DELETE CASCADE,
+    timestamp    REAL NOT NULL,
+    service      TEXT NOT NULL,
+    classname    TEXT NOT NULL,
+    testcase     TEXT NOT NULL,
+    duration_sec REAL NOT NULL,
+    status       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_service_timestamp ON runs(service, timestamp);
+CREATE INDEX IF NOT EXISTS suites_service_timestamp ON suites(service, timestamp);
+CREATE INDEX IF NOT EXISTS suites_run ON suites(run_id);
+CREATE INDEX IF NOT EXISTS testcases_service_timestamp ON testcases(service, timestamp);
+CREATE INDEX IF NOT EXISTS testcases_testcase_timestamp ON testcases(testcase, timestamp);
+CREATE INDEX IF NOT EXISTS testcases_run ON testcases(run_id);
+"""
+
+
+def service_key(service: str) -> str:
+    """One spelling per service (runners disagree on restaurant-service vs restaurant_service)"""
+    return service.replace('-', '_')
+
+
+class TestRunStore:
+    def __init__(self, path=DEFAULT_DB):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.path))
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def record_run(self, suites: Iterable[Dict], source: str, service: Optional[str] = None,
+                   timestamp: Optional[float] = None) -> int:
+        """
+        Insert one run with all of its suites and test cases in one transaction.
+        `service` is set for single-service runs; multi-service runs leave it empty.
+        """
+        suites = list(suites)
+        timestamp = time.time() if timestamp is None else timestamp
+        total = sum(suite["tests"] for suite in suites)
+        failed = sum(suite["failures"] + suite["errors"] for suite in suites)
+        skipped = sum(suite["skipped"] for suite in suites)
+        duration = sum(suite["time"] for suite in suites)
+
+        with self.db:
+            cursor = self.db.execute(
+                "INSERT INTO runs (timestamp, source, service, total_tests, passed_tests, failed_tests, skipped,"
+                " duration_sec, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (timestamp, source, service_key(service) if service else None, total, total - failed - skipped,
+                 failed, skipped, duration, "PASS" if failed == 0 else "FAIL"))
+            run_id = cursor.lastrowid
+
+            # Suite ids are assigned in insertion order, so test cases can reference them
+            # without a round trip per suite
+            first_suite_id = (self.db.execute("SELECT COALESCE(MAX(id), 0) FROM suites").fetchone()[0]) + 1
+            self.db.executemany(
+                "INSERT INTO suites (id, run_id, timestamp, service, suite, tests, failures, errors, skipped,"
+                " duration_sec) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(first_suite_id + i, run_id, timestamp, service_key(suite["service"]), suite["name"],
+                  suite["tests"], suite["failures"], suite["errors"], suite["skipped"], suite["time"])
+                 for i, suite in enumerate(suites)])
+            self.db.executemany(
+                "INSERT INTO testcases (run_id, suite_id, timestamp, service, classname, testcase, duration_sec,"
+                " status) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(run_id, first_suite_id + i, timestamp, service_key(suite["service"]), case["classname"],
+                  case["name"], case["time"], case["status"])
+                 for i, suite in enumerate(suites) for case in suite["testcases"]])
+        return run_id
+
+    def recent_runs(self, service: Optional[str] = None, limit: int = 20) -> List[sqlite3.Row]:
+        if service:
+            return self._query(
+                "SELECT r.id, r.timestamp, r.source, s.service, SUM(s.tests) AS total_tests,"
+                " SUM(s.failures + s.errors) AS failed_tests, SUM(s.duration_sec) AS duration_sec"
+                " FROM suites s JOIN runs r ON r.id = s.run_id"
+                " WHERE s.service = ? AND s.timestamp >= ? GROUP BY r.id ORDER BY r.timestamp DESC",
+                (service_key(service), self._cutoff(limit, service) or 0))
+        return self._query(
+            "SELECT id, timestamp, source, service, total_tests, failed_tests, duration_sec FROM runs"
+            " ORDER BY timestamp DESC LIMIT ?", (limit,))
+
+    def slowest_tests(self, runs: int = 50, service: Optional[str] = None, limit: int = 20) -> List[sqlite3.Row]:
+        """Slowest test cases (by average duration) over the last `runs` runs"""
+        cutoff = self._cutoff(runs, service)
+        if cutoff is None:
+            return []
+        # Range scans: (service, timestamp) for one service, the run_id index otherwise (the
+        # planner would rather walk the whole service index to avoid sorting the groups)
+        if service:
+            source, where, params = "testcases", "service = ? AND timestamp >= ?", [service_key(service), cutoff]
+        else:
+            source, where, params = "testcases INDEXED BY testcases_run", "run_id >= ?", [cutoff]
+        return self._query(
+            "SELECT service, classname, testcase, COUNT(*) AS samples, AVG(duration_sec) AS avg_sec,"
+            " MAX(duration_sec) AS max_sec, SUM(status IN ('failed', 'error')) AS failures"
+            f" FROM {source} WHERE {where}"
+            " GROUP BY service, classname, testcase ORDER BY avg_sec DESC LIMIT ?", params + [limit])
+
+    def service_trend(self, service: str, limit: int = 30) -> List[sqlite3.Row]:
+        """Per-run totals for one service, newest first"""
+        cutoff = self._cutoff(limit, service)
+        if cutoff is None:
+            return []
+        return self._query(
+            "SELECT run_id, timestamp, SUM(tests) AS tests, SUM(failures + errors) AS failed,"
+            " SUM(duration_sec) AS duration_sec FROM suites WHERE service = ? AND timestamp >= ?"
+            " GROUP BY run_id ORDER BY timestamp DESC", (service_key(service), cutoff))
+
+    def testcase_history(self, testcase: str, classname: Optional[str] = None, limit: int = 30) -> List[sqlite3.Row]:
+        sql = ("SELECT run_id, timestamp, service, classname, testcase, duration_sec, status FROM testcases"
+               " WHERE testcase = ?")
+        params: List = [testcase]
+        if classname:
+            sql += " AND classname = ?"
+            params.append(classname)
+        return self._query(sql + " ORDER BY timestamp DESC LIMIT ?", params + [limit])
+
+    def suite_durations(self, runs: int = 10) -> Dict[tuple, float]:
+        """Median duration of each (service, suite) over its last `runs` recorded runs"""
+        samples: Dict[tuple, List[float]] = {}
+        for service, in self.db.execute("SELECT DISTINCT service FROM suites").fetchall():
+            cutoff = self._cutoff(runs, service)
+            for suite, duration in self.db.execute(
+                    "SELECT suite, duration_sec FROM suites WHERE service = ? AND timestamp >= ?", (service, cutoff)):
+                samples.setdefault((service, suite), []).append(duration)
+        return {key: sorted(values)[len(values) // 2] for key, values in samples.items()}
+
+    def testcase_baselines(self, runs: int = 20) -> Dict[tuple, float]:
+        """
+        Median duration of each (service, classname, testcase) over the `runs` runs of its
+        service before the newest one (the newest is the run being compared)
+        """
+        samples: Dict[tuple, List[float]] = {}
+        for service, in self.db.execute("SELECT DISTINCT service FROM suites").fetchall():
+            timestamps = [row[0] for row in self.db.execute(
+                "SELECT DISTINCT timestamp FROM suites WHERE service = ? ORDER BY timestamp DESC LIMIT ?",
+                (service, runs + 1))]
+            if len(timestamps) < 2:
+                continue
+            for classname, testcase, duration in self.db.execute(
+                    "SELECT classname, testcase, duration_sec FROM testcases"
+                    " WHERE service = ? AND timestamp >= ? AND timestamp < ? AND status != 'skipped'",
+                    (service, timestamps[-1], timestamps[0])):
+                samples.setdefault((service, classname, testcase), []).append(duration)
+        return {key: sorted(values)[len(values) // 2] for key, values in samples.items()}
+
+    def flaky_scores(self, runs: int = 20) -> List[Dict]:
+        """
+        Rolling flakiness of every test case over the last `runs` runs of its service:
+        (runs where it was flaky + pass/fail flips between consecutive runs) / runs, worst first
+        """
+        scores = []
+        for service, in self.db.execute("SELECT DISTINCT service FROM suites").fetchall():
+            statuses: Dict[tuple, List[str]] = {}
+            for classname, testcase, status in self.db.execute(
+                    "SELECT classname, testcase, status FROM testcases WHERE service = ? AND timestamp >= ?"
+                    " AND status != 'skipped' ORDER BY timestamp", (service, self._cutoff(runs, service))):
+                statuses.setdefault((classname, testcase), []).append(status)
+            for (classname, testcase), history in statuses.items():
+                outcomes = ["failed" if status == "error" else status for status in history if status != "flaky"]
+                flaky = len(history) - len(outcomes)
+                flips = sum(1 for before, after in zip(outcomes, outcomes[1:]) if before != after)
+                scores.append({"service": service, "classname": classname, "testcase": testcase, "runs": len(history),
+                               "flaky": flaky, "flips": flips, "score": min((flaky + flips) / len(history), 1.0)})
+        return sorted(scores, key=lambda score: (-score["score"], -score["runs"], score["testcase"]))
+
+    def _cutoff(self, runs: int, service: Optional[str]):
+        """Timestamp of the `runs`-th newest run of a service, or the id of the `runs`-th newest run"""
+        if service:
+            row = self.db.execute("SELECT MIN(timestamp) FROM (SELECT DISTINCT timestamp FROM suites"
+                                  " WHERE service = ? ORDER BY timestamp DESC LIMIT ?)",
+                                  (service_key(service), runs)).fetchone()
+        else:
+            row = self.db.execute("SELECT MIN(id) FROM (SELECT id FROM runs ORDER BY id DESC LIMIT ?)",
+                                  (runs,)).fetchone()
+        return row[0]
+
+    def _query(self, sql: str, params) -> List[sqlite3.Row]:
+        self.db.row_factory = sqlite3.Row
+        try:
+            return self.db.execute(sql, params).fetchall()
+        finally:
+            self.db.row_factory = None
+
+
+def open_store(metrics_dir=None) -> Optional[TestRunStore]:
+    """The run store next to the metrics files, or $TEST_RUN_DB; None when disabled or unavailable"""
+    path = os.environ.get("TEST_RUN_DB")
+    if path is None:
+        path = Path(metrics_dir) / "test_runs.db" if metrics_dir else DEFAULT_DB
+    if not path:
+        return None
+    try:
+        return TestRunStore(path)
+    except sqlite3.Error as e:
+        print(f"[!] Test run store unavailable ({path}): {e}")
+        return None
+
+
+def record_suites(suites: List[Dict], source: str, metrics_dir=None, service: Optional[str] = None):
+    """Best-effort history write used by the runners; never fails the run"""
+    store = open_store(metrics_dir)
+    if store is None:
+        return
+    try:
+        run_id = store.record_run(suites, source, service)
+        cases = sum(len(suite["testcases"]) for suite in suites)
+        print(f"[+] Run #{run_id} stored in {store.path} ({len(suites)} suites, {cases} test cases)")
+    except sqlite3.Error as e:
+        print(f"[!] Could not store run in {store.path}: {e}")
+    finally:
+        store.close()
+
+
+def _when(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def benchmark(runs: int, workdir: Optional[str] = None):
+    """Fill a scratch database with synthetic runs and time the CLI queries"""
+    services = ["user_service", "product_service", "drone_service", "order_service", "payment_service",
+                "restaurant_service"]
+    with tempfile.TemporaryDirectory(prefix="run-store-bench-", dir=workdir) as tmp:
+        store = TestRunStore(Path(tmp) / "test_runs.db")
+        started = time.perf_counter()
+        base = time.time() - runs * 3600
+        for run in range(runs):
+            suites = []
+            for service in services:
+                for s in range(8):
+                    cases = [{"classname": f"com.foodfast.{service}.Suite{s}Test", "name": f"test{c}",
+                              "time": ((run + s * 7 + c * 13) % 97) / 100, "status": "passed"} for c in range(10)]
+                    suites.append({"service": service, "name": f"com.foodfast.{service}.Suite{s}Test", "tests": 10,
+                                   "failures": 0, "errors": 0, "skipped": 0,
+                                   "time": sum(case["time"] for case in cases), "testcases": cases})
+            store.record_run(suites, "benchmark", timestamp=base + run * 3600)
+        write_sec = time.perf_counter() - started
+        cases = store.db.execute("SELECT COUNT(*) FROM testcases").fetchone()[0]
+        print(f"[*] {runs} runs, {cases} test cases written in {write_sec:.2f}s "
+              f"({write_sec / runs * 1000:.1f} ms per run)")
+
+        queries = [
+            ("slowest over last 50 runs", lambda: store.slowest_tests(50)),
+            ("slowest order_service, 50 runs", lambda: store.slowest_tests(50, "order_service")),
+            ("trend order_service (30 runs)", lambda: store.service_trend("order_service")),
+            ("history of one test case", lambda: store.testcase_history("test3")),
+            ("recent runs", lambda: store.recent_runs()),
+            ("recent order_service runs", lambda: store.recent_runs("order_service")),
+        ]
+        for label, query in queries:
+            started = time.perf_counter()
+            query()
+            print(f"[+] {label:<34} {(time.perf_counter() - started) * 1000:8.2f} ms")
+        store.close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Query the unit test run history")
+    parser.add_argument("--db", help=f"database (default: $TEST_RUN_DB or {DEFAULT_DB})")
+    parser.add_argument("--benchmark", type=int, metavar="RUNS", help="time queries on this many synthetic runs")
+    commands = parser.add_subparsers(dest="command")
+    runs_cmd = commands.add_parser("runs", help="recent runs")
+    runs_cmd.add_argument("--service")
+    runs_cmd.add_argument("--limit", type=int, default=20)
+    slowest_cmd = commands.add_parser("slowest", help="slowest test cases over the last N runs")
+    slowest_cmd.add_argument("--runs", type=int, default=50)
+    slowest_cmd.add_argument("--service")
+    slowest_cmd.add_argument("--limit", type=int, default=20)
+    trend_cmd = commands.add_parser("trend", help="per-run totals for a service")
+    trend_cmd.add_argument("service")
+    trend_cmd.add_argument("--limit", type=int, default=30)
+    history_cmd = commands.add_parser("history", help="duration history of one test case")
+    history_cmd.add_argument("testcase")
+    history_cmd.add_argument("--classname")
+    history_cmd.add_argument("--limit", type=int, default=30)
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        benchmark(args.benchmark)
+        return 0
+    if not args.command:
+        parser.error("choose a query: runs, slowest, trend or history")
+
+    path = args.db or os.environ.get("TEST_RUN_DB") or DEFAULT_DB
+    if not Path(path).exists():
+        print(f"[!] No run history at {path}")
+        return 1
+    store = TestRunStore(path)
+    started = time.perf_counter()
+    if args.command == "runs":
+        rows = store.recent_runs(args.service, args.limit)
+        print(f"{'Run':>6}  {'When':<19}  {'Source':<31} {'Service':<20} {'Tests':>6} {'Failed':>6} {'Time s':>8}")
+        for row in rows:
+            print(f"{row['id']:>6}  {_when(row['timestamp']):<19}  {row['source']:<31} {row['service'] or 'all':<20} "
+                  f"{row['total_tests']:>6} {row['failed_tests']:>6} {row['duration_sec']:>8.2f}")
+    elif args.command == "slowest":
+        rows = store.slowest_tests(args.runs, args.service, args.limit)
+        print(f"{'Avg s':>8} {'Max s':>8} {'Runs':>5} {'Fail':>5}  Test")
+        for row in rows:
+            print(f"{row['avg_sec']:>8.3f} {row['max_sec']:>8.3f} {row['samples']:>5} {row['failures']:>5}  "
+                  f"{row['service']}: {row['classname']}.{row['testcase']}")
+    elif args.command == "trend":
+        rows = store.service_trend(args.service, args.limit)
+        print(f"{'Run':>6}  {'When':<19}  {'Tests':>6} {'Failed':>6} {'Time s':>8}")
+        for row in rows:
+            print(f"{row['run_id']:>6}  {_when(row['timestamp']):<19}  {row['tests']:>6} {row['failed']:>6} "
+                  f"{row['duration_sec']:>8.2f}")
+    else:
+        rows = store.testcase_history(args.testcase, args.classname, args.limit)
+        print(f"{'Run':>6}  {'When':<19}  {'Time s':>8}  {'Status':<8} Test")
+        for row in rows:
+            print(f"{row['run_id']:>6}  {_when(row['timestamp']):<19}  {row['duration_sec']:>8.3f}  "
+                  f"{row['status']:<8} {row['service']}: {row['classname']}.{row['testcase']}")
+    print(f"[*] {len(rows)} rows in {(time.perf_counter() - started) * 1000:.1f} ms")
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
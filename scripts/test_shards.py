@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Test Shards - Split the Java and Jest tests into N shards of near-equal expected wall time
+Every test class (Maven services) and test file (DroneDelivery Jest) gets an expected
+duration: the median of its recent runs in the test run store, else its last surefire /
+Jest report, else the median of the known ones. Items are packed with greedy LPT (longest
+first, onto the least loaded shard); a shard that has to start Maven or Jest for a new
+service pays a start-up overhead, so a service is only split when that pays off.
+
+A local run test-compiles every service once, runs all shards in parallel (each shard runs
+`mvn surefire:test -Dtest=...` per service and `jest <files>`), then exports the usual
+metrics from the merged reports: surefire writes one TEST-<class>.xml per class, so the
+shards' reports land side by side in target/surefire-reports, and the Jest shard outputs
+are merged into BackEnd/test-results.json. Each Jest shard is one --runInBand process with
+its own database namespace (TEST_DB_NAMESPACE, see __tests__/setup.js).
+
+In CI, every matrix job runs `--shard i/N` (the plan is deterministic for the same
+history; or pass the same --plan file) and uploads target/surefire-reports plus, with
+--jest, BackEnd/test-results.shard-<i>.json. A final job downloads them all into the same
+places and runs `merge` with the same plan: it merges the Jest shard outputs into
+test-results.json and exports the Java and Jest metrics like a local run.
+
+Usage: python test_shards.py plan DoAnCNPM_Backend --shards 4 [--jest DroneDelivery-main/BackEnd] [--output plan.json]
+       python test_shards.py run DoAnCNPM_Backend --shards 4 [--jest DroneDelivery-main/BackEnd]
+       python test_shards.py run DoAnCNPM_Backend --shard 2/4 [--plan plan.json]
+       python test_shards.py merge DoAnCNPM_Backend --shards 4 [--jest DroneDelivery-main/BackEnd] [--plan plan.json]
+"""
+
+import os
+import sys
+import json
+import glob
+import argparse
+import threading
+import subprocess
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from junit_ingest import ingest
+from jest_ingest import coverage_summary, ingest as ingest_jest, merge_coverage_maps
+from test_impact import merge_jest_results, _SUREFIRE_DEFAULT
+from test_metrics_parser import TestMetricsParser
+from test_run_store import open_store, service_key
+from test_timing import JEST_SERVICE
+
+DEFAULT_MAVEN_OVERHEAD = 8.0
+DEFAULT_JEST_OVERHEAD = 3.0
+JEST_GROUP = JEST_SERVICE
+
+
+def _jest_relative(name: str) -> str:
+    """Jest reports absolute (possibly Windows) paths; key files by their path from __tests__/"""
+    name = name.replace("\\", "/")
+    index = name.find("__tests__/")
+    return name[index:] if index >= 0 else name
+
+
+def collect_items(backend_path: Path, services: List[str], jest_path: Optional[Path] = None) -> List[Dict]:
+    """Every test class / test file with its expected duration and where that estimate came from"""
+    store = open_store(backend_path.parent / "monitoring" / "metrics")
+    history = store.suite_durations() if store else {}
+    if store:
+        store.close()
+
+    items = []
+    for service in services:
+        service_path = backend_path / service
+        reports = {suite["name"]: suite["time"] for suite in
+                   ingest(glob.glob(str(service_path / "target" / "surefire-reports" / "TEST-*.xml")), service)}
+        test_root = service_path / "src" / "test" / "java"
+        for source in sorted(test_root.rglob("*.java")) if test_root.is_dir() else []:
+            if not _SUREFIRE_DEFAULT.match(source.stem):
+                continue
+            fqcn = ".".join(source.relative_to(test_root).with_suffix("").parts)
+            item = {"kind": "maven", "group": service, "name": source.stem, "id": fqcn}
+            if (service_key(service), fqcn) in history:
+                item.update(seconds=history[(service_key(service), fqcn)], source="history")
+            elif fqcn in reports:
+                item.update(seconds=reports[fqcn], source="report")
+            items.append(item)
+
+    if jest_path is not None:
+        durations = {}
+        try:
+            with open(jest_path / "test-results.json", "r") as f:
+                for result in json.load(f).get("testResults", []):
+                    durations[_jest_relative(result["name"])] = (result["endTime"] - result["startTime"]) / 1000
+        except (OSError, ValueError, KeyError):
+            pass
+        for test_file in sorted((jest_path / "__tests__").rglob("*.test.js")):
+            rel = test_file.relative_to(jest_path).as_posix()
+            item = {"kind": "jest", "group": JEST_GROUP, "name": rel, "id": rel}
+            if (JEST_GROUP, rel) in history:
+                item.update(seconds=history[(JEST_GROUP, rel)], source="history")
+            elif rel in durations:
+                item.update(seconds=durations[rel], source="report")
+            items.append(item)
+
+    known = sorted(item["seconds"] for item in items if "seconds" in item)
+    default = known[len(known) // 2] if known else 1.0
+    for item in items:
+        item.setdefault("seconds", default)
+        item.setdefault("source", "default")
+    return items
+
+
+def plan_shards(items: List[Dict], shards: int, maven_overhead: float = DEFAULT_MAVEN_OVERHEAD,
+                jest_overhead: float = DEFAULT_JEST_OVERHEAD) -> List[Dict]:
+    """Greedy LPT: longest item first onto the shard where it finishes earliest (start-up included)"""
+    plan = [{"shard": i + 1, "seconds": 0.0, "groups": {}} for i in range(shards)]
+    for item in sorted(items, key=lambda item: (-item["seconds"], item["group"], item["id"])):
+        overhead = maven_overhead if item["kind"] == "maven" else jest_overhead
+
+        def finish(shard):
+            return shard["seconds"] + item["seconds"] + (0 if item["group"] in shard["groups"] else overhead)
+
+        target = min(plan, key=lambda shard: (finish(shard), shard["shard"]))
+        target["seconds"] = finish(target)
+        group = target["groups"].setdefault(item["group"], {"kind": item["kind"], "tests": []})
+        group["tests"].append(item["name"])
+    for shard in plan:
+        shard["seconds"] = round(shard["seconds"], 2)
+    return plan
+
+
+def print_plan(plan: List[Dict], items: List[Dict]):
+    by_group: Dict[str, float] = {}
+    for item in items:
+        by_group[item["group"]] = by_group.get(item["group"], 0) + item["seconds"]
+    sources = {}
+    for item in items:
+        sources[item["source"]] = sources.get(item["source"], 0) + 1
+
+    print(f"\n{'='*70}")
+    print(f"[*] SHARD PLAN - {len(items)} test classes/files in {len(plan)} shards")
+    print(f"{'='*70}")
+    for shard in plan:
+        groups = ", ".join(f"{group} ({len(data['tests'])})" for group, data in sorted(shard["groups"].items()))
+        print(f"Shard {shard['shard']:>2}: ~{shard['seconds']:7.1f}s  {groups or '-'}")
+    print("-" * 70)
+    slowest = max(by_group.items(), key=lambda entry: entry[1]) if by_group else ("-", 0.0)
+    print(f"Expected wall time:  ~{max((shard['seconds'] for shard in plan), default=0):.1f}s")
+    print(f"Slowest service:     ~{slowest[1]:.1f}s ({slowest[0]}, what one-service-per-worker is bound by)")
+    print(f"Sequential:          ~{sum(by_group.values()):.1f}s")
+    print(f"Durations from:      {', '.join(f'{count} {source}' for source, count in sorted(sources.items()))}")
+    print(f"{'='*70}\n")
+
+
+def maven_command(service_path: Path, *args: str) -> List[str]:
+    mvnw_cmd = service_path / "mvnw.cmd"
+    if os.name == "nt" and mvnw_cmd.exists():
+        return ["cmd", "/c", str(mvnw_cmd), *args]
+    return ["mvn", *args]
+
+
+class ShardRunner:
+    def __init__(self, backend_path, jest_path=None, jest_coverage=False):
+        self.backend_path = Path(backend_path)
+        self.jest_path = Path(jest_path) if jest_path else None
+        self.jest_coverage = jest_coverage
+        self._print_lock = threading.Lock()
+
+    def _stream(self, prefix: str, cmd: List[str], cwd: Path, env=None) -> int:
+        try:
+            process = subprocess.Popen(cmd, cwd=str(cwd), env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       text=True, encoding="utf-8", errors="replace")
+        except OSError as e:
+            with self._print_lock:
+                print(f"{prefix}[!] Could not run {cmd[0]}: {e}", flush=True)
+            return 127
+        for line in process.stdout:
+            with self._print_lock:
+                print(prefix + line.rstrip("\n"), flush=True)
+        return process.wait()
+
+    def compile(self, services: List[str]) -> bool:
+        """test-compile each service once, so shards can run surefire:test side by side"""
+        results = {}
+        threads = [threading.Thread(target=lambda s=service: results.__setitem__(s, self._stream(
+            f"[compile {service}] ", maven_command(self.backend_path / service, "-q", "test-compile"),
+            self.backend_path / service))) for service in services]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        failed = [service for service, code in results.items() if code != 0]
+        if failed:
+            print(f"[!] test-compile failed for: {', '.join(failed)}")
+        return not failed
+
+    def run_shard(self, shard: Dict, compile_first: bool = False) -> int:
+        prefix = f"[shard {shard['shard']}] "
+        failures = 0
+        for group, data in sorted(shard["groups"].items()):
+            if data["kind"] == "maven":
+                service_path = self.backend_path / group
+                goals = ["-q", "test-compile", "surefire:test"] if compile_first else ["-q", "surefire:test"]
+                cmd = maven_command(service_path, *goals, f"-Dtest={','.join(data['tests'])}",
+                                    "-Dsurefire.failIfNoSpecifiedTests=false")
+                code = self._stream(prefix, cmd, service_path)
+            else:
+                output = f"test-results.shard-{shard['shard']}.json"
+                # One Jest process per shard (no nested worker pool), with its own database
+                # namespace in __tests__/setup.js
+                cmd = ["npx", "jest", "--runInBand", "--json", f"--outputFile={output}", "--passWithNoTests"]
+                if self.jest_coverage:
+                    # The coverage map comes back in the JSON output; report files would collide
+                    cmd += ["--coverage", "--coverageReporters=none"]
+                env = dict(os.environ, NODE_ENV="test", TEST_DB_NAMESPACE=f"shard{shard['shard']}")
+                code = self._stream(prefix, cmd + data["tests"], self.jest_path, env=env)
+            failures += code != 0
+        return failures
+
+    def merge_jest(self, plan: List[Dict]):
+        """
+        Combine the shard outputs into test-results.json. A run of every test file starts from
+        scratch; a partial one (e.g. a saved --plan that misses newer test files) keeps the
+        previous results of the files no shard ran, and the previous coverage summary.
+        """
+        results_file = self.jest_path / "test-results.json"
+        ran = {test for shard in plan for data in shard["groups"].values() if data["kind"] == "jest"
+               for test in data["tests"]}
+        on_disk = {path.relative_to(self.jest_path).as_posix()
+                   for path in (self.jest_path / "__tests__").rglob("*.test.js")}
+        partial = not on_disk <= ran
+        merged = {"testResults": []}
+        if partial:
+            try:
+                with open(results_file, "r") as f:
+                    merged = json.load(f)
+            except (OSError, ValueError):
+                pass
+        coverage_maps = []
+        for shard in plan:
+            shard_file = self.jest_path / f"test-results.shard-{shard['shard']}.json"
+            if not shard_file.exists():
+                continue
+            with open(shard_file, "r") as f:
+                results = json.load(f)
+            merged = merge_jest_results(merged, results)
+            if results.get("coverageMap"):
+                coverage_maps.append(results["coverageMap"])
+            shard_file.unlink()
+        if self.jest_coverage and coverage_maps and not partial:
+            merged["coverageMap"] = merge_coverage_maps(coverage_maps)
+            summary_file = self.jest_path / "coverage" / "coverage-summary.json"
+            summary_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(summary_file, "w") as f:
+                json.dump(coverage_summary(merged["coverageMap"]), f)
+        with open(results_file, "w") as f:
+            json.dump(merged, f)
+        print(f"[+] Jest shard results merged into {results_file}")
+
+
+def export_merged(metrics_parser: TestMetricsParser, runner: ShardRunner, plan: List[Dict],
+                  push: bool = False) -> Dict:
+    """Export the metrics of every shard's reports: surefire XML side by side, Jest outputs merged"""
+    metrics = metrics_parser.collect_metrics()
+    metrics_parser.export(metrics, push=push, source="test_shards")
+    if runner.jest_path is not None:
+        runner.merge_jest(plan)
+        from run_dronedelivery_tests import DroneDeliveryTestRunner
+        jest_runner = DroneDeliveryTestRunner(runner.jest_path.parent, push=push)
+        jest_runner.export_metrics(ingest_jest(runner.jest_path))
+        jest_runner.record_history(source="test_shards")
+    return metrics
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Duration-balanced test sharding (greedy LPT)")
+    parser.add_argument("action", choices=("plan", "run", "merge"),
+                        help="merge: export the reports of `run --shard` jobs (final CI job)")
+    parser.add_argument("backend_path", help="DoAnCNPM_Backend directory")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 2, help="number of shards (default: CPUs)")
+    parser.add_argument("--shard", help="run only shard i/N (CI matrix job)")
+    parser.add_argument("--jest", help="DroneDelivery BackEnd directory to include its Jest tests")
+    parser.add_argument("--plan", help="plan file written by `plan --output` (instead of planning again)")
+    parser.add_argument("--output", help="write the plan as JSON")
+    parser.add_argument("--maven-overhead", type=float, default=DEFAULT_MAVEN_OVERHEAD,
+                        help=f"seconds to start Maven for a service in a shard (default: {DEFAULT_MAVEN_OVERHEAD})")
+    parser.add_argument("--jest-overhead", type=float, default=DEFAULT_JEST_OVERHEAD,
+                        help=f"seconds to start Jest in a shard (default: {DEFAULT_JEST_OVERHEAD})")
+    parser.add_argument("--push", action="store_true", help="push the merged metrics instead of writing files")
+    args = parser.parse_args(argv)
+
+    backend_path = Path(args.backend_path)
+    jest_path = Path(args.jest) if args.jest else None
+    only = None
+    if args.shard:
+        only, _, total = args.shard.partition("/")
+        if not only.isdigit() or not (total or "0").isdigit():
+            parser.error(f"--shard expects i/N, got '{args.shard}'")
+        only = int(only)
+        if total:
+            args.shards = int(total)
+        if not 1 <= only <= args.shards:
+            parser.error(f"--shard {args.shard}: i must be between 1 and {args.shards}")
+
+    metrics_parser = TestMetricsParser(str(backend_path))
+    if args.plan:
+        with open(args.plan, "r") as f:
+            saved = json.load(f)
+        plan, items = saved["shards"], saved["items"]
+    else:
+        items = collect_items(backend_path, metrics_parser.services, jest_path)
+        plan = plan_shards(items, args.shards, args.maven_overhead, args.jest_overhead)
+    print_plan(plan, items)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"shards": plan, "items": items}, f, indent=2)
+        print(f"[+] Plan saved to {args.output}")
+    if args.action == "plan":
+        return 0
+
+    runner = ShardRunner(backend_path, jest_path)
+    if args.action == "merge":
+        metrics = export_merged(metrics_parser, runner, plan, push=args.push)
+        metrics_parser.print_summary(metrics)
+        return 1 if metrics['summary']['total_failed'] else 0
+    if only is not None:
+        shard = next((shard for shard in plan if shard["shard"] == only), None)
+        if shard is None:
+            print(f"[!] Shard {only} is not in the plan (shards 1-{len(plan)})")
+            return 1
+        return 1 if runner.run_shard(shard, compile_first=True) else 0
+
+    started = time.perf_counter()
+    services = sorted({group for shard in plan for group, data in shard["groups"].items() if data["kind"] == "maven"})
+    if services and not runner.compile(services):
+        return 1
+    compiled = time.perf_counter()
+    failures = {}
+    threads = [threading.Thread(target=lambda s=shard: failures.__setitem__(s["shard"], runner.run_shard(s)))
+               for shard in plan if shard["groups"]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    finished = time.perf_counter()
+
+    metrics = export_merged(metrics_parser, runner, plan, push=args.push)
+
+    print(f"\n[*] Compile: {compiled - started:.1f}s   Shards: {finished - compiled:.1f}s "
+          f"(expected ~{max(shard['seconds'] for shard in plan):.1f}s)   Total: {finished - started:.1f}s")
+    metrics_parser.print_summary(metrics)
+    return 1 if any(failures.values()) or metrics['summary']['total_failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Test Timing - Per-test-case duration metrics and a slowest / regressed tests report
+Reads every <testcase time=...> of the services' surefire reports (junit_ingest.py) and
+assertionResults[].duration of Jest's test-results.json. Per-test series would grow with
+the number of tests, so Prometheus only gets:
+  test_case_duration_seconds{service}                  histogram, fixed buckets
+  test_slowest_case_duration_seconds{service,test}     the top N slowest test cases
+  test_case_duration_regression_seconds{service,test}  the top N slowdowns against the median
+                                                       of the previous runs in the run store
+i.e. services x buckets + 2N series however many tests there are. The full list is in the
+printed report.
+
+Metrics go to monitoring/metrics/test_timing_metrics.txt (served by the metrics server) or
+are pushed with --push (job test-timing).
+
+Usage: python test_timing.py DoAnCNPM_Backend [--jest DroneDelivery-main/BackEnd] [--top 20] [--runs 20] [--push]
+"""
+
+import sys
+import glob
+import argparse
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from metric_registry import MetricRegistry, format_value, label_key
+from metrics_push import push_registry
+from junit_ingest import ingest
+from jest_ingest import case_status, iter_test_results, test_file
+from test_run_store import open_store, service_key
+
+SERVICES = ('user_service', 'product_service', 'drone_service', 'order_service', 'payment_service',
+            'restaurant-service')
+JEST_SERVICE = "dronedelivery"
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Slowdowns below either threshold are timer noise, not regressions
+MIN_REGRESSION_SEC = 0.1
+MIN_REGRESSION_RATIO = 1.2
+MAX_TEST_LABEL = 120
+
+
+def jest_suites(results: Dict) -> List[Dict]:
+    """`jest --json` output as run store suites: one suite per test file, one case per assertion"""
+    suites = []
+    for result in results.get("testResults", []):
+        file_name = test_file(result.get("name", ""))
+        cases = [{
+            "classname": file_name,
+            "name": assertion.get("fullName") or assertion.get("title", ""),
+            "time": (assertion.get("duration") or 0) / 1000,
+            "status": case_status(assertion),
+        } for assertion in result.get("assertionResults", [])]
+        statuses = [case["status"] for case in cases]
+        suites.append({
+            "service": JEST_SERVICE,
+            "name": file_name,
+            "tests": len(cases),
+            "failures": statuses.count("failed"),
+            "errors": 0 if cases or result.get("status") != "failed" else 1,
+            "skipped": statuses.count("skipped"),
+            "time": max(result.get("endTime", 0) - result.get("startTime", 0), 0) / 1000,
+            "testcases": cases,
+        })
+    return suites
+
+
+def read_jest_suites(results_file) -> List[Dict]:
+    try:
+        return jest_suites({"testResults": [result for result, _ in iter_test_results(results_file)]})
+    except (OSError, ValueError) as e:
+        print(f"[!] Could not read {results_file}: {e}")
+        return []
+
+
+def test_label(classname: str, name: str) -> str:
+    """Short, readable test id: Class.method for Java, `file > title` for Jest"""
+    if classname.endswith(".js"):
+        label = f"{classname} > {name}"
+    else:
+        label = f"{classname.rpartition('.')[2]}.{name}"
+    return label if len(label) <= MAX_TEST_LABEL else label[:MAX_TEST_LABEL - 3] + "..."
+
+
+def collect_cases(backend_path: Path, jest_path: Optional[Path] = None) -> List[Dict]:
+    """Every test case that ran (skipped ones have no duration) with its service and seconds"""
+    suites = ingest(path for service in SERVICES
+                    for path in glob.glob(str(backend_path / service / "target" / "surefire-reports" / "TEST-*.xml")))
+    if jest_path is not None:
+        suites += read_jest_suites(jest_path / "test-results.json")
+    return [{
+        "service": service_key(suite["service"]),
+        "classname": case["classname"],
+        "name": case["name"],
+        "seconds": case["time"],
+        "status": case["status"],
+    } for suite in suites for case in suite["testcases"] if case["status"] != "skipped"]
+
+
+def find_regressions(cases: List[Dict], baselines: Dict[tuple, float]) -> List[Dict]:
+    """Cases slower than their baseline by MIN_REGRESSION_SEC and MIN_REGRESSION_RATIO, worst first"""
+    regressions = []
+    for case in cases:
+        baseline = baselines.get((case["service"], case["classname"], case["name"]))
+        if baseline is None:
+            continue
+        delta = case["seconds"] - baseline
+        if delta >= MIN_REGRESSION_SEC and case["seconds"] >= baseline * MIN_REGRESSION_RATIO:
+            regressions.append(dict(case, baseline=baseline, delta=delta))
+    return sorted(regressions, key=lambda case: -case["delta"])
+
+
+def build_registry(cases: List[Dict], regressions: List[Dict], top: int) -> MetricRegistry:
+    registry = MetricRegistry()
+    histogram = registry.histogram("test_case_duration_seconds", "Test case duration by service")
+    by_service: Dict[str, List[int]] = {}
+    sums: Dict[str, float] = {}
+    for case in cases:
+        counts = by_service.setdefault(case["service"], [0] * (len(BUCKETS) + 1))
+        counts[bisect_left(BUCKETS, case["seconds"])] += 1
+        sums[case["service"]] = sums.get(case["service"], 0) + case["seconds"]
+    for service, counts in by_service.items():
+        cumulative = 0
+        for bound, count in zip(BUCKETS, counts):
+            cumulative += count
+            histogram.set_sample("test_case_duration_seconds_bucket",
+                                 label_key({"service": service, "le": format_value(bound)}), cumulative)
+        histogram.set_sample("test_case_duration_seconds_bucket", label_key({"service": service, "le": "+Inf"}),
+                             sum(counts))
+        histogram.set_sample("test_case_duration_seconds_sum", label_key({"service": service}),
+                             round(sums[service], 6))
+        histogram.set_sample("test_case_duration_seconds_count", label_key({"service": service}), sum(counts))
+
+    slowest = registry.gauge("test_slowest_case_duration_seconds", f"Duration of the {top} slowest test cases")
+    for case in sorted(cases, key=lambda case: -case["seconds"])[:top]:
+        slowest.set(case["seconds"], service=case["service"], test=test_label(case["classname"], case["name"]))
+    regressed = registry.gauge("test_case_duration_regression_seconds",
+                               f"Seconds added by the {top} worst test case slowdowns against the run history")
+    for case in regressions[:top]:
+        regressed.set(round(case["delta"], 3), service=case["service"],
+                      test=test_label(case["classname"], case["name"]))
+    return registry
+
+
+def print_report(cases: List[Dict], regressions: List[Dict], top: int, has_history: bool):
+    total = sum(case["seconds"] for case in cases)
+    print(f"\n{'='*70}")
+    print(f"[*] SLOWEST TEST CASES ({len(cases)} cases, {total:.1f}s in total)")
+    print(f"{'='*70}")
+    running = 0.0
+    for case in sorted(cases, key=lambda case: -case["seconds"])[:top]:
+        running += case["seconds"]
+        print(f"{case['seconds']:8.2f}s {running / total * 100 if total else 0:5.1f}%  "
+              f"{case['service']:<20} {test_label(case['classname'], case['name'])}")
+    print("(% = cumulative share of the total test time)")
+
+    print(f"\n{'='*70}")
+    print(f"[*] DURATION REGRESSIONS (against the median of previous runs)")
+    print(f"{'='*70}")
+    if not has_history:
+        print("[!] No run history yet (test_runs.db); nothing to compare against")
+    elif not regressions:
+        print("[+] No test case slowed down")
+    for case in regressions[:top]:
+        print(f"{case['delta']:+8.2f}s  {case['baseline']:6.2f}s -> {case['seconds']:6.2f}s "
+              f"(x{case['seconds'] / case['baseline'] if case['baseline'] else float('inf'):.1f})  "
+              f"{case['service']:<20} {test_label(case['classname'], case['name'])}")
+    print(f"{'='*70}\n")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Per-test-case duration metrics and slowest / regressed tests")
+    parser.add_argument("backend_path", help="DoAnCNPM_Backend directory")
+    parser.add_argument("--jest", help="DroneDelivery BackEnd directory to include its Jest results")
+    parser.add_argument("--top", type=int, default=20, help="slowest / regressed tests to report and export (default: 20)")
+    parser.add_argument("--runs", type=int, default=20, help="previous runs forming the baseline (default: 20)")
+    parser.add_argument("--push", action="store_true", help="push to the metrics server instead of writing a file")
+    args = parser.parse_args(argv)
+
+    backend_path = Path(args.backend_path)
+    metrics_dir = backend_path.parent / "monitoring" / "metrics"
+    cases = collect_cases(backend_path, Path(args.jest) if args.jest else None)
+    if not cases:
+        print("[!] No test case results found")
+        return 1
+
+    store = open_store(metrics_dir)
+    baselines = store.testcase_baselines(args.runs) if store else {}
+    if store:
+        store.close()
+    regressions = find_regressions(cases, baselines)
+    print_report(cases, regressions, args.top, bool(baselines))
+
+    registry = build_registry(cases, regressions, args.top)
+    if args.push and push_registry(registry, "test-timing", {}):
+        return 0
+    output = metrics_dir / "test_timing_metrics.txt"
+    registry.write_file(output)
+    print(f"[+] Metrics written to {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())